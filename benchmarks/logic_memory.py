@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+'''
+Memory retained by the Logic* trees of validated taxonomy strings (bytes
+per validated string, traced with tracemalloc), caches are disabled so each
+string owns its tree.
+
+With --baseline the same measure is taken, in a new process, on the
+openquake.gem_taxonomy package of another source tree (e.g. a git worktree
+of the commit before a change) and compared with the current one.
+
+usage: python benchmarks/logic_memory.py [-n <strings>] [-b <source tree>]
+'''
+import gc
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tracemalloc
+
+
+def _corpus(n):
+    # distinct 4.0 strings with args, params and many attributes
+    bases = ['HYB(CR;S)/LFM+DCW:0.4', 'MDD(SL+S;HYB(ADO+M;WHE+W))',
+             'LDD(DCW:0.4+LFM;DCW:0.8+LFM)/IRI(TOR;SET;CHV)',
+             'MIX(RES;COM;GOV)/CR+CIP/H:2', 'W/H:1-3/PGAR:0.1-0.3/RES:2A']
+    return ['%s/Y:%d' % (bases[i % len(bases)], i + 1) for i in range(n)]
+
+
+def _count(node):
+    children = (list(getattr(node, 'atoms', ())) +
+                list(getattr(node, 'args', ())) +
+                list(getattr(node, 'params', ())))
+    return 1 + sum(_count(child) for child in children)
+
+
+def measure(n):
+    '''
+    RETURN:
+    {'package': package directory, 'strings': n, 'nodes': Logic* nodes,
+     'bytes': memory retained by the trees}
+    '''
+    from openquake.gem_taxonomy import GemTaxonomy
+
+    try:
+        gt = GemTaxonomy(vers='4.0', cache_size=0, attr_cache_size=0)
+    except TypeError:
+        # trees without validation caches
+        gt = GemTaxonomy(vers='4.0')
+    corpus = _corpus(n)
+    for tax in corpus[:10]:
+        gt.validate(tax)
+
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    trees = [gt.validate(tax)[1] for tax in corpus]
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'package': os.path.dirname(sys.modules[
+                GemTaxonomy.__module__].__file__),
+            'strings': len(trees),
+            'nodes': sum(_count(attr) for tree in trees for attr in tree),
+            'bytes': end - start}
+
+
+def _measure_baseline(n, baseline):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.abspath(baseline)] +
+        ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    result = json.loads(subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '-n', str(n), '--json'],
+        env=env, check=True, stdout=subprocess.PIPE).stdout)
+    if not result['package'].startswith(os.path.abspath(baseline)):
+        raise RuntimeError('baseline package not imported from %s but %s' %
+                           (baseline, result['package']))
+    return result
+
+
+def _print(label, result):
+    print('%-8s %8d strings %8d nodes %8.0f bytes/string %6.0f bytes/node' % (
+        label, result['strings'], result['nodes'],
+        result['bytes'] / result['strings'],
+        result['bytes'] / result['nodes']))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark memory of Logic* trees.')
+    parser.add_argument('-n', '--strings', type=int, default=20000)
+    parser.add_argument(
+        '-b', '--baseline', metavar='SOURCE_TREE',
+        help='source tree of the openquake.gem_taxonomy to compare with')
+    parser.add_argument('--json', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.json:
+        print(json.dumps(measure(args.strings)))
+        return
+
+    if args.baseline:
+        before = _measure_baseline(args.strings, args.baseline)
+        _print('before', before)
+    after = measure(args.strings)
+    _print('after' if args.baseline else 'current', after)
+    if args.baseline:
+        print('change   %+.1f%% bytes/string' % (
+            (after['bytes'] / after['strings']) /
+            (before['bytes'] / before['strings']) * 100 - 100))
+
+
+if __name__ == '__main__':
+    main()
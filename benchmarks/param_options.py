@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+'''
+Parameter options lookup: linear scan of gem_tax['Param'][atom] (previous
+implementation) against the GemTaxonomy.param_options index, plus
+validate/explain throughput on an option-heavy dataset (caches disabled).
+
+usage: python benchmarks/param_options.py [-t <taxonomy_vers>] [-n <loops>]
+'''
+import time
+import argparse
+from openquake.gem_taxonomy import GemTaxonomy
+
+
+def _linear_lookup(gt, atom_name, key):
+    return list(filter(lambda option: option['name'] == key,
+                       gt.tax['Param'][atom_name]))[0]
+
+
+def _index_lookup(gt, atom_name, key):
+    return gt.param_options[atom_name][key]
+
+
+def _timeit(func, items, loops):
+    t_start = time.perf_counter()
+    for _ in range(loops):
+        for item in items:
+            func(*item)
+    return (time.perf_counter() - t_start) / (loops * len(items))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark parameters options lookup.')
+    parser.add_argument('-t', '--taxonomy-vers', default='4.0')
+    parser.add_argument('-n', '--loops', type=int, default=20)
+    args = parser.parse_args()
+
+    gt = GemTaxonomy(vers=args.taxonomy_vers, cache_size=0,
+                     attr_cache_size=0)
+    pairs = [(gt, atom_name, option['name'])
+             for atom_name, options in gt.tax['Param'].items()
+             for option in options]
+    # only atoms with 'options' parameters and a single level key
+    corpus = ['%s:%s' % (atom_name, key) for _, atom_name, key in pairs
+              if ':' not in key and
+              gt.atom_specs[atom_name].param_type_name == 'options']
+    valid = []
+    for tax in corpus:
+        try:
+            gt.validate(tax)
+            valid.append(tax)
+        except ValueError:
+            pass
+
+    print('taxonomy %s: %d options, %d option-heavy strings' % (
+        args.taxonomy_vers, len(pairs), len(valid)))
+    linear = _timeit(_linear_lookup, pairs, args.loops)
+    index = _timeit(_index_lookup, pairs, args.loops)
+    print('  lookup   linear %8.3f us  index %8.3f us  (x%.1f)' % (
+        linear * 1e6, index * 1e6, linear / index))
+    for name, func in (('validate', gt.validate), ('explain', gt.explain)):
+        elapsed = _timeit(func, [(tax,) for tax in valid], args.loops)
+        print('  %-8s %8.3f us per string' % (name, elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
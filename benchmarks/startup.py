@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+'''
+Startup time of each console script (wall time of a new process running
+it on a single input, median and minimum of the runs), the bare
+interpreter startup is reported as reference.
+
+usage: python benchmarks/startup.py [-n <runs>]
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+RUNNER = ('import sys; from openquake.gem_taxonomy import scripts;'
+          ' sys.argv = sys.argv[1:]; scripts.%s()')
+
+
+def _commands(csv_filename):
+    return [
+        ('python', None, []),
+        ('gem-taxonomy-info', 'info', []),
+        ('gem-taxonomy-validate', 'validate', ['CR/LFM+DCW:0.4/H:1-3']),
+        ('gem-taxonomy-explain', 'explain', ['CR/LFM+DCW:0.4/H:1-3']),
+        ('gem-taxonomy-csv-validate', 'csv_validate', [csv_filename]),
+        ('gem-taxonomy-specs2graph', 'specs2graph', []),
+    ]
+
+
+def _run(entry, name, argv):
+    if entry is None:
+        cmd = [sys.executable, '-c', 'pass']
+    else:
+        cmd = [sys.executable, '-c', RUNNER % entry, name] + argv
+    t_start = time.perf_counter()
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - t_start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark startup time of console scripts.')
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_filename = os.path.join(tmpdir, 'exposure.csv')
+        with open(csv_filename, 'w') as csvfile:
+            csvfile.write('id,taxonomy\n1,CR/LFM+DCW:0.4/H:1-3\n')
+
+        for name, entry, argv in _commands(csv_filename):
+            # warm up (bytecode and file system caches)
+            _run(entry, name, argv)
+            times = [_run(entry, name, argv) for _ in range(args.runs)]
+            print('%-26s median %6.1f ms, min %6.1f ms' % (
+                name, statistics.median(times) * 1000, min(times) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+'''
+asyncio facade of GemTaxonomy: validations run in a thread or process
+pool so they never block the event loop.
+'''
+import copy
+import asyncio
+import weakref
+import collections
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from openquake.gem_taxonomy import GemTaxonomy
+
+# GemTaxonomy instance of each process pool worker
+_worker_gt = None
+
+
+def _worker_init(vers, gt_kwargs):
+    global _worker_gt
+    _worker_gt = GemTaxonomy(vers=vers, **gt_kwargs)
+
+
+def _validate(gt, tax_str):
+    '''
+    gt is None in process pool workers
+    '''
+    attr_canon_in, _, report = (gt or _worker_gt).validate(
+        tax_str, build_tree=False)
+    return attr_canon_in, None, report
+
+
+def _explain(gt, tax_str, fmt):
+    return (gt or _worker_gt).explain(tax_str, fmt=fmt)
+
+
+def _validate_chunk(gt, tax_strs):
+    '''
+    RETURN:
+    list of (canonical, report, error) of tax_strs
+    '''
+    gt = gt or _worker_gt
+    results = []
+    for tax_str in tax_strs:
+        try:
+            _, _, report = gt.validate(tax_str, build_tree=False)
+        except ValueError as exc:
+            results.append((None, None, exc))
+            continue
+        results.append(((tax_str if report['is_canonical']
+                         else report['canonical']), report, None))
+    return results
+
+
+class AsyncValidateManyResults:
+    '''
+    asynchronous iterator returned by AsyncGemTaxonomy.validate_many(), as
+    ValidateManyResults for each input taxonomy string (in input order) it
+    returns a (canonical, report, error) tuple and its summary counts are
+    complete when it is exhausted; awaiting it returns the list of all the
+    results
+
+    the input is read ahead only to fill at most max_pending chunks of
+    distinct strings, so the memory used does not grow with the input
+    length (except for the results kept to dedupe the strings)
+    '''
+    def __init__(self, agt, iterable, on_error):
+        self.agt = agt
+        self.on_error = on_error
+        self.summary = {'total': 0, 'validated': 0, 'valid': 0,
+                        'canonical': 0, 'errors': 0}
+        self._iter = iter(iterable)
+        # input strings read and not returned yet
+        self._pending = collections.deque()
+        # {tax_str: (canonical, report, error)}, the chunk job (an
+        # asyncio.Task) while running, None while the chunk is filled
+        self._results = {}
+        self._chunk = []
+        self._jobs = set()
+        self._window = agt.chunk_size * agt.max_pending
+
+    async def _validate_chunk(self, chunk):
+        self._results.update(zip(chunk, await self.agt._run(
+            _validate_chunk, chunk)))
+
+    def _submit(self):
+        chunk, self._chunk = self._chunk, []
+        job = asyncio.ensure_future(self._validate_chunk(chunk))
+        job.add_done_callback(self._jobs.discard)
+        self._jobs.add(job)
+        for tax_str in chunk:
+            self._results[tax_str] = job
+
+    def _read(self):
+        while (self._iter is not None and
+               len(self._jobs) < self.agt.max_pending and
+               len(self._pending) < self._window):
+            try:
+                tax_str = next(self._iter)
+            except StopIteration:
+                self._iter = None
+                break
+            self._pending.append(tax_str)
+            if tax_str not in self._results:
+                self._results[tax_str] = None
+                self._chunk.append(tax_str)
+                self.summary['validated'] += 1
+                if len(self._chunk) >= self.agt.chunk_size:
+                    self._submit()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._read()
+        if not self._pending:
+            raise StopAsyncIteration
+        tax_str = self._pending.popleft()
+        if self._results[tax_str] is None:
+            self._submit()
+        job = self._results[tax_str]
+        if isinstance(job, asyncio.Future):
+            # a cancelled caller must not cancel the chunk job
+            await asyncio.shield(job)
+
+        canonical, report, error = self._results[tax_str]
+        self.summary['total'] += 1
+        if error is not None:
+            self.summary['errors'] += 1
+            if self.on_error == 'raise':
+                raise error
+            return (canonical, report, error)
+        self.summary['valid'] += 1
+        if report['is_canonical']:
+            self.summary['canonical'] += 1
+        return (canonical, dict(report), None)
+
+    async def _collect(self):
+        return [result async for result in self]
+
+    def __await__(self):
+        return self._collect().__await__()
+
+
+class AsyncGemTaxonomy:
+    '''
+    asyncio facade of GemTaxonomy, its coroutines run the work in an
+    executor:
+
+    executor:    'thread' (default) to share one GemTaxonomy instance in a
+                 pool of threads, 'process' to use a pool of processes,
+                 each with its own instance
+    max_workers: size of the pool (executor default if None)
+    max_pending: maximum number of jobs submitted to the pool at once,
+                 following calls wait for a free slot (backpressure)
+    chunk_size:  number of distinct strings of a validate_many() job
+
+    concurrent validate() (or explain()) calls of the same string share a
+    single job (single-flight); other keyword arguments are passed to
+    GemTaxonomy.
+
+    an instance can be used by more event loops (e.g. more asyncio.run()
+    calls), max_pending and single-flight apply to each loop separately.
+    '''
+    EXECUTORS = ('thread', 'process')
+
+    def __init__(self, vers='4', executor='thread', max_workers=None,
+                 max_pending=64, chunk_size=256, **gt_kwargs):
+        if executor not in self.EXECUTORS:
+            raise ValueError('Allowed executors are %s' % ', '.join(
+                self.EXECUTORS))
+        if max_pending < 1:
+            raise ValueError('max_pending must be greater than 0')
+        self.executor = executor
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        if executor == 'thread':
+            self.gt = GemTaxonomy(vers=vers, **gt_kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            self.gt = None
+            self.pool = ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_worker_init,
+                initargs=(vers, gt_kwargs))
+        # {event loop: (asyncio.Semaphore, {(operation, args):
+        #  asyncio.Future} of the jobs running)}, asyncio objects are
+        # bound to the loop where they are used first
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = (
+                asyncio.Semaphore(self.max_pending), {})
+        return state
+
+    async def _run(self, func, *args):
+        async with self._loop_state()[0]:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.pool, func, self.gt, *args)
+
+    async def _single_flight(self, key, func, *args):
+        inflight = self._loop_state()[1]
+        future = inflight.get(key)
+        if future is None:
+            future = inflight[key] = asyncio.ensure_future(
+                self._run(func, *args))
+            future.add_done_callback(lambda _: inflight.pop(key, None))
+        # a cancelled caller must not cancel the shared job
+        return await asyncio.shield(future)
+
+    async def validate(self, tax_str):
+        '''
+        as GemTaxonomy.validate(tax_str, build_tree=False), the Logic*
+        tree is never built and None is returned in its place
+        '''
+        attr_canon_in, _, report = await self._single_flight(
+            ('validate', tax_str), _validate, tax_str)
+        return dict(attr_canon_in), None, dict(report)
+
+    async def explain(self, tax_str, fmt='textsingleline'):
+        '''
+        as GemTaxonomy.explain(), the callers sharing a job get a copy each
+        of its result
+        '''
+        return copy.deepcopy(await self._single_flight(
+            ('explain', tax_str, fmt), _explain, tax_str, fmt))
+
+    def validate_many(self, iterable, *, on_error='collect'):
+        '''
+        as GemTaxonomy.validate_many() with dedupe, the distinct strings
+        are validated in chunks of chunk_size strings, at most max_pending
+        chunks at once
+
+        RETURN:
+        AsyncValidateManyResults asynchronous iterator of (canonical,
+        report, error) tuples in iterable order, with the 'summary'
+        attribute; awaiting it returns the list of the tuples
+        '''
+        if on_error not in ('collect', 'raise'):
+            raise ValueError(
+                'on_error must be \'collect\' or \'raise\', found [%s]' %
+                on_error)
+        return AsyncValidateManyResults(self, iterable, on_error)
+
+    def close(self):
+        '''
+        shut down the pool, waiting for the running jobs (blocking, see
+        aclose() in coroutines)
+        '''
+        self.pool.shutdown()
+
+    async def aclose(self):
+        '''
+        as close(), the pool is shut down in the default executor so the
+        event loop is not blocked
+        '''
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.pool.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+'''
+Throughput, latency and memory benchmarks of GemTaxonomy (used by the
+gem-taxonomy-bench command) on deterministic corpora of taxonomy strings:
+
+valid:     canonical valid strings, curated ones and synthetic combinations
+           of their attributes and of the single atoms of the version
+reordered: valid strings with shuffled attributes and atoms (not canonical)
+errors:    error-heavy set, 80% of strings are not valid (unknown atoms,
+           duplicated attributes, bad parameters, syntax errors...)
+'''
+import os
+import re
+import sys
+import time
+import random
+import tempfile
+import platform
+import functools
+import subprocess
+import collections
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    resource = None
+from openquake.gem_taxonomy import GemTaxonomy, __version__
+
+# real world strings of exposure models, per taxonomy version
+CURATED = {
+    '3.3': [
+        'CR/LFINF+CDN+LFC:0.0/H:1', 'CR/LFINF+CDL+DUL/H:2',
+        'CR/LFINF+CDM+LFC:15.0/H:4-7', 'MUR+CL/LWAL+CDN/H:2',
+        'MUR+STDRE/LWAL+CDN/H:1', 'MCF/LWAL+CDN/H:1-3',
+        'W+WLI/LWAL+CDN/H:1', 'MATO/LN+CDN/H:1', 'ER+ETR/LWAL+CDN/H:1',
+        'CR+PC/LFM+CDL/H:1', 'UNK', 'W/LFM+DNO/H:1/RES',
+        'MUR+ADO/LWAL+DNO/H:1/RES', 'HYB(CR;S)/LFM+DCW:0.4/H:1-3',
+        'MDD(S+SL;HYB(M+ADO;W+WHE))', 'CR+CIP/H:2/MIX(RES;COM;GOV)',
+        'CR+CIP/LFM+DUM/H:5/Y:1995/RES',
+        'MUR+CBH+MOC/LWAL+DNO/H:2/Y:1950/RES',
+        'W+WWD/LWAL+DNO/H:1/RES/RSH1', 'EU/LN/H:1', 'MATO/LO+DNO/H:1',
+        'CR+PC/LPB+DUL/H:1/IND', 'MUR+CLBRS+MOCL/LWAL+CDN/H:2/RES',
+        'W+WS/LWAL+CDN/H:2/RES'],
+    '4.0': [
+        'CR/LFINF+DUL/CDN/H:1', 'CR/LFINF+DUL/CDL/H:2',
+        'CR/LFINF+DUM/CDM+LFC:15.0/H:4-7', 'CR/LFINF/CDM/H:4-7',
+        'MUR+CL/LWAL+DNO/CDN/H:2', 'MUR+STDRE/LWAL/CDN/H:1',
+        'MCF/LWAL/CDN/H:1-3', 'W+WLI/LWAL/CDN/H:1', 'S/LFM+DUM/CDM/H:4-7',
+        'CR/LDUAL+DUH/CDH/H:8-20', 'MATO/LN/CDN/H:1',
+        'ER+ETR/LWAL/CDN/H:1', 'CR+PC/LFM/CDL/H:1', 'UNK',
+        'CR+CIP/LFM+DUM/H:5/Y:1995/RES', 'S+SL/LFBR+DUH/H:2-4/IND',
+        'CR/LFINF+DUL/H:3-5/COM', 'W+WWD/LWAL+DNO/H:1/RSH1/RES',
+        'CR/LFINF+DUL/CDL/H:2/Y:1985', 'CR/LFINF+DUL/CDM/HD:15',
+        'CR/LFINF+DUL/CDM/WRL/FRN/H:4',
+        'MUR+CBH+MOC/LWAL+DNO/CDN/H:2/Y:1950/RES',
+        'CR/LFM+DCW:0.4/CDM/H:5', 'HYB(CR;S)/LFM+DCW:0.4/H:1-3',
+        'CR/LFINF+DUL/CDN/H:1/AGR', 'W/LFM+DNO/H:1/RES',
+        'MUR+ADO/LWAL+DNO/H:1/RES', 'MDD(S+SL;HYB(M+ADO;W+WHE))',
+        'LDD(LFM+DCW:0.4;LFM+DCW:0.8)/IRI(TOR;SET;CHV)',
+        'CR+CIP/H:2/MIX(RES;COM;GOV)', 'W/PGAR:0.1-0.3/H:1-3/RES:2A',
+        'EU/LN/H:1', 'MATO/LO+DNO/H:1', 'CR+PC/LPB+DUL/H:1/IND'],
+}
+CORPORA = ('valid', 'reordered', 'errors')
+# fraction of valid strings of the 'errors' corpus
+ERRORS_VALID_FRACTION = 0.2
+BENCHMARKS = ('validate', 'explain_textsingleline', 'explain_textmultiline',
+              'explain_json', 'split_by_attributes', 'csv_validate')
+CSV_VALIDATE_RUNNER = ('import sys; from openquake.gem_taxonomy import'
+                       ' scripts; sys.argv = sys.argv[1:];'
+                       ' scripts.csv_validate()')
+
+
+def _split_top(text, sep):
+    '''
+    split text by sep outside of rounded brackets
+    '''
+    ret = []
+    depth = 0
+    start = 0
+    for idx, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == sep and depth == 0:
+            ret.append(text[start:idx])
+            start = idx + 1
+    ret.append(text[start:])
+    return ret
+
+
+def _vary(attr, rnd):
+    '''
+    replace the numbers of attr with random ones of the same magnitude
+    '''
+    def number(match):
+        value = match.group(0)
+        if '.' in value:
+            decimals = len(value) - value.index('.') - 1
+            return '%.*f' % (decimals, rnd.uniform(0, 2 * float(value)))
+        return '%d' % rnd.randint(int(value) // 2, int(value) * 2 + 2)
+    return re.sub(r'\d+(\.\d+)?', number, attr)
+
+
+def _outcome(gt, tax):
+    '''
+    RETURN:
+    canonical string of tax, None if it is not valid
+    '''
+    try:
+        _, _, report = gt.validate(tax, build_tree=False)
+    except ValueError:
+        return None
+    return tax if report['is_canonical'] else report['canonical']
+
+
+def _attributes_pool(gt):
+    '''
+    RETURN:
+    {attribute name: sorted canonical values}, from the curated strings and
+    the atoms that are a valid taxonomy string by themselves
+    '''
+    pool = collections.defaultdict(set)
+    for tax in CURATED[gt.tax_vers] + [
+            atom['name'] for atom in gt.tax['Atom']]:
+        try:
+            attr_canon_in, _, _ = gt.validate(tax, build_tree=False)
+        except ValueError:
+            continue
+        for name, value in attr_canon_in.items():
+            pool[name].add(value)
+    return {name: sorted(values) for name, values in pool.items()}
+
+
+def _valid(gt, n, rnd):
+    ret = []
+    seen = set()
+    for tax in CURATED[gt.tax_vers]:
+        tax_canon = _outcome(gt, tax)
+        if tax_canon is not None and tax_canon not in seen:
+            seen.add(tax_canon)
+            ret.append(tax_canon)
+    pool = _attributes_pool(gt)
+    names = sorted(pool)
+    for _ in range(n * 50):
+        if len(ret) >= n:
+            break
+        attrs = [_vary(rnd.choice(pool[name]), rnd) for name in rnd.sample(
+            names, rnd.randint(2, min(6, len(names))))]
+        tax_canon = _outcome(gt, '/'.join(attrs))
+        if tax_canon is not None and tax_canon not in seen:
+            seen.add(tax_canon)
+            ret.append(tax_canon)
+    return ret[:n]
+
+
+def _reordered(gt, n, rnd):
+    ret = []
+    for tax_canon in _valid(gt, n * 2, rnd):
+        if len(ret) >= n:
+            break
+        for _ in range(5):
+            attrs = []
+            for attr in _split_top(tax_canon, '/'):
+                atoms = _split_top(attr, '+')
+                rnd.shuffle(atoms)
+                attrs.append('+'.join(atoms))
+            rnd.shuffle(attrs)
+            tax = '/'.join(attrs)
+            if tax != tax_canon and _outcome(gt, tax) == tax_canon:
+                ret.append(tax)
+                break
+    return ret
+
+
+# mutations of valid strings used by the 'errors' corpus
+MUTATIONS = (
+    # duplicated attribute
+    lambda tax, rnd: '%s/%s' % (tax, _split_top(tax, '/')[0]),
+    # unknown atom
+    lambda tax, rnd: re.sub('[A-Z]+', lambda m: m.group(0) + 'Q', tax,
+                            count=1),
+    # bad parameter
+    lambda tax, rnd: re.sub(':[^/+;)]+', ':?', tax, count=1),
+    # empty brackets
+    lambda tax, rnd: re.sub('([A-Z]+)', '\\1()', tax, count=1),
+    # syntax errors
+    lambda tax, rnd: tax + '/',
+    lambda tax, rnd: tax.replace('/', '//', 1),
+    lambda tax, rnd: tax.lower(),
+    lambda tax, rnd: tax[:rnd.randint(1, max(1, len(tax) - 1))],
+)
+
+
+def _errors(gt, n, rnd, stats):
+    ret = []
+    valid = _valid(gt, n, rnd)
+    for _ in range(n * 50):
+        if len(ret) >= n:
+            break
+        tax = rnd.choice(valid)
+        if rnd.random() < ERRORS_VALID_FRACTION:
+            ret.append(tax)
+            continue
+        tax = rnd.choice(MUTATIONS)(tax, rnd)
+        try:
+            gt.validate(tax, build_tree=False)
+        except ValueError:
+            ret.append(tax)
+        except Exception:
+            # not a validation error (a bug), it would stop the benchmark
+            stats['unexpected_errors'] += 1
+    return ret
+
+
+def corpus(vers, name, n, seed=0, stats=None):
+    '''
+    return the list of n (or less, if they can't be found) taxonomy
+    strings of the name corpus (see CORPORA), the same for the same
+    arguments and taxonomy data
+
+    stats: optional dictionary where 'unexpected_errors' is set to the
+           number of mutated strings left out of the 'errors' corpus
+           because their validation raised an exception other than
+           ValueError
+    '''
+    if name not in CORPORA:
+        raise ValueError('corpus %s unknown' % name)
+    if stats is None:
+        stats = {}
+    stats['unexpected_errors'] = 0
+    gt = GemTaxonomy(vers=vers)
+    rnd = random.Random('%s-%s-%d' % (gt.tax_vers, name, seed))
+    if name == 'errors':
+        return _errors(gt, n, rnd, stats)
+    return globals()['_' + name](gt, n, rnd)
+
+
+def _percentile(values_sorted, pct):
+    if not values_sorted:
+        return 0
+    return values_sorted[min(len(values_sorted) - 1,
+                             int(round(pct / 100 * (len(values_sorted) - 1))))]
+
+
+def _function(gt, benchmark):
+    if benchmark == 'validate':
+        return gt.validate
+    elif benchmark.startswith('explain_'):
+        return functools.partial(gt.explain, fmt=benchmark[len('explain_'):])
+    elif benchmark == 'split_by_attributes':
+        # exposure records with the taxonomy and the asset id
+        return lambda tax: gt.split_by_attributes(
+            '%s,%d' % (tax, len(tax)), ',', 0, 'id')
+    raise ValueError('benchmark %s unknown' % benchmark)
+
+
+def _calls(func, taxs):
+    '''
+    RETURN:
+    elapsed ns, latencies ns, number of ValueError raised
+    '''
+    perf_counter_ns = time.perf_counter_ns
+    latencies = []
+    n_errors = 0
+    t_start = perf_counter_ns()
+    for tax in taxs:
+        t_call = perf_counter_ns()
+        try:
+            func(tax)
+        except ValueError:
+            n_errors += 1
+        latencies.append(perf_counter_ns() - t_call)
+    return perf_counter_ns() - t_start, latencies, n_errors
+
+
+def _result(vers, name, benchmark, n_strings, n_errors, elapsed_ns,
+            latencies, latency_of, peak_memory):
+    latencies = sorted(latencies)
+    return {
+        'version': vers, 'corpus': name, 'benchmark': benchmark,
+        'strings': n_strings, 'errors': n_errors,
+        'seconds': elapsed_ns / 1e9,
+        'strings_per_s': (n_strings / (elapsed_ns / 1e9)
+                          if elapsed_ns > 0 else 0.0),
+        'latency_of': latency_of,
+        'p50_us': _percentile(latencies, 50) / 1e3,
+        'p99_us': _percentile(latencies, 99) / 1e3,
+        'peak_memory_bytes': peak_memory}
+
+
+def bench_calls(vers, name, benchmark, taxs, gt_kwargs=None, repeat=1,
+                memory=True):
+    '''
+    run benchmark on taxs with a new GemTaxonomy(vers, **gt_kwargs), each
+    string is processed repeat times (the following ones hit the caches),
+    the peak memory is traced (with tracemalloc) in a separate run
+
+    RETURN:
+    result dictionary (latencies are per string)
+    '''
+    gt_kwargs = gt_kwargs or {}
+    taxs = taxs * repeat
+    # shared data loaded in advance
+    GemTaxonomy(vers=vers, **gt_kwargs).validate('UNK')
+    elapsed_ns, latencies, n_errors = _calls(
+        _function(GemTaxonomy(vers=vers, **gt_kwargs), benchmark), taxs)
+    peak_memory = None
+    if memory:
+        gt = GemTaxonomy(vers=vers, **gt_kwargs)
+        func = _function(gt, benchmark)
+        tracemalloc.start()
+        try:
+            _calls(func, taxs)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return _result(vers, name, benchmark, len(taxs), n_errors, elapsed_ns,
+                   latencies, 'string', peak_memory)
+
+
+def _run_csv_validate(argv, stderr):
+    '''
+    stderr: file where the standard error of the run is written
+
+    RETURN:
+    elapsed ns, peak resident memory in bytes (None if not available),
+    exit status (negative signal number if killed by a signal)
+    '''
+    cmd = [sys.executable, '-c', CSV_VALIDATE_RUNNER,
+           'gem-taxonomy-csv-validate'] + argv
+    t_start = time.perf_counter_ns()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr)
+    if hasattr(os, 'wait4'):
+        # the process is reaped here, not by proc.wait()
+        _, status, rusage = os.wait4(proc.pid, 0)
+        if os.WIFSIGNALED(status):
+            proc.returncode = -os.WTERMSIG(status)
+        else:
+            proc.returncode = os.WEXITSTATUS(status)
+        # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+        peak_memory = rusage.ru_maxrss * (
+            1 if sys.platform == 'darwin' else 1024)
+    else:
+        proc.wait()
+        peak_memory = None
+    return time.perf_counter_ns() - t_start, peak_memory, proc.returncode
+
+
+def bench_csv_validate(vers, name, taxs, runs=3):
+    '''
+    run gem-taxonomy-csv-validate runs times (in new processes, startup
+    included) on a csv file of taxs
+
+    RETURN:
+    result dictionary (latencies are per run, errors is the number of not
+    valid strings, unexpected_errors the number of runs that didn't exit
+    with 0, or 1 if errors > 0, and unexpected_output the standard error
+    of the last of them)
+    '''
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'exposure.csv')
+        with open(filename, 'w', newline='') as csvfile:
+            csvfile.write('id,taxonomy\n')
+            for idx, tax in enumerate(taxs):
+                csvfile.write('%d,"%s"\n' % (idx, tax.replace('"', '""')))
+        gt = GemTaxonomy(vers=vers)
+        n_errors = sum(1 for tax in taxs if _outcome(gt, tax) is None)
+        expected_status = 1 if n_errors > 0 else 0
+
+        latencies = []
+        peak_memory = None
+        unexpected_errors = 0
+        unexpected_output = None
+        for _ in range(runs):
+            with tempfile.TemporaryFile(mode='w+', dir=tmpdir) as stderr:
+                elapsed_ns, peak, status = _run_csv_validate(
+                    [filename, '-t', vers], stderr)
+                if status != expected_status:
+                    # a crash or a wrong outcome, not only a slow run
+                    unexpected_errors += 1
+                    stderr.seek(0)
+                    unexpected_output = (
+                        'exit status %d\n%s' % (status, stderr.read()))
+            latencies.append(elapsed_ns)
+            if peak is not None:
+                peak_memory = max(peak_memory or 0, peak)
+    elapsed_ns = sorted(latencies)[len(latencies) // 2]
+    return dict(_result(vers, name, 'csv_validate', len(taxs), n_errors,
+                        elapsed_ns, latencies, 'run', peak_memory),
+                unexpected_errors=unexpected_errors,
+                unexpected_output=unexpected_output)
+
+
+def run(versions, corpora=CORPORA, benchmarks=BENCHMARKS, n=2000, seed=0,
+        gt_kwargs=None, repeat=1, memory=True, csv_runs=3):
+    '''
+    run benchmarks on each corpus of each taxonomy version
+
+    RETURN:
+    report dictionary, with the environment, the list of corpora (with
+    the number of strings and of unexpected errors, see corpus()) and the
+    list of results
+    '''
+    gt_kwargs = gt_kwargs or {}
+    corpora_info = []
+    results = []
+    for vers in versions:
+        for name in corpora:
+            stats = {}
+            taxs = corpus(vers, name, n, seed, stats)
+            corpora_info.append(dict(stats, version=vers, corpus=name,
+                                     strings=len(taxs)))
+            for benchmark in benchmarks:
+                if benchmark == 'csv_validate':
+                    results.append(bench_csv_validate(
+                        vers, name, taxs, csv_runs))
+                else:
+                    results.append(bench_calls(
+                        vers, name, benchmark, taxs, gt_kwargs, repeat,
+                        memory))
+
+    return {
+        'gem_taxonomy': __version__,
+        'gem_taxonomy_data': GemTaxonomy.gtd_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': dict(gt_kwargs, strings=n, seed=seed, repeat=repeat,
+                        csv_runs=csv_runs),
+        'max_rss_bytes': (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss *
+            (1 if sys.platform == 'darwin' else 1024)
+            if resource is not None else None),
+        'corpora': corpora_info,
+        'results': results}
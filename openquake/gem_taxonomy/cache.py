@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import os
+import sys
+import json
+import sqlite3
+import weakref
+import warnings
+import threading
+import collections
+
+
+class LRUCache:
+    '''
+    Bounded mapping with least-recently-used eviction and hit/miss
+    counters, a maxsize less or equal to 0 disables the cache.
+    '''
+    MISSING = object()
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        return the value associated to key or LRUCache.MISSING
+        '''
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return self.MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._data),
+                    'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __getstate__(self):
+        # locks can't be pickled, a new one is created by __setstate__()
+        with self._lock:
+            state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def user_cache_dir():
+    '''
+    per user cache directory of the package
+    '''
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        if sys.platform == 'win32':
+            base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        elif sys.platform == 'darwin':
+            base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+        else:
+            base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'openquake-gem-taxonomy')
+
+
+def user_cache_path(path):
+    '''
+    return the absolute path of path in the user cache directory, a
+    relative path is relative to it; ValueError is raised if path is
+    outside of it
+    '''
+    cache_dir = os.path.realpath(user_cache_dir())
+    ret = os.path.realpath(os.path.join(cache_dir, os.path.expanduser(path)))
+    if os.path.commonpath([cache_dir, ret]) != cache_dir or ret == cache_dir:
+        raise ValueError('path [%s] is not in the user cache directory'
+                         ' [%s]' % (path, cache_dir))
+    return ret
+
+
+def is_user_private(stat):
+    '''
+    True if the file of stat (an os.stat() result) is owned by the current
+    user and not writable by others, always True where file ownership is
+    not available
+    '''
+    if not hasattr(os, 'getuid'):
+        return True
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+class DiskCache:
+    '''
+    Persistent mapping of taxonomy strings to their validate() entries
+    stored in a SQLite database and keyed by versions (a tuple of package,
+    data and taxonomy versions) too.
+
+    Entries of versions are all read when the cache is opened, rows of
+    other package or data versions are removed at the same time; new
+    entries are written by save() or close(), if autosave is True they are
+    written also when the instance is garbage collected or at exit (the
+    instance is not kept alive until then).
+    A not usable database only produces a warning: the cache stays empty.
+    '''
+    FILENAME = 'validate.sqlite'
+
+    def __init__(self, path, versions, autosave=True):
+        if path is None:
+            path = os.path.join(user_cache_dir(), self.FILENAME)
+        self.path = path
+        self.versions = tuple(str(vers) for vers in versions)
+        self.autosave = autosave
+        self.loaded = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._new = {}
+        self._lock = threading.Lock()
+        try:
+            self._load()
+        except (OSError, sqlite3.Error) as exc:
+            warnings.warn('disk cache \'%s\' not loaded: %s' % (path, exc))
+        self._autosave()
+
+    def _autosave(self):
+        # the finalizer refers to the new entries, not to the instance
+        self._finalizer = (weakref.finalize(
+            self, self._save, self.path, self.versions, self._new,
+            self._lock) if self.autosave else None)
+
+    @staticmethod
+    def _connect(path):
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS validate ('
+            ' pkg_vers TEXT, data_vers TEXT, tax_vers TEXT, tax_str TEXT,'
+            ' entry TEXT,'
+            ' PRIMARY KEY (pkg_vers, data_vers, tax_vers, tax_str))')
+        return conn
+
+    def _load(self):
+        conn = self._connect(self.path)
+        try:
+            with conn:
+                conn.execute(
+                    'DELETE FROM validate WHERE pkg_vers != ?'
+                    ' OR data_vers != ?', self.versions[:2])
+            for tax_str, entry in conn.execute(
+                    'SELECT tax_str, entry FROM validate WHERE pkg_vers = ?'
+                    ' AND data_vers = ? AND tax_vers = ?', self.versions):
+                error, attr_canon_in, report = json.loads(entry)
+                self._data[tax_str] = (error, attr_canon_in, None, report)
+        finally:
+            conn.close()
+        self.loaded = len(self._data)
+
+    def get(self, tax_str):
+        '''
+        return the (error, attr_canon_in, None, report) entry of tax_str
+        or LRUCache.MISSING
+        '''
+        with self._lock:
+            entry = self._data.get(tax_str, LRUCache.MISSING)
+            if entry is LRUCache.MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, tax_str, entry):
+        '''
+        store the validate() entry of tax_str, the Logic* tree is dropped
+        '''
+        error, attr_canon_in, _, report = entry
+        entry = (error, attr_canon_in, None, report)
+        with self._lock:
+            if tax_str not in self._data:
+                self._new[tax_str] = entry
+            self._data[tax_str] = entry
+
+    def update(self, entries):
+        '''
+        add new entries (as returned by pop_new() of another instance)
+        '''
+        for tax_str, entry in entries.items():
+            self.put(tax_str, entry)
+
+    def pop_new(self):
+        '''
+        return and forget the entries not yet saved
+        '''
+        with self._lock:
+            new = dict(self._new)
+            self._new.clear()
+        return new
+
+    def save(self):
+        '''
+        write the new entries to the database
+        '''
+        self._save(self.path, self.versions, self._new, self._lock)
+
+    def close(self):
+        '''
+        write the new entries to the database, following ones are not
+        written at exit
+        '''
+        if self._finalizer is not None:
+            self._finalizer.detach()
+            self._finalizer = None
+        self.save()
+
+    @staticmethod
+    def _save(path, versions, new_entries, lock):
+        with lock:
+            new = dict(new_entries)
+            new_entries.clear()
+        if not new:
+            return
+        try:
+            conn = DiskCache._connect(path)
+            try:
+                with conn:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO validate VALUES'
+                        ' (?, ?, ?, ?, ?)',
+                        [versions + (tax_str, json.dumps(
+                            (error, attr_canon_in, report)))
+                         for tax_str, (error, attr_canon_in, _, report)
+                         in new.items()])
+            finally:
+                conn.close()
+        except (OSError, sqlite3.Error) as exc:
+            warnings.warn('disk cache \'%s\' not saved: %s' % (
+                path, exc))
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._data),
+                    'loaded': self.loaded,
+                    'path': self.path}
+
+    def __getstate__(self):
+        # locks and finalizers can't be pickled, new ones are created by
+        # __setstate__()
+        with self._lock:
+            state = dict(self.__dict__)
+        del state['_lock'], state['_finalizer']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._autosave()
+
+    def __len__(self):
+        return len(self._data)
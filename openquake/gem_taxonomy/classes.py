@@ -15,8 +15,14 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import os
 import re
+import ast
 import json
+import pickle
+import hashlib
+import warnings
+import threading
 import collections
 import builtins
 from parsimonious.grammar import Grammar
@@ -25,6 +31,10 @@ from parsimonious.exceptions import (IncompleteParseError as
                                      ParsimIncompleteParseError)
 from openquake.gem_taxonomy_data import GemTaxonomyData
 from .version import __version__ as gem_taxonomy_version
+from .cache import LRUCache, DiskCache, user_cache_path, is_user_private
+from .instrument import PhaseProfiler
+from .parser import TaxonomyParser, TaxoAttr, TaxoAtom
+from .parser import ParseError as TaxoParseError
 
 #
 #  TODO:
@@ -32,8 +42,123 @@ from .version import __version__ as gem_taxonomy_version
 #    - complete code coverage with, possibly, fixtures where required
 #
 
+# compiled, read-only, version of a gem_tax['Atom'] element used by the
+# validation hot path (see GemTaxonomy.atom_spec())
+AtomSpec = collections.namedtuple('AtomSpec', [
+    'name', 'atom', 'attr', 'group', 'group_prog',
+    'deps', 'deny',
+    # arguments
+    'args', 'args_type_name', 'args_info', 'args_min', 'args_max',
+    'must_be_diff',
+    # parameters
+    'params', 'param_type_name', 'params_min', 'params_max',
+    'min', 'min_v', 'min_incl', 'max', 'max_v', 'max_incl',
+    'unit_measure'])
+
+
+# process-wide registry of the read-only data shared by GemTaxonomy
+# instances: {(group, taxonomy version): {attribute name: value}}
+_registry = {}
+_registry_lock = threading.RLock()
+
+
+def _registry_get(key, load):
+    '''
+    return the registry value of key, built once by load()
+    '''
+    value = _registry.get(key)
+    if value is None:
+        with _registry_lock:
+            value = _registry.get(key)
+            if value is None:
+                value = _registry[key] = load()
+    return value
+
+
+class ValidateManyResults:
+    '''
+    iterator returned by GemTaxonomy.validate_many(), for each input
+    taxonomy string (in input order) it returns a (canonical, report, error)
+    tuple, summary counts are updated during the iteration and are complete
+    when it is exhausted
+    '''
+    def __init__(self, gt, iterable, dedupe, on_error):
+        self.gt = gt
+        self.dedupe = dedupe
+        self.on_error = on_error
+        self.summary = {'total': 0, 'validated': 0, 'valid': 0,
+                        'canonical': 0, 'errors': 0}
+        self._iter = iter(iterable)
+        self._results = {}
+
+    def _validate(self, tax_str):
+        self.summary['validated'] += 1
+        try:
+            _, _, report = self.gt.validate(tax_str, build_tree=False)
+        except ValueError as exc:
+            return (None, None, exc)
+        if report['is_canonical']:
+            return (tax_str, report, None)
+        return (report['canonical'], report, None)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        tax_str = next(self._iter)
+        if self.dedupe:
+            result = self._results.get(tax_str)
+            if result is None:
+                result = self._results[tax_str] = self._validate(tax_str)
+        else:
+            result = self._validate(tax_str)
+
+        canonical, report, error = result
+        self.summary['total'] += 1
+        if error is not None:
+            self.summary['errors'] += 1
+            if self.on_error == 'raise':
+                raise error
+            return result
+        self.summary['valid'] += 1
+        if report['is_canonical']:
+            self.summary['canonical'] += 1
+        return (canonical, dict(report), None)
+
 
 class GemTaxonomy:
+    # available taxonomy string parser engines
+    PARSERS = ('fast', 'parsimonious')
+    # default maximum number of validate() results kept in memory
+    VALIDATE_CACHE_SIZE = 8192
+    # default maximum number of validated attributes kept in memory
+    ATTRIBUTE_CACHE_SIZE = 16384
+    # default maximum number of rendered explanations kept in memory
+    EXPLAIN_CACHE_SIZE = 4096
+    # default maximum number of rendered atoms kept in memory
+    FRAGMENT_CACHE_SIZE = 16384
+    # format of the snapshots written by save_snapshot()
+    SNAPSHOT_FORMAT = 2
+    # maximum length of the snapshot header line
+    SNAPSHOT_HEADER_SIZE = 4096
+    # attributes loaded on first access: {attribute name: group}, each
+    # group of attributes is built by the _load_<group> method
+    LAZY_ATTRS = {
+        'taxo_grammar': 'taxo_grammar',
+        'rangefloat_grammar': 'rangefloat_grammar',
+        'rangeint_grammar': 'rangeint_grammar',
+        'gtd': 'data', 'tax': 'data',
+        'attr_progs': 'specs', 'atom_specs': 'specs',
+        'param_options': 'specs'}
+    # methods measured by each PhaseProfiler phase (see profile_enable())
+    PROFILE_METHODS = {
+        'parse': ('parse_taxonomy', 'parse_attribute'),
+        'extract_atoms': ('extract_atoms',),
+        'validate_attribute': ('_validate_attribute',),
+        'validate_arguments': ('validate_arguments',),
+        'validate_parameters': ('validate_parameters',),
+        'canonical_sort': ('_canonical_sort',)}
+
     class EXPL_OUT_TYPE:
         SINGLELINE = 1
         MULTILINE = 2
@@ -105,8 +230,8 @@ class GemTaxonomy:
                 return json.dumps(ret)
 
     def logic_print(self, attrs):
-        self.LogicIndSet(0)
-        return ''.join([x.__repr__() for x in attrs])
+        ctx = self.LogicContext()
+        return ''.join([x._repr(ctx) for x in attrs])
 
     def logic_explain(self, attrs, format=None):
         '''
@@ -120,35 +245,166 @@ class GemTaxonomy:
                 (TODO 'html')    - hyperlinked version of the
                                    explanation
         '''
-        try:
-            output_type = self.EXPL_OUT_TYPE.DICT[
-                'textsingleline' if format is None else format]
-        except KeyError:
-            raise ValueError('format %s unknown' % format)
+        output_type = self.explain_output_type(format)
 
         if output_type in [self.EXPL_OUT_TYPE.JSON]:
+            # json trees are not cached: building a new one costs as
+            # much as copying a cached one (explain_to() caches the
+            # serialized text)
             ret = []
             for attr in attrs:
                 ret.append(attr.explain(output_type=output_type))
             return output_type, ret
         else:
-            self.LogicIndSet(0)
-            s = ''
-            for attr in attrs:
-                s += attr.explain(output_type=output_type)
-            if not attrs:
-                s = "Completely unknown taxonomy."
-            return output_type, s
-
-    class LogicAttribute:
-        def __init__(self, paself, attribute, atoms):
-            self.paself = paself
-            self.attribute = attribute
-            self.atoms = atoms
-
-        def explain(self, is_arg=False, output_type=None):
+            key = self.explain_cache_key(attrs, output_type)
+            expl = (LRUCache.MISSING if key is None else
+                    self.explain_cache.get(key))
+            if expl is LRUCache.MISSING:
+                out = []
+                self.logic_explain_text(out.append, attrs, output_type)
+                expl = ''.join(out)
+                if key is not None:
+                    self.explain_cache.put(key, expl)
+            return output_type, expl
+
+    def explain_cache_key(self, attrs, output_type):
+        '''
+        return the (taxonomy version, canonical string, output type) key
+        of the explanation of attrs, None if the cache is disabled or
+        attrs are not validate() results
+        '''
+        if self.explain_cache.maxsize <= 0:
+            return None
+        canonicals = []
+        for attr in attrs:
+            if attr.canonical is None:
+                return None
+            canonicals.append(attr.canonical)
+        return (self.tax_vers, '/'.join(canonicals), output_type)
+
+    def explain_output_type(self, format):
+        try:
+            return self.EXPL_OUT_TYPE.DICT[
+                'textsingleline' if format is None else format]
+        except KeyError:
+            raise ValueError('format %s unknown' % format)
+
+    def logic_explain_text(self, write, attrs, output_type):
+        '''
+        pass to write() the parts of the text explanation of attrs
+        '''
+        if not attrs:
+            write("Completely unknown taxonomy.")
+            return
+        ctx = self.LogicContext(self.fragment_cache)
+        for attr in attrs:
+            attr.explain_text(write, False, output_type, ctx)
+
+    def logic_explain_json(self, write, attrs):
+        '''
+        pass to write() the parts of the json encoding of the explanation
+        of attrs, the same text of json.dumps(logic_explain(attrs,
+        'json')[1])
+        '''
+        write('[')
+        for idx, attr in enumerate(attrs):
+            if idx > 0:
+                write(', ')
+            attr.explain_json(write)
+        write(']')
+
+    def logic_explain_to(self, fp, attrs, format=None):
+        '''
+        write to fp the explanation of attrs followed by a newline (as
+        dump_explain() prints it); it is written in many small parts, as
+        it is rendered, so fp should be buffered; only if the explanation
+        cache is enabled the whole text is built, to be cached
+
+        RETURN:
+        output type
+        '''
+        output_type = self.explain_output_type(format)
+        key = self.explain_cache_key(attrs, output_type)
+        if key is None:
+            write = fp.write
+        else:
+            expl = self.explain_cache.get(key)
+            if expl is not LRUCache.MISSING:
+                fp.write(expl)
+                fp.write('\n')
+                return output_type
+            out = []
+            write = out.append
+
+        if output_type in [self.EXPL_OUT_TYPE.JSON]:
+            self.logic_explain_json(write, attrs)
+        else:
+            self.logic_explain_text(write, attrs, output_type)
+
+        if key is not None:
+            expl = ''.join(out)
+            self.explain_cache.put(key, expl)
+            fp.write(expl)
+        fp.write('\n')
+        return output_type
+
+    class LogicContext:
+        '''
+        state of a single rendering (explain() or repr()) of a Logic*
+        tree, each call has its own so rendering is reentrant
+
+        fragment_cache: optional LRUCache of the rendered atoms (see
+                        LogicAtom.explain_text())
+        '''
+        __slots__ = ('indent', 'fragment_cache')
+
+        def __init__(self, fragment_cache=None):
+            self.indent = 0
+            self.fragment_cache = fragment_cache
+
+    class LogicRecord:
+        '''
+        base class of Logic* nodes: slotted read-only records, they refer
+        to the shared specifications entries (attribute dicts, AtomSpec
+        and parameter options titles) and are safely shared by cached
+        validation results
+        '''
+        __slots__ = ()
+
+        def _set(self, **fields):
+            for name, value in fields.items():
+                object.__setattr__(self, name, value)
+
+        def __setattr__(self, name, value):
+            raise AttributeError(
+                '%s object is read-only' % self.__class__.__name__)
+
+        def __delattr__(self, name):
+            raise AttributeError(
+                '%s object is read-only' % self.__class__.__name__)
+
+        def __getstate__(self):
+            # copy and pickle support, the default slots state is
+            # restored with setattr()
+            return {name: getattr(self, name)
+                    for klass in type(self).__mro__
+                    for name in getattr(klass, '__slots__', ())}
+
+        def __setstate__(self, state):
+            self._set(**state)
+
+    class LogicAttribute(LogicRecord):
+        __slots__ = ('attribute', 'atoms', 'canonical')
+
+        def __init__(self, attribute, atoms, canonical=None):
+            self._set(attribute=attribute, atoms=tuple(atoms),
+                      canonical=canonical)
+
+        def explain(self, is_arg=False, output_type=None, ctx=None):
             if output_type is None:
                 output_type = GemTaxonomy.EXPL_OUT_TYPE.SINGLELINE
+            if ctx is None:
+                ctx = GemTaxonomy.LogicContext()
 
             if output_type in [GemTaxonomy.EXPL_OUT_TYPE.JSON]:
                 return {
@@ -159,12 +415,33 @@ class GemTaxonomy:
                               for atom in self.atoms]
                     }
 
-            s = ''
+            out = []
+            self.explain_text(out.append, is_arg, output_type, ctx)
+            return ''.join(out)
+
+        def explain_json(self, write):
+            '''
+            pass to write() the parts of the json encoding of
+            explain(output_type=JSON)
+            '''
+            write('{"name": %s, "title": %s, "atoms": [' % (
+                json.dumps(self.attribute['name']),
+                json.dumps(self.attribute['title'])))
+            for idx, atom in enumerate(self.atoms):
+                if idx > 0:
+                    write(', ')
+                atom.explain_json(write)
+            write(']}')
+
+        def explain_text(self, write, is_arg, output_type, ctx):
+            '''
+            pass to write() the parts of the text explanation
+            '''
             if not is_arg:
-                s += '%s: ' % self.attribute['title']
+                write('%s: ' % self.attribute['title'])
                 if output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
-                    s += '\n'
-                    self.paself.LogicIndInc(4)
+                    write('\n')
+                    ctx.indent += 4
 
             if output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
                 j_str = ',' + '\n'
@@ -173,57 +450,66 @@ class GemTaxonomy:
 
             for idx, atom in enumerate(self.atoms):
                 if idx == 0:
-                    s += atom.explain(output_type=output_type)
+                    atom.explain_text(write, False, output_type, ctx)
                     if output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
-                        self.paself.LogicIndInc(4)
+                        ctx.indent += 4
                 else:
-                    s += j_str + atom.explain(output_type=output_type)
+                    write(j_str)
+                    atom.explain_text(write, False, output_type, ctx)
             if output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
-                self.paself.LogicIndDec(4)
+                ctx.indent -= 4
 
             if not is_arg:
-                s += '.'
+                write('.')
                 if output_type == GemTaxonomy.EXPL_OUT_TYPE.SINGLELINE:
-                    s += ' '
+                    write(' ')
                 elif output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
-                    s += '\n'
+                    write('\n')
 
             if not is_arg:
                 if output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
-                    self.paself.LogicIndDec(4)
-            return s
+                    ctx.indent -= 4
 
         def __repr__(self):
-            indent = self.paself.LogicIndentation
-            self.paself.LogicIndentation += 4
+            return self._repr(GemTaxonomy.LogicContext())
+
+        def _repr(self, ctx):
+            indent = ctx.indent
+            ctx.indent += 4
             ret = '%s<ATTR id="0x%xd" name="%s">\n%s%s</ATTR>\n' % (
                 (' ' * indent),
                 id(self), self.attribute['name'],
-                ''.join([x.__repr__() for x in self.atoms]),
+                ''.join([x._repr(ctx) for x in self.atoms]),
                 (' ' * indent)
             )
-            self.paself.LogicIndentation -= 4
+            ctx.indent -= 4
             return ret
 
-    class LogicAtom:
-        def __init__(self, paself, text, atom, args, params, canonical):
-            self.paself = paself
-            self.text = text
-            self.atom = atom
-            self.args = args
-            self.params = params
-            self.canonical = canonical
+    class LogicAtom(LogicRecord):
+        __slots__ = ('text', 'spec', 'args', 'params', 'canonical')
+
+        def __init__(self, text, spec, args, params, canonical):
+            self._set(text=text, spec=spec, args=tuple(args),
+                      params=tuple(params), canonical=canonical)
+
+        @property
+        def atom(self):
+            '''
+            gem_tax['Atom'] element of the atom
+            '''
+            return self.spec.atom
 
-        def explain(self, is_arg=False, output_type=None):
+        def explain(self, is_arg=False, output_type=None, ctx=None):
             if output_type is None:
                 output_type = GemTaxonomy.EXPL_OUT_TYPE.SINGLELINE
+            if ctx is None:
+                ctx = GemTaxonomy.LogicContext()
 
             if output_type in [GemTaxonomy.EXPL_OUT_TYPE.JSON]:
-                name = self.atom['name']
+                atom = self.spec.atom
                 ret = {
-                    'name': name,
-                    'title': self.paself.tax['AtomDict'][name][
-                        'title'],
+                    'name': atom['name'],
+                    'title': atom['title'],
                 }
                 if self.args:
                     ret['args'] = [arg.explain(
@@ -236,35 +522,84 @@ class GemTaxonomy:
                                param in self.params]
 
                 return ret
-            s = ''
 
+            out = []
+            self.explain_text(out.append, is_arg, output_type, ctx)
+            return ''.join(out)
+
+        def explain_json(self, write):
+            '''
+            pass to write() the parts of the json encoding of
+            explain(output_type=JSON)
+            '''
+            atom = self.spec.atom
+            write('{"name": %s, "title": %s' % (
+                json.dumps(atom['name']), json.dumps(atom['title'])))
+            if self.args:
+                write(', "args": [')
+                for idx, arg in enumerate(self.args):
+                    if idx > 0:
+                        write(', ')
+                    arg.explain_json(write)
+                write(']')
+            if self.params:
+                write(', "params": [%s]' % ', '.join([
+                    json.dumps(param.explain(
+                        output_type=GemTaxonomy.EXPL_OUT_TYPE.JSON))
+                    for param in self.params]))
+            write('}')
+
+        def explain_text(self, write, is_arg, output_type, ctx):
+            '''
+            pass to write() the parts of the text explanation, the one of
+            atoms with arguments or parameters is memoized by canonical
+            form and indentation in ctx.fragment_cache (of a single
+            taxonomy version)
+            '''
+            fragment_cache = ctx.fragment_cache
+            if (self.canonical is None or
+                    not (self.args or self.params) or
+                    fragment_cache is None or fragment_cache.maxsize <= 0):
+                self._explain_text(write, output_type, ctx)
+                return
+            key = (self.canonical, output_type, ctx.indent)
+            fragment = fragment_cache.get(key)
+            if fragment is LRUCache.MISSING:
+                parts = []
+                self._explain_text(parts.append, output_type, ctx)
+                fragment = ''.join(parts)
+                fragment_cache.put(key, fragment)
+            write(fragment)
+
+        def _explain_text(self, write, output_type, ctx):
             if output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
-                indent = self.paself.LogicIndGet()
-                s += ' ' * indent
+                indent = ctx.indent
+                write(' ' * indent)
 
             if ', ' in self.atom['title']:
                 title = '"%s"' % self.atom['title']
             else:
                 title = self.atom['title']
-            s += title
+            write(title)
 
             if self.args:
-                s += ' ('
+                write(' (')
                 if output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
-                    s += '\n'
-                    indent = self.paself.LogicIndInc(4)
+                    write('\n')
+                    ctx.indent += 4
+                    indent = ctx.indent
 
                 n_args = len(self.args)
                 for idx, arg in enumerate(self.args):
-                    s += arg.explain(is_arg=True, output_type=output_type)
+                    arg.explain_text(write, True, output_type, ctx)
                     # if idx < (n_args - 2):
                     if idx < (n_args - 1):
                         if (output_type ==
                                 GemTaxonomy.EXPL_OUT_TYPE.SINGLELINE):
-                            s += '; '
+                            write('; ')
                         elif (output_type ==
                               GemTaxonomy.EXPL_OUT_TYPE.MULTILINE):
-                            s += ';' + '\n'
+                            write(';' + '\n')
                     # elif idx < (n_args - 1):
                     #     if (output_type ==
                     #         GemTaxonomy.EXPL_OUT_TYPE.SINGLELINE):
@@ -273,26 +608,29 @@ class GemTaxonomy:
                     #           GemTaxonomy.EXPL_OUT_TYPE.MULTILINE):
                     #         s += ' and\n'
                 if output_type == GemTaxonomy.EXPL_OUT_TYPE.MULTILINE:
-                    s += '\n'
-                    indent = self.paself.LogicIndDec(4)
-                    s += ' ' * indent
-                s += ')'
+                    write('\n')
+                    ctx.indent -= 4
+                    indent = ctx.indent
+                    write(' ' * indent)
+                write(')')
             if self.params:
-                s += ': '
-                s += ' '.join([param.explain(output_type=output_type) for
-                               param in self.params])
-
-            return s
+                write(': ')
+                write(' '.join([param.explain(output_type=output_type)
+                                for param in self.params]))
 
         def __repr__(self):
-            indent = self.paself.LogicIndentation
-            self.paself.LogicIndentation += 4
+            return self._repr(GemTaxonomy.LogicContext())
+
+        def _repr(self, ctx):
+            indent = ctx.indent
+            ctx.indent += 4
 
-            name = self.atom['name']
+            name = self.spec.name
+            title = self.spec.atom['title']
             if len(self.args) > 0:
-                self.paself.LogicIndentation += 4
-                args_list = [x.__repr__() for x in self.args]
-                self.paself.LogicIndentation -= 4
+                ctx.indent += 4
+                args_list = [x._repr(ctx) for x in self.args]
+                ctx.indent -= 4
 
                 args = '%s<args>\n%s%s</args>\n' % (
                     ' ' * (indent + 4),
@@ -304,7 +642,7 @@ class GemTaxonomy:
             if len(self.params) > 0:
                 params = '%s<params>\n%s%s</params>\n' % (
                     ' ' * (indent + 4),
-                    ''.join(['%s' % x.__repr__() for x in self.params]),
+                    ''.join(['%s' % x._repr(ctx) for x in self.params]),
                     ' ' * (indent + 4),
                 )
             else:
@@ -313,20 +651,21 @@ class GemTaxonomy:
             if len(self.args) == 0 and len(self.params) == 0:
                 ret = ('%s<ATOM id="0x%xd" name="%s"'
                        ' title="%s"/>\n') % (
-                           ' ' * indent, id(self), name,
-                           self.paself.tax['AtomDict'][name]['title'])
+                           ' ' * indent, id(self), name, title)
             else:
                 ret = ('%s<ATOM id="0x%xd" name="%s"'
                        ' title="%s">\n%s%s%s</ATOM>\n') % (
-                           ' ' * indent, id(self), name,
-                           self.paself.tax['AtomDict'][name]['title'],
+                           ' ' * indent, id(self), name, title,
                            args, params, ' ' * indent)
 
-            self.paself.LogicIndentation -= 4
+            ctx.indent -= 4
 
             return ret
 
-    class LogicParam:
+    class LogicParam(LogicRecord):
+        __slots__ = ('atom', 'type', 'subtype', 'title', 'value', 'unit_meas',
+                     'unit_meas_is_single')
+
         TYPE_OPTION = 1
         TYPE_INT = 2
         TYPE_FLOAT = 3
@@ -354,16 +693,16 @@ class GemTaxonomy:
         UNIT_MEAS_SINGLE = 0
         UNIT_MEAS_PLURAL = 1
 
-        def __init__(self, paself, atom, type, subtype,
-                     title, value, unit_meas):
-            self.paself = paself
-            self.atom = atom
-            self.type = type
-            self.subtype = subtype
-            self.title = title
-            self.value = value
-            self.unit_meas = unit_meas
-            self.unit_meas_is_single = None
+        # unit_meas_is_single: optional function(value_out) -> bool of
+        # the instance, if None unit_meas_is_single_default() is used
+        def __init__(self, atom, type, subtype, title, value, unit_meas,
+                     unit_meas_is_single=None):
+            self._set(atom=atom, type=type, subtype=subtype,
+                      unit_meas_is_single=unit_meas_is_single,
+                      title=title, value=(tuple(value)
+                                          if isinstance(value, list)
+                                          else value),
+                      unit_meas=unit_meas)
 
         def unit_meas_is_single_default(self, value_out):
             if value_out == '1':
@@ -386,20 +725,16 @@ class GemTaxonomy:
                 raise ValueError('unknown param type %d' % self.type)
 
             if self.type == self.TYPE_OPTION:
-                atom_name = self.atom.split(':')[0]
-                opt_key = ':'.join(self.atom.split(':')[1:] + [self.value])
-                param = [
-                    x for x in self.paself.tax['Param'][atom_name]
-                    if x['name'] == opt_key][0]
+                # title is the one of the param_options entry of value
                 if output_type in [GemTaxonomy.EXPL_OUT_TYPE.JSON]:
                     return {
                         'type': self.type_s(),
                         'subtype': self.subtype_s(),
                         'value': self.value,
-                        'title': [param['title']]
+                        'title': [self.title]
                         }
                 else:
-                    return param['title']
+                    return self.title
             else:
                 # add other if if other types '%f' if
                 # self.type == self.TYPE_FLOAT)
@@ -407,7 +742,7 @@ class GemTaxonomy:
                 fconv = getattr(builtins, (
                     'int' if self.type == self.TYPE_INT else 'float'))
                 if output_type in [GemTaxonomy.EXPL_OUT_TYPE.JSON]:
-                    if type(self.value) is list:
+                    if type(self.value) in (list, tuple):
                         value = [fconv(v) for v in self.value]
                     else:
                         value = fconv(self.value)
@@ -440,32 +775,35 @@ class GemTaxonomy:
             return ret
 
         def __repr__(self):
+            return self._repr(GemTaxonomy.LogicContext())
+
+        def _repr(self, ctx):
             form = '%d' if self.type == self.TYPE_INT else '%s'
             fconv = getattr(builtins, (
                 'int' if self.type == self.TYPE_INT else 'float'))
 
-            self.paself.LogicIndentation += 4
-            indent = self.paself.LogicIndentation
+            ctx.indent += 4
+            indent = ctx.indent
             if self.type == self.TYPE_OPTION:
                 # PAY ATTENTION:  currently TYPE_OPTION support
                 #                 just 1 parameter, for multiple parameter
                 # all the parents hierarchy must be available in the
                 # tax['Param'][<ATOM>] list of partial elements
 
-                self.paself.LogicIndentation += 4
-                indent = self.paself.LogicIndentation
+                ctx.indent += 4
+                indent = ctx.indent
                 v = '%s<value >%s</value>\n' % (
                     ' ' * indent, self.value)
-                self.paself.LogicIndentation -= 4
-                indent = self.paself.LogicIndentation
+                ctx.indent -= 4
+                indent = ctx.indent
                 ret = ('%s<param subtype="%s" title="%s" type="%s">'
                        '\n%s%s</param>\n') % (
                         (' ' * indent), self.subtype_s(),
                         self.title, self.type_s(), v,
                         (' ' * indent))
             else:
-                self.paself.LogicIndentation += 4
-                indent = self.paself.LogicIndentation
+                ctx.indent += 4
+                indent = ctx.indent
                 if self.subtype == self.SUBTYPE_RANGE:
                     v = '%s<value>%s</value>\n%s<value>%s</value>\n' % (
                         ' ' * indent, form % fconv(self.value[0]),
@@ -473,8 +811,8 @@ class GemTaxonomy:
                 else:
                     v = '%s<value>%s</value>\n' % (
                         ' ' * indent, form % fconv(self.value))
-                self.paself.LogicIndentation -= 4
-                indent = self.paself.LogicIndentation
+                ctx.indent -= 4
+                indent = ctx.indent
 
                 ret = ('%s<param subtype="%s" type="%s"'
                        ' unit_meas_plural="%s"'
@@ -482,61 +820,299 @@ class GemTaxonomy:
                            (' ' * indent), self.subtype_s(), self.type_s(),
                            self.unit_meas[1], self.unit_meas[0], v,
                            (' ' * indent))
-            self.paself.LogicIndentation -= 4
+            ctx.indent -= 4
 
             return ret
 
-    def __init__(self, vers='4'):
-        self.LogicIndentation = 0
+    def __init__(self, vers='4', cache_size=VALIDATE_CACHE_SIZE,
+                 attr_cache_size=ATTRIBUTE_CACHE_SIZE, parser='fast',
+                 disk_cache=None, snapshot=None,
+                 explain_cache_size=EXPLAIN_CACHE_SIZE,
+                 fragment_cache_size=FRAGMENT_CACHE_SIZE, profile=None):
+        '''
+        vers:            taxonomy specifications version
+        cache_size:      maximum number of validate() results cached,
+                         0 to disable the cache
+        attr_cache_size: maximum number of validated attributes cached,
+                         0 to disable the cache
+        parser:          taxonomy string parser engine, 'fast' (recursive
+                         descent, see parser.py) or 'parsimonious'
+        disk_cache:      persistent validate() results cache (see
+                         DiskCache): None to disable it, True for the
+                         default file in the user cache directory, a path
+                         or a DiskCache instance
+        snapshot:        path of a snapshot (see save_snapshot()) of the
+                         shared data in the user cache directory, True
+                         for the default one; it is written if missing or
+                         stale (the file must be trusted, it is a pickle)
+        explain_cache_size:  maximum number of explanations cached, by
+                             canonical string and format, 0 to disable
+        fragment_cache_size: maximum number of rendered atoms (with
+                             arguments or parameters) cached, 0 to
+                             disable
+        profile:         validation phases instrumentation (see
+                         profile_enable()): None to disable it, True for a
+                         new PhaseProfiler or a PhaseProfiler instance
+        '''
+        if parser not in self.PARSERS:
+            raise ValueError('Allowed parsers are %s' % ", ".join(
+                self.PARSERS))
+        self.parser = parser
+        self.taxo_parser = TaxonomyParser()
 
         if vers == '3':
             vers = '3.3'
         elif vers == '4':
             vers = '4.0'
 
-        if vers == '3.3' or vers == '4.0':
-            self.taxo_grammar = Grammar(r'''
-                taxo = "UNK" / ( attr ( "/" attr )* )
-                attr = atom ( "+" atom )*
-                atom = ~r"[A-Z][A-Z0-9]*" atom_args* atom_params*
-                atom_args = "(" attr ( ";" attr )* ")"
-                atom_params = ":" ~r"[A-Za-z0-9<>-][A-Za-z0-9.-]*"
-                ''')
-
-            # flo = ~r'[0-9]+'
-            self.rangefloat_grammar = Grammar(r'''
-                range = float_value "-" float_value
-                float_value = ~r"[0-9-]?" ~r"[0-9.]*" ( ~r"e[+-]?[0-9]+" )?
-                ''')
-            self.rangeint_grammar = Grammar(r'''
-                range = integer_value "-" integer_value
-                integer_value = ~r"[0-9-]" ~r"[0-9]*"
-                ''')
-        else:
+        if vers != '3.3' and vers != '4.0':
             raise ValueError('Allowed versions are currently %s' % ", ".join(
                 GemTaxonomy.available_tax_versions()))
 
-        self.gtd = GemTaxonomyData()
-        self.tax = self.gtd.load(vers)
+        self.tax_vers = vers
+        # grammars, taxonomy data and atom specifications are loaded on
+        # first access (see __getattr__) and shared by all the instances
+        self.validate_cache = LRUCache(cache_size)
+        self.attr_cache = LRUCache(attr_cache_size)
+        self.explain_cache = LRUCache(explain_cache_size)
+        self.fragment_cache = LRUCache(fragment_cache_size)
+        self.profiler = None
+        if profile is not None:
+            self.profile_enable(None if profile is True else profile)
+        if disk_cache is None or isinstance(disk_cache, DiskCache):
+            self.disk_cache = disk_cache
+        else:
+            self.disk_cache = DiskCache(
+                None if disk_cache is True else disk_cache,
+                (gem_taxonomy_version, self.gtd_version(), self.tax_vers))
+        if snapshot is True:
+            snapshot = 'taxonomy%s.snapshot' % self.tax_vers
+        if snapshot is not None and not self.load_snapshot(snapshot):
+            try:
+                self.save_snapshot(snapshot)
+            except OSError as exc:
+                warnings.warn('snapshot \'%s\' not saved: %s' % (
+                    snapshot, exc))
         # new_dict = {}
         # for k in ['Attribute', 'AtomsGroup', 'Atom']:
         #     if 'name' in self.tax[k][0]:
         #         new_dict[k + 'Dict'] = {x['name']: x for x in self.tax[k]}
         # self.tax.update(new_dict)
 
-    def LogicIndSet(self, value):
-        self.LogicIndentation = value
+    def __getattr__(self, name):
+        '''
+        called for missing attributes only: the first access to a lazy
+        attribute binds all the ones of its group to the instance, so
+        following accesses are plain attribute lookups
+        '''
+        group = self.LAZY_ATTRS.get(name)
+        if group is None or 'tax_vers' not in self.__dict__:
+            raise AttributeError('%r object has no attribute %r' % (
+                self.__class__.__name__, name))
+        self.__dict__.update(_registry_get(
+            (group, self.tax_vers), getattr(self, '_load_' + group)))
+        return self.__dict__[name]
+
+    def __getstate__(self):
+        '''
+        the lazy attributes are left out (they are bound again, from the
+        shared registry, on first access) as the measured phase methods
+        (profiling is enabled again by __setstate__())
+        '''
+        state = dict(self.__dict__)
+        for name in self.LAZY_ATTRS:
+            state.pop(name, None)
+        for names in self.PROFILE_METHODS.values():
+            for name in names:
+                state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.profiler is not None:
+            self.profiler = None
+            self.profile_enable(state['profiler'])
+
+    def _load_taxo_grammar(self):
+        return {'taxo_grammar': Grammar(r'''
+            taxo = "UNK" / ( attr ( "/" attr )* )
+            attr = atom ( "+" atom )*
+            atom = ~r"[A-Z][A-Z0-9]*" atom_args* atom_params*
+            atom_args = "(" attr ( ";" attr )* ")"
+            atom_params = ":" ~r"[A-Za-z0-9<>-][A-Za-z0-9.-]*"
+            ''')}
+
+    def _load_rangefloat_grammar(self):
+        # flo = ~r'[0-9]+'
+        return {'rangefloat_grammar': Grammar(r'''
+            range = float_value "-" float_value
+            float_value = ~r"[0-9-]?" ~r"[0-9.]*" ( ~r"e[+-]?[0-9]+" )?
+            ''')}
+
+    def _load_rangeint_grammar(self):
+        return {'rangeint_grammar': Grammar(r'''
+            range = integer_value "-" integer_value
+            integer_value = ~r"[0-9-]" ~r"[0-9]*"
+            ''')}
+
+    def _load_data(self):
+        gtd = GemTaxonomyData()
+        return {'gtd': gtd, 'tax': gtd.load(self.tax_vers)}
+
+    def _load_specs(self):
+        tax = self.tax
+        specs = {}
+        specs['attr_progs'] = {attr['name']: int(attr['prog'])
+                               for attr in tax['Attribute']}
+        specs['atom_specs'] = {atom['name']: self.atom_spec(atom)
+                               for atom in tax['Atom']}
+        # {atom: {option_key: option}} index of gem_tax['Param']
+        param_options = specs['param_options'] = {}
+        for atom_name, options in tax['Param'].items():
+            atom_options = param_options[atom_name] = {}
+            for option in options:
+                atom_options.setdefault(option['name'], option)
+        return specs
+
+    def snapshot_signature(self):
+        '''
+        snapshot format, package, data and taxonomy versions and checksum
+        of the taxonomy data file: a snapshot is loaded only if its
+        signature is the current one
+        '''
+        data_path = os.path.join(GemTaxonomyData.BASE_DATA_PATH,
+                                 'taxonomy%s_standard.json' % self.tax_vers)
+        with open(data_path, 'rb') as data_file:
+            checksum = hashlib.sha256(data_file.read()).hexdigest()
+        return (self.SNAPSHOT_FORMAT, gem_taxonomy_version,
+                self.gtd_version(), self.tax_vers, checksum)
+
+    def save_snapshot(self, path):
+        '''
+        write to path, in the user cache directory (see user_cache_path()),
+        the grammars, the taxonomy data and the atom specifications (all
+        the LAZY_ATTRS) of the taxonomy version: a json header line with
+        the signature and the sha256 checksum of the following pickle
+        '''
+        path = user_cache_path(path)
+        groups = {}
+        for name, group in self.LAZY_ATTRS.items():
+            groups.setdefault(group, {})[name] = getattr(self, name)
+        payload = pickle.dumps(groups, protocol=pickle.HIGHEST_PROTOCOL)
+        header = json.dumps({'signature': self.snapshot_signature(),
+                             'sha256': hashlib.sha256(payload).hexdigest()})
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        path_tmp = '%s.%d.tmp' % (path, os.getpid())
+        with os.fdopen(os.open(path_tmp, os.O_WRONLY | os.O_CREAT |
+                               os.O_TRUNC, 0o600), 'wb') as snapshot_file:
+            snapshot_file.write(header.encode('ascii') + b'\n')
+            snapshot_file.write(payload)
+        os.replace(path_tmp, path)
+
+    def load_snapshot(self, path):
+        '''
+        add the content of the snapshot in path, in the user cache
+        directory (see user_cache_path()), to the shared data of the
+        taxonomy version; the pickle is read only if the snapshot is owned
+        by the user, not writable by others, and its header has the
+        current signature and the checksum of the pickle
 
-    def LogicIndGet(self):
-        return self.LogicIndentation
+        RETURN:
+        True if loaded, False if missing, not readable, not private or
+        stale
+        '''
+        path = user_cache_path(path)
+        try:
+            with open(path, 'rb') as snapshot_file:
+                if not is_user_private(os.fstat(snapshot_file.fileno())):
+                    return False
+                header = json.loads(snapshot_file.readline(
+                    self.SNAPSHOT_HEADER_SIZE))
+                if (not isinstance(header, dict) or
+                        header.get('signature') !=
+                        list(self.snapshot_signature())):
+                    return False
+                payload = snapshot_file.read()
+        except (OSError, ValueError):
+            return False
+        if hashlib.sha256(payload).hexdigest() != header.get('sha256'):
+            return False
+        try:
+            groups = pickle.loads(payload)
+        except (EOFError, pickle.UnpicklingError):
+            return False
+        with _registry_lock:
+            # atom specifications refer to the taxonomy data of the same
+            # snapshot, they are not mixed with already loaded data
+            with_data = ('data', self.tax_vers) not in _registry
+            for group, values in groups.items():
+                if group == 'specs' and not with_data:
+                    continue
+                _registry.setdefault((group, self.tax_vers), values)
+        return True
+
+    def cache_info(self):
+        '''
+        return hits, misses, size and maxsize of the validation caches:
+        'validate' for full taxonomy strings and 'attribute' for single
+        attributes (arguments included), plus 'disk' for the persistent
+        cache if enabled, and of the explanation ones: 'explain' for
+        full explanations and 'fragment' for rendered atoms
+        '''
+        info = {'validate': self.validate_cache.info(),
+                'attribute': self.attr_cache.info(),
+                'explain': self.explain_cache.info(),
+                'fragment': self.fragment_cache.info()}
+        if self.disk_cache is not None:
+            info['disk'] = self.disk_cache.info()
+        return info
+
+    def cache_clear(self):
+        self.validate_cache.clear()
+        self.attr_cache.clear()
+        self.explain_cache.clear()
+        self.fragment_cache.clear()
+
+    def profile_enable(self, profiler=None):
+        '''
+        measure the validation phases (see PROFILE_METHODS) with profiler
+        (a new PhaseProfiler if None), the phase methods are replaced by
+        measured ones on this instance only, so when profiling is disabled
+        they run untouched
 
-    def LogicIndInc(self, delta):
-        self.LogicIndentation += delta
-        return self.LogicIndentation
+        RETURN:
+        the profiler
+        '''
+        if self.profiler is not None:
+            self.profile_disable()
+        if profiler is None:
+            profiler = PhaseProfiler()
+        for phase, names in self.PROFILE_METHODS.items():
+            for name in names:
+                self.__dict__[name] = profiler.wrap(
+                    phase, getattr(type(self), name).__get__(self))
+        self.profiler = profiler
+        return profiler
+
+    def profile_disable(self):
+        '''
+        restore the phase methods
 
-    def LogicIndDec(self, delta):
-        self.LogicIndentation -= delta
-        return self.LogicIndentation
+        RETURN:
+        the profiler (None if profiling was not enabled)
+        '''
+        for names in self.PROFILE_METHODS.values():
+            for name in names:
+                self.__dict__.pop(name, None)
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    @staticmethod
+    def logic_skip(*args):
+        '''
+        used in place of Logic* classes when the tree is not required
+        '''
+        return None
 
     def extract_atoms(self, attr_tree):
         atoms_trees = []
@@ -554,6 +1130,52 @@ class GemTaxonomy:
                                 atoms_trees.append(ggr_child)
         return atoms_trees
 
+    def compact_attr(self, attr_tree):
+        '''
+        convert a parsimonious 'attr' tree into the TaxoAttr form consumed
+        by validate_attribute()
+        '''
+        atoms = []
+        for atom_tree in self.extract_atoms(attr_tree):
+            atom = atom_tree.text
+            if len(atom_tree.children) != 3:
+                raise ValueError(
+                    'Attribute [%s]: malformed atom [%s]' % (
+                        attr_tree.text, atom))
+
+            tree_args = []
+            atom_tree_args = atom_tree.children[1]
+            nchs_args = len(atom_tree_args.children)
+            if nchs_args > 0:
+                atom_tree_args = atom_tree_args.children[0]
+                nchs_args = len(atom_tree_args.children)
+
+                if nchs_args > 2:
+                    if atom_tree_args.children[0].text == '(':
+                        if atom_tree_args.children[nchs_args - 1].text == ')':
+                            tree_args.append(
+                                atom_tree_args.children[1])
+                            if nchs_args > 3:
+                                other_args = (atom_tree_args.children[2]
+                                              .children)
+                                for arg_id in range(0, len(other_args)):
+                                    tree_args.append(
+                                        other_args[arg_id].children[1])
+
+            params = []
+            for param_child in atom_tree.children[2].children:
+                if param_child.expr.name != 'atom_params':
+                    raise ValueError(
+                        'Attribute [%s]: for atom [%s]'
+                        ' malformed parameters' % (attr_tree.text, atom))
+                params.append(param_child.children[1].text)
+
+            atoms.append(TaxoAtom(
+                atom, atom_tree.children[0].text,
+                tuple(self.compact_attr(x) for x in tree_args),
+                tuple(params)))
+        return TaxoAttr(attr_tree.text, tuple(atoms))
+
     def args__filtered_attribute(self, attribute_name, filtered_atoms):
         return {'args_type': 'filtered_attribute',
                 'attribute_name': attribute_name,
@@ -564,29 +1186,84 @@ class GemTaxonomy:
                 'atomsgroup_name': atomsgroup_name,
                 'filtered_atoms': filtered_atoms}
 
-    def validate_arguments(self, attr_base, atom_anc, tax_args, tree_args,
-                           atom_args_orig_in, filtered_atoms):
+    def atom_spec(self, atom):
+        '''
+        build the AtomSpec of a gem_tax['Atom'] element decoding once its
+        'args' and 'params' fields
+        '''
+        name = atom['name']
+        group_prog = int(self.tax['AtomsGroupDict'][atom['group']]['prog'])
+        deps = (tuple(self.tax['AtomsDeps'][name])
+                if name in self.tax['AtomsDeps'] else None)
+        deny = frozenset(self.tax['AtomsDeny'].get(name, ()))
+
+        tax_args = json.loads(atom['args']) if atom['args'] else None
+        args = tax_args if tax_args is not None else {}
+        args_type_name = None
+        args_info = None
+        if tax_args is not None:
+            args_type = tax_args.get('type', '')
+            args_type_name = args_type.split('(')[0]
+            if (args_type_name == 'filtered_attribute'
+                    or args_type_name == 'filtered_atomsgroup'):
+                try:
+                    args_values = ast.literal_eval(
+                        args_type[len(args_type_name):])
+                except (ValueError, SyntaxError):
+                    args_values = None
+                if isinstance(args_values, tuple):
+                    args_info = getattr(
+                        self, 'args__' + args_type_name)(*args_values)
+                    args_info['filtered_atoms'] = frozenset(
+                        args_info['filtered_atoms'])
+
+        tax_params = json.loads(atom['params']) if atom['params'] else None
+        if tax_params is not None:
+            param_type_name = tax_params['type'].split('(')[0]
+            params_min = tax_params.get('params_min', 1)
+            params = tax_params
+        else:
+            param_type_name = params_min = None
+            params = {}
+
+        return AtomSpec(
+            name=name, atom=atom, attr=atom['attr'], group=atom['group'],
+            group_prog=group_prog, deps=deps, deny=deny,
+            args=tax_args, args_type_name=args_type_name,
+            args_info=args_info,
+            args_min=args.get('args_min'), args_max=args.get('args_max'),
+            must_be_diff=bool(args.get('must_be_diff')),
+            params=tax_params, param_type_name=param_type_name,
+            params_min=params_min, params_max=params.get('params_max'),
+            min=params.get('min'), min_v=self.params_get(params, 'min'),
+            min_incl=params.get('min_incl', True),
+            max=params.get('max'), max_v=self.params_get(params, 'max'),
+            max_incl=params.get('max_incl', True),
+            unit_measure=params.get('unit_measure'))
+
+    def validate_arguments(self, attr_base, atom_anc, spec, tree_args,
+                           atom_args_orig_in, filtered_atoms,
+                           build_tree=True):
         '''
         attr_base: attribute base
         atom_anc: atom string included args and params
-        tax_args: 'args' field of gem_tax['Atom'] element
+        spec: AtomSpec of the atom
         tree_args: list of tree arguments
         atom_args_orig_in: flattened hierarchy of current atom
-        filtered_atoms: optional list of atoms not allowed as arguments
+        filtered_atoms: optional set of atoms not allowed as arguments
+        build_tree: if False Logic* arguments are not built (None returned)
 
         RETURN:
-        args_canon if arguments are filtered_attribute
+        args_canon, l_args
         '''
-        l_args = []
-        arg_type_name = tax_args['type'].split('(')[0]
+        l_args = [] if build_tree else None
+        arg_type_name = spec.args_type_name
+        args_info = spec.args_info
 
-        if (arg_type_name == 'filtered_attribute'
-                or arg_type_name == 'filtered_atomsgroup'):
-            args_info = eval('self.args__' + tax_args['type'])
-        else:
+        if args_info is None:
             raise ValueError(
                 'Atom [%s]: unknown arguments type [%s].' %
-                (atom_anc, tax_args['type']))
+                (atom_anc, spec.args.get('type')))
 
         if arg_type_name == 'filtered_attribute':
             args_list_canon = []
@@ -595,12 +1272,13 @@ class GemTaxonomy:
                 attr_name, attr_canon, l_arg = self.validate_attribute(
                     attr_base, tree_arg,
                     atom_args_orig_in, args_info['attribute_name'],
-                    list(set(filtered_atoms).union(
-                        set(args_info['filtered_atoms']))))
+                    args_info['filtered_atoms'].union(filtered_atoms),
+                    build_tree=build_tree)
                 args_list_canon.append(attr_canon)
-                l_args.append(l_arg)
+                if build_tree:
+                    l_args.append(l_arg)
                 # print('val_args: attr_canon: [%s]' % attr_canon)
-            if 'must_be_diff' in tax_args and tax_args['must_be_diff']:
+            if spec.must_be_diff:
                 same_elem = [item for item, count in collections.Counter(
                     args_list_canon).items() if count > 1]
                 if same_elem:
@@ -614,35 +1292,38 @@ class GemTaxonomy:
         elif arg_type_name == 'filtered_atomsgroup':
             args_list_canon = []
             for tree_arg in tree_args:
-                atom_name = tree_arg.children[0].children[0].text
-                l_arg = self.LogicAtom(
-                    self, tree_arg.text, self.tax['AtomDict'][atom_name],
-                    [], [], None)
+                atom_name = tree_arg.atoms[0].name
 
                 args_list_canon.append(tree_arg.text)
-                if len(tree_arg.children) > 1 and len(tree_arg.children[1].children) > 0:
+                if len(tree_arg.atoms) > 1:
                     raise ValueError(
                         'Attribute [%s]: composition of atoms not allowed [%s].' % (
                             attr_base, tree_arg.text))
-                if atom_name not in self.tax['AtomDict']:
+                # checked before any lookup by name in the taxonomy data
+                if atom_name not in self.atom_specs:
                     raise ValueError(
                         'Attribute [%s]: unknown atom [%s].' % (
                             attr_base, tree_arg.text))
-                tax_atom = self.tax['AtomDict'][atom_name]
+                if build_tree:
+                    l_arg = self.LogicAtom(
+                        tree_arg.text, self.atom_specs[atom_name], [], [],
+                        tree_arg.text)
+                arg_group = self.atom_specs[atom_name].group
 
                 # check if current atom group is what expected for these args
-                if tax_atom['group'] != args_info['atomsgroup_name']:
+                if arg_group != args_info['atomsgroup_name']:
                     raise ValueError(
                         'Attribute [%s], atom [%s], expected atomsgroup [%s],'
                         ' found atom [%s] of atomsgroup [%s].' % (
                             attr_base, tree_arg.text,
                             args_info['atomsgroup_name'],
-                            atom_name, tax_atom['group']))
+                            atom_name, arg_group))
                 if atom_name in args_info['filtered_atoms']:
                     raise ValueError(
                         'Attribute [%s], forbidden atom found [%s].' % (
                             attr_base, atom_name))
-                l_args.append(l_arg)
+                if build_tree:
+                    l_args.append(l_arg)
             args_canon = ';'.join(args_list_canon)
             return args_canon, l_args
 
@@ -660,7 +1341,7 @@ class GemTaxonomy:
             return None
 
     def check_single_value(self, atom_anc, param_type_name,
-                           atom_param, tax_params):
+                           atom_param, spec):
         ty_form = '%f' if param_type_name == 'float' else (
             '%d' if param_type_name == 'int' else '%s')
         if param_type_name == 'float':
@@ -678,58 +1359,59 @@ class GemTaxonomy:
                     'Atom [%s]: value %s not valid int.' %
                     (atom_anc, atom_param))
 
-        if 'min' in tax_params:
-            v_min = self.params_get(tax_params, 'min')
-            m_incl = (tax_params['min_incl'] if 'min_incl' in tax_params
-                      else True)
+        if spec.min is not None:
+            v_min = spec.min_v
+            m_incl = spec.min_incl
             if (m_incl and v < v_min) or (not m_incl and v <= v_min):
                 raise ValueError(
                     ('Atom [%s]: value [%s] less%s then min value ['
                      + ty_form + '].') %
                     (atom_anc, atom_param,
                      (' or equal' if not m_incl else ''),
-                     tax_params['min']))
+                     spec.min))
 
-        if 'max' in tax_params:
-            v_max = self.params_get(tax_params, 'max')
-            m_incl = (tax_params['max_incl'] if 'max_incl' in tax_params
-                      else True)
+        if spec.max is not None:
+            v_max = spec.max_v
+            m_incl = spec.max_incl
             if (m_incl and v > v_max) or (not m_incl and v >= v_max):
                 raise ValueError(
                     ('Atom [%s]: value [%s] greater%s'
                      ' then max value [' + ty_form + '].') %
                     (atom_anc, atom_param,
                      (' or equal' if not m_incl else ''),
-                     tax_params['max']))
+                     spec.max))
 
         return v
 
-    def validate_parameters(self, attr_base, atom_tree, tax_params,
-                            atom_params, atom_params_orig_in):
+    def validate_parameters(self, attr_base, atom_tree, spec,
+                            atom_params, atom_params_orig_in,
+                            build_tree=True):
         '''
         atom_args: list of arguments
 
 
         attr_base: attribute base
-        atom_tree: atom tree included args and params
-        tax_params: 'params' field of gem_tax['Atom'] element
+        atom_tree: TaxoAtom, atom included args and params
+        spec: AtomSpec of the atom
         atom_params: list of parameters (strings)
         atom_params_orig_in: flattened hierarchy of current atom
+        build_tree: if False LogicParam are not built (None returned)
         '''
 
         l_params = []
+        LogicParam = self.LogicParam if build_tree else self.logic_skip
         # NOTE: currently not parameter types with args but we can foresee them
-        param_type_name = tax_params['type'].split('(')[0]
+        param_type_name = spec.param_type_name
 
         atom_anc = atom_tree.text
-        atom_name = atom_tree.children[0].text
+        atom_name = atom_tree.name
         if param_type_name == 'options':
-            if tax_params['params_max'] > 0 and len(atom_params) > 0:
-                if atom_name not in self.tax['Param']:
+            if spec.params['params_max'] > 0 and len(atom_params) > 0:
+                if atom_name not in self.param_options:
                     raise ValueError(
                         'Atom [%s]: parameters options not found.' %
                         (atom_anc,))
-                atom_options = self.tax['Param'][atom_name]
+                atom_options = self.param_options[atom_name]
                 if len(atom_params) > 1:
                     raise ValueError(
                         'Atom [%s]: multiple parameters options'
@@ -737,28 +1419,26 @@ class GemTaxonomy:
                 for atom_param_idx, atom_param in enumerate(atom_params):
                     atom_param_key = ':'.join(atom_params[0:(
                         atom_param_idx + 1)])
-                    atom_option_list = list(filter(
-                        lambda option: option['name'] == atom_param_key,
-                        atom_options))
-                    if (len(atom_option_list) < 1):
+                    atom_option = atom_options.get(atom_param_key)
+                    if atom_option is None:
                         raise ValueError(
                             'Atom [%s]: parameters option [%s] not found.' %
                             (atom_anc, atom_param_key))
-                    l_params.append(self.LogicParam(
-                        self, atom_name, self.LogicParam.TYPE_OPTION,
+                    l_params.append(LogicParam(
+                        atom_name, self.LogicParam.TYPE_OPTION,
                         self.LogicParam.SUBTYPE_NONE,
-                        atom_option_list[0]['title'],
+                        atom_option['title'],
                         atom_param, ''))
         elif param_type_name == 'float' or param_type_name == 'int':
             for atom_param in atom_params:
                 self.check_single_value(atom_anc, param_type_name,
-                                        atom_param, tax_params)
-                l_params.append(self.LogicParam(
-                    self, atom_name, (self.LogicParam.TYPE_FLOAT
-                                      if param_type_name == 'float'
-                                      else self.LogicParam.TYPE_INT),
+                                        atom_param, spec)
+                l_params.append(LogicParam(
+                    atom_name, (self.LogicParam.TYPE_FLOAT
+                                if param_type_name == 'float'
+                                else self.LogicParam.TYPE_INT),
                     self.LogicParam.SUBTYPE_EXACT, None,
-                    atom_param, tax_params['unit_measure']))
+                    atom_param, spec.unit_measure))
         elif (param_type_name == 'rangeable_float' or
               param_type_name == 'rangeable_int'):
             single_type_name = param_type_name[10:]
@@ -767,30 +1447,30 @@ class GemTaxonomy:
                 if atom_param[0] in ['<', '>']:
                     val = self.check_single_value(
                         atom_anc, single_type_name,
-                        atom_param[1:], tax_params)
-                    if 'min' in tax_params:
-                        if atom_param[0] == '<' and val <= tax_params['min']:
+                        atom_param[1:], spec)
+                    if spec.min is not None:
+                        if atom_param[0] == '<' and val <= spec.min_v:
                             raise ValueError(
                                 'Atom [%s]: incorrect %s inequality,'
                                 ' no valid values below min value [%s].' %
                                 (atom_anc, single_type_name,
-                                 tax_params['min']))
-                    if 'max' in tax_params:
-                        if atom_param[0] == '>' and val >= tax_params['max']:
+                                 spec.min))
+                    if spec.max is not None:
+                        if atom_param[0] == '>' and val >= spec.max_v:
                             raise ValueError(
                                 'Atom [%s]: incorrect %s inequality,'
                                 ' no valid values above max value [%s].' %
                                 (atom_anc, single_type_name,
-                                 tax_params['max']))
-                    l_params.append(self.LogicParam(
-                        self, atom_name, (
+                                 spec.max))
+                    l_params.append(LogicParam(
+                        atom_name, (
                             self.LogicParam.TYPE_FLOAT
                             if param_type_name == 'rangeable_float'
                             else self.LogicParam.TYPE_INT),
                         (self.LogicParam.SUBTYPE_DIS_LT
                          if atom_param[0] == '<'
                          else self.LogicParam.SUBTYPE_DIS_GT), None,
-                        atom_param[1:], tax_params['unit_measure']))
+                        atom_param[1:], spec.unit_measure))
                 else:
                     if param_type_name == 'rangeable_float':
                         if re.findall('[^-]+-', atom_param):
@@ -822,7 +1502,7 @@ class GemTaxonomy:
                             for flo_idx in range(0, 2):
                                 self.check_single_value(
                                     atom_anc, 'float',
-                                    flos[flo_idx].text, tax_params)
+                                    flos[flo_idx].text, spec)
                             # check endpoints order
                             if float(flos[0].text) >= float(flos[1].text):
                                 raise ValueError(
@@ -830,21 +1510,21 @@ class GemTaxonomy:
                                     ' first endpoint is greater then or'
                                     ' equal to the second [%s]' % (
                                         atom_anc, atom_param))
-                            l_params.append(self.LogicParam(
-                                self, atom_name, self.LogicParam.TYPE_FLOAT,
+                            l_params.append(LogicParam(
+                                atom_name, self.LogicParam.TYPE_FLOAT,
                                 self.LogicParam.SUBTYPE_RANGE, None,
                                 [float(flos[0].text), float(flos[1].text)],
-                                tax_params['unit_measure']))
+                                spec.unit_measure))
                         else:
                             # precise single value case
                             self.check_single_value(
                                 atom_anc, 'float',
-                                atom_param, tax_params)
-                            l_params.append(self.LogicParam(
-                                self, atom_name, self.LogicParam.TYPE_FLOAT,
+                                atom_param, spec)
+                            l_params.append(LogicParam(
+                                atom_name, self.LogicParam.TYPE_FLOAT,
                                 self.LogicParam.SUBTYPE_EXACT,
                                 None, float(atom_param),
-                                tax_params['unit_measure']))
+                                spec.unit_measure))
                     elif param_type_name == 'rangeable_int':
                         if re.findall('[^-]+-', atom_param):
                             try:
@@ -874,7 +1554,7 @@ class GemTaxonomy:
                             for int_idx in range(0, 2):
                                 self.check_single_value(
                                     atom_anc, 'int',
-                                    ints[int_idx].text, tax_params)
+                                    ints[int_idx].text, spec)
                             # check endpoints order
                             if int(ints[0].text) >= int(ints[1].text):
                                 raise ValueError(
@@ -882,90 +1562,110 @@ class GemTaxonomy:
                                     ' first endpoint is greater then or'
                                     ' equal to the second [%s]' % (
                                         atom_anc, atom_param))
-                            l_params.append(self.LogicParam(
-                                self, atom_name, self.LogicParam.TYPE_INT,
+                            l_params.append(LogicParam(
+                                atom_name, self.LogicParam.TYPE_INT,
                                 self.LogicParam.SUBTYPE_RANGE, None,
                                 [int(ints[0].text), int(ints[1].text)],
-                                tax_params['unit_measure']))
+                                spec.unit_measure))
                         else:
                             # precise single value case
                             self.check_single_value(
                                 atom_anc, 'int',
-                                atom_param, tax_params)
-                            l_params.append(self.LogicParam(
-                                self, atom_name, self.LogicParam.TYPE_INT,
+                                atom_param, spec)
+                            l_params.append(LogicParam(
+                                atom_name, self.LogicParam.TYPE_INT,
                                 self.LogicParam.SUBTYPE_EXACT, None,
-                                int(atom_param), tax_params['unit_measure']))
-        return l_params
+                                int(atom_param), spec.unit_measure))
+        return l_params if build_tree else None
+
+    def _attr_cache_key(self, attr, attr_base, attr_scope, attr_name,
+                        filtered_atoms):
+        return (attr, attr_base, attr_scope, attr_name,
+                frozenset(filtered_atoms))
+
+    def _attribute_entry(self, key, attr_base, attr_tree, attr_scope,
+                         attr_name, filtered_atoms, build_tree=True):
+        '''
+        validate the attribute and store the result (or the error) in the
+        attribute cache
+        '''
+        try:
+            attr_name, attr_canon, l_attr = self._validate_attribute(
+                attr_base, attr_tree, attr_scope, attr_name, filtered_atoms,
+                build_tree=build_tree)
+        except ValueError as exc:
+            self.attr_cache.put(key, (str(exc), None, None, None))
+            raise
+        entry = (None, attr_name, attr_canon, l_attr)
+        self.attr_cache.put(key, entry)
+        return entry
+
+    def _attribute_usable(self, entry, build_tree):
+        '''
+        True if the attribute cache entry is present and, when required,
+        includes the Logic* tree
+        '''
+        if entry is LRUCache.MISSING:
+            return False
+        return not build_tree or entry[0] is not None or entry[3] is not None
+
+    def _attribute_result(self, entry):
+        error, attr_name, attr_canon, l_attr = entry
+        if error is not None:
+            raise ValueError(error)
+        return attr_name, attr_canon, l_attr
 
     def validate_attribute(self, attr_base, attr_tree, attr_scope,
-                           attr_name, filtered_atoms):
+                           attr_name, filtered_atoms, build_tree=True):
+        '''
+        cached version of _validate_attribute(), the key is the attribute
+        text together with its base, scope and filter context, entries
+        built without the Logic* tree are rebuilt when it is required
+        '''
+        key = self._attr_cache_key(attr_tree.text, attr_base, attr_scope,
+                                   attr_name, filtered_atoms)
+        entry = self.attr_cache.get(key)
+        if not self._attribute_usable(entry, build_tree):
+            entry = self._attribute_entry(key, attr_base, attr_tree,
+                                          attr_scope, attr_name,
+                                          filtered_atoms, build_tree)
+        return self._attribute_result(entry)
+
+    def _validate_attribute(self, attr_base, attr_tree, attr_scope,
+                            attr_name, filtered_atoms, build_tree=True):
         '''
         attr_base:      full attribute (recursion invariant)
-        attr_tree:      current evaluated attribute tree
+        attr_tree:      current evaluated attribute (TaxoAttr)
         attr_scope:     linearized description of current atom scope
                         (e.g. if already argument...)
         attr_name:      already specified when call as arguments check
         attr_canon:     canonicalized version of string attribute
         filtered_atoms: list of prohibited atoms (from arguments check)
+        build_tree:     if False the Logic* tree is not built (l_attr is None)
 
         RETURN:
-        attr_name, l_attr
+        attr_name, attr_canon, l_attr
         '''
         attr = attr_tree.text
-        atoms_trees = self.extract_atoms(attr_tree)
         atom_names_in = []
         atoms_in = []
         atoms_canon_in = []
-        atoms_dict_in = {}
+        groups_in = {}
+        group_progs = []
         l_attr = None
-        l_atom = None
         l_atoms = []
 
-        if attr_name is not None:
-            l_attr = self.LogicAttribute(
-                self, self.tax['AttributeDict'][attr_name], [])
-
-        for atom_tree in atoms_trees:
+        for atom_tree in attr_tree.atoms:
             atom = atom_tree.text
             atoms_in.append(atom)
-            if len(atom_tree.children) != 3:
-                raise ValueError(
-                    'Attribute [%s], scope [%s]: malformed atom [%s]' % (
-                        attr_base, attr_scope, atom))
-
-            atom_name = atom_tree.children[0].text
+            atom_name = atom_tree.name
             args_canon = ''
-            tree_args = []
-            len_tree_args = 0
-            atom_tree_args = atom_tree.children[1]
-            nchs_args = len(atom_tree_args.children)
-            if nchs_args > 0:
-                atom_tree_args = atom_tree_args.children[0]
-                nchs_args = len(atom_tree_args.children)
-
-                if nchs_args > 2:
-                    if atom_tree_args.children[0].text == '(':
-                        if atom_tree_args.children[nchs_args - 1].text == ')':
-                            tree_args.append(
-                                atom_tree_args.children[1])
-                            if nchs_args > 3:
-                                other_args = (atom_tree_args.children[2]
-                                              .children)
-                                for arg_id in range(0, len(other_args)):
-                                    tree_args.append(
-                                        other_args[arg_id].children[1])
-
             # IN tree_args the trees for arguments
-            params = []
+            tree_args = atom_tree.args
+            len_tree_args = 0
+            l_args = []
+            params = list(atom_tree.params)
             l_params = []
-            for param_child in atom_tree.children[2].children:
-                if param_child.expr.name != 'atom_params':
-                    raise ValueError(
-                        'Attribute [%s], scope [%s]: for atom [%s]'
-                        ' malformed parameters' % (
-                            attr_base, attr_scope, atom))
-                params.append(param_child.children[1].text)
 
             if atom_name in filtered_atoms:
                 raise ValueError(
@@ -982,76 +1682,67 @@ class GemTaxonomy:
                     (attr, atom_name))
 
             # search atom in the known list
-            if atom_name not in self.tax['AtomDict']:
+            spec = self.atom_specs.get(atom_name)
+            if spec is None:
                 raise ValueError(
                     'Attribute [%s]: unknown atom [%s].' %
                     (attr_base, atom_name))
-            tax_atom = self.tax['AtomDict'][atom_name]
-
-            l_atom = self.LogicAtom(
-                self, atom, self.tax['AtomDict'][atom_name],
-                [], [], None)
 
             # check mutex atoms for the same group
-            atoms_group_name = {k: v for k, v in atoms_dict_in.items() if
-                                v['group'] == tax_atom['group']}
-            if atoms_group_name:
+            if spec.group in groups_in:
                 raise ValueError(
                     'Attribute [%s]: atoms group "%s"'
                     ' already present with member [%s],'
                     ' new atom [%s] not allowed.' %
                     (attr, self.tax['AtomsGroupDict'][
-                        tax_atom['group']]['title'],
-                     [x for x in atoms_group_name][0],
+                        spec.group]['title'],
+                     groups_in[spec.group],
                      atom_name))
 
             atom_names_in.append(atom_name)
-            atoms_dict_in[atom_name] = tax_atom
+            groups_in[spec.group] = atom_name
+            group_progs.append(spec.group_prog)
 
             if attr_name is None:
                 # if atom_name in self.tax['AtomsDeps'].keys():
                 #     print('Not independent atom [%s], at'
                 #           ' least unsorted attribute atoms.' % atom_name)
-                attr_name = tax_atom['attr']
-                attr_scope = tax_atom['name']
+                attr_name = spec.attr
+                attr_scope = spec.name
                 args_attr_scope = 'args ' + atom_name
-                l_attr = self.LogicAttribute(
-                    self, self.tax['AttributeDict'][attr_name], [])
             else:
-                if attr_name != tax_atom['attr']:
+                if attr_name != spec.attr:
                     raise ValueError(
                         'For attribute [%s] discordant [atom/argument]->'
                         '[attribute] associations:'
                         ' [%s]->[%s] vs [%s]->[%s]' %
                         (attr, attr_scope, attr_name,
-                         tax_atom['name'], tax_atom['attr']))
-            if tax_atom['args']:
-                tax_args = json.loads(tax_atom['args'])
+                         spec.name, spec.attr))
+            if spec.args is not None:
                 len_tree_args = len(tree_args)
                 # if args is defined check if are optional and
                 # in the case present
-                if ('args_min' in tax_args and
-                        len_tree_args < tax_args['args_min']):
+                if (spec.args_min is not None and
+                        len_tree_args < spec.args_min):
                         raise ValueError(
                             'Attribute [%s]: atom %s requires at least'
                             ' %d argument%s, %d found [%s].' %
-                            (attr_base, atom_name, tax_args['args_min'],
-                             's' if tax_args['args_min'] > 1 else '',
+                            (attr_base, atom_name, spec.args_min,
+                             's' if spec.args_min > 1 else '',
                              len_tree_args, atom))
 
-                if ('args_max' in tax_args and
-                        len_tree_args > tax_args['args_max']):
+                if (spec.args_max is not None and
+                        len_tree_args > spec.args_max):
                     raise ValueError(
                         'Attribute [%s]: atom [%s] requires a maximum'
                         ' of %d argument%s, %d found [%s].' %
-                        (attr_base, atom_name, tax_args['args_max'],
-                         's' if tax_args['args_max'] > 1 else '',
+                        (attr_base, atom_name, spec.args_max,
+                         's' if spec.args_max > 1 else '',
                          len_tree_args, atom))
                 args_canon, l_args = self.validate_arguments(
                     attr_base,
-                    atom, tax_args, tree_args,
-                    args_attr_scope, filtered_atoms)
-                l_atom.args = l_args
+                    atom, spec, tree_args,
+                    args_attr_scope, filtered_atoms, build_tree)
                 # print('val_attr: args_canon: [%s]' % args_canon)
             else:
                 # if not args check if arguments are present
@@ -1060,11 +1751,9 @@ class GemTaxonomy:
                         'Attribute [%s]: argument[s] not expected'
                         ' for atom [%s].' % (attr_base, atom_name))
 
-            if tax_atom['params']:
+            if spec.params is not None:
                 len_params = len(params)
-                tax_params = json.loads(tax_atom['params'])
-                params_min = (tax_params['params_min'] if
-                              'params_min' in tax_params else 1)
+                params_min = spec.params_min
 
                 if len_params < params_min:
                     raise ValueError(
@@ -1073,20 +1762,19 @@ class GemTaxonomy:
                         (attr_base, atom_name, params_min,
                          's' if params_min > 1 else '',
                          len_params, atom))
-                if ('params_max' in tax_params and
-                        len_params > tax_params['params_max']):
+                if (spec.params_max is not None and
+                        len_params > spec.params_max):
                     raise ValueError(
                         'Attribute [%s]: atom [%s] requires a maximum'
                         ' of %d parameter%s, %d found [%s].' %
-                        (attr_base, atom_name, tax_params['params_max'],
-                         's' if tax_params['params_max'] > 1 else '',
+                        (attr_base, atom_name, spec.params_max,
+                         's' if spec.params_max > 1 else '',
                          len_params, atom))
 
                 l_params = self.validate_parameters(
                     attr_base,
-                    atom_tree, tax_params, params,
-                    attr_scope)
-                l_atom.params = l_params
+                    atom_tree, spec, params,
+                    attr_scope, build_tree)
             else:
                 if len(params) > 0:
                     raise ValueError(
@@ -1113,71 +1801,137 @@ class GemTaxonomy:
                     atoms_canon_in.append('%s' % (
                         atom_name))
             # print('val_attr: atoms_canon_in %s' % atoms_canon_in)
-            l_atoms.append(l_atom)
+            if build_tree:
+                l_atoms.append(self.LogicAtom(
+                    atom, spec, l_args, l_params, atoms_canon_in[-1]))
             # end atoms loop
 
         for atom_name_in in atom_names_in:
+            spec_in = self.atom_specs[atom_name_in]
             # constraint deny management
-            if atom_name_in in self.tax['AtomsDeny']:
+            if spec_in.deny:
                 for deny_name_in in atom_names_in:
-                    if deny_name_in in self.tax['AtomsDeny'][atom_name_in]:
+                    if deny_name_in in spec_in.deny:
                         raise ValueError(
                             'Attribute [%s]: atom [%s] denied by atom [%s]' %
                             (attr_base, atom_name_in, deny_name_in))
 
-            if atom_name_in not in self.tax['AtomsDeps']:
+            if spec_in.deps is None:
                 continue
             else:
-                for dep in self.tax['AtomsDeps'][atom_name_in]:
+                for dep in spec_in.deps:
                     if dep in atom_names_in:
                         break
                 else:
                     raise ValueError(
                         'Attribute [%s]: missing dependency for atom [%s]' %
                         (attr_base, atom_name))
-        group_progs = [int(self.tax['AtomsGroupDict'][
-            self.tax['AtomDict'][x]['group']]['prog']) for x in atom_names_in]
         attr_canon = '+'.join(
             [x for _, x in sorted(zip(group_progs, atoms_canon_in))])
-        l_atoms_canon = [x for _, x in sorted(zip(group_progs, l_atoms))]
-        if l_attr is not None:
-            l_attr.atoms = l_atoms_canon
+        if build_tree:
+            l_attr = self.LogicAttribute(
+                self.tax['AttributeDict'][attr_name],
+                [x for _, x in sorted(zip(group_progs, l_atoms))],
+                attr_canon)
         return attr_name, attr_canon, l_attr
 
-    def validate(self, tax_str):
-        l_attrs = []
-        attr_name_in = []
-        attr_in = {}
-        attr_canon_in = {}
-        l_attrs_canon = []
+    def validate(self, tax_str, build_tree=True):
+        '''
+        validate tax_str and return a tuple (attr_canon_in, l_attrs_canon,
+        report), results (errors included) are cached by (taxonomy version,
+        taxonomy string), returned containers are copies and the Logic*
+        tree is read-only
+
+        build_tree: if False the Logic* tree (required by explain only) is
+                    not built and l_attrs_canon is None, it will be built
+                    when requested by a following call
+        '''
+        key = (self.tax_vers, tax_str)
+        entry = self.validate_cache.get(key)
+        if entry is LRUCache.MISSING and self.disk_cache is not None:
+            entry = self.disk_cache.get(tax_str)
+            if entry is not LRUCache.MISSING:
+                self.validate_cache.put(key, entry)
+        if entry is LRUCache.MISSING or (
+                build_tree and entry[0] is None and entry[2] is None):
+            try:
+                attr_canon_in, l_attrs, report = self._validate(
+                    tax_str, build_tree)
+            except ValueError as exc:
+                entry = (str(exc), None, None, None)
+                self.validate_cache.put(key, entry)
+                if self.disk_cache is not None:
+                    self.disk_cache.put(tax_str, entry)
+                raise
+            entry = (None, attr_canon_in, l_attrs, report)
+            self.validate_cache.put(key, entry)
+            if self.disk_cache is not None:
+                self.disk_cache.put(tax_str, entry)
+
+        error, attr_canon_in, l_attrs, report = entry
+        if error is not None:
+            raise ValueError(error)
+        return (dict(attr_canon_in), (list(l_attrs) if build_tree else None),
+                dict(report))
+
+    def parse_taxonomy_parsimonious(self, tax_str):
+        '''
+        parse tax_str with the parsimonious taxonomy grammar
 
+        RETURN:
+        tax_is_empty, list of attributes (TaxoAttr)
+        '''
         taxo_attrs = []
         tax_is_empty = False
+        taxo_or_empty_tree = self.taxo_grammar.parse(tax_str)
+        if len(taxo_or_empty_tree.children) == 1:
+            single_child = taxo_or_empty_tree.children[0]
+            if (single_child.expr.__class__.__name__ == 'Literal' and
+                    single_child.text == 'UNK'):
+                tax_is_empty = True
+
+        if not tax_is_empty:
+            # extract list of grammar attributes and
+            # place them in taxo_attrs list
+            if len(taxo_or_empty_tree.children) > 0:
+                if (taxo_or_empty_tree.children[0].expr.__class__
+                        .__name__ == 'Sequence'):
+                    taxo_tree = taxo_or_empty_tree.children[0]
+                    if len(taxo_tree.children) > 0:
+                        taxo_attrs.append(taxo_tree.children[0])
+                    if len(taxo_tree.children) > 1:
+                        qta_tree = taxo_tree.children[1]
+                        for seq_tree in qta_tree.children:
+                            taxo_attrs.append(seq_tree.children[1])
+        # print([x.expr.name for x in taxo_attrs])
+        # print([x.text for x in taxo_attrs])
+        return tax_is_empty, [self.compact_attr(x) for x in taxo_attrs]
+
+    def parse_attribute(self, attr):
+        '''
+        parse a single attribute string with the selected parser engine,
+        return its TaxoAttr
+        '''
+        if self.parser == 'fast':
+            return self.taxo_parser.parse_attribute(attr)
+        return self.compact_attr(self.taxo_grammar['attr'].parse(attr))
+
+    def parse_taxonomy(self, tax_str):
+        '''
+        parse tax_str with the selected parser engine
+
+        RETURN:
+        tax_is_empty, list of attributes (TaxoAttr)
+        '''
         try:
-            taxo_or_empty_tree = self.taxo_grammar.parse(tax_str)
-            if len(taxo_or_empty_tree.children) == 1:
-                single_child = taxo_or_empty_tree.children[0]
-                if (single_child.expr.__class__.__name__ == 'Literal' and
-                        single_child.text == 'UNK'):
-                    tax_is_empty = True
-
-            if not tax_is_empty:
-                # extract list of grammar attributes and
-                # place them in taxo_attrs list
-                if len(taxo_or_empty_tree.children) > 0:
-                    if (taxo_or_empty_tree.children[0].expr.__class__
-                            .__name__ == 'Sequence'):
-                        taxo_tree = taxo_or_empty_tree.children[0]
-                        if len(taxo_tree.children) > 0:
-                            taxo_attrs.append(taxo_tree.children[0])
-                        if len(taxo_tree.children) > 1:
-                            qta_tree = taxo_tree.children[1]
-                            for seq_tree in qta_tree.children:
-                                taxo_attrs.append(seq_tree.children[1])
-            # print([x.expr.name for x in taxo_attrs])
-            # print([x.text for x in taxo_attrs])
+            if self.parser == 'fast':
+                tax_is_empty, taxo_attrs = self.taxo_parser.parse(tax_str)
+            else:
+                tax_is_empty, taxo_attrs = self.parse_taxonomy_parsimonious(
+                    tax_str)
         except (ParsimParseError,
-                ParsimIncompleteParseError) as exc:
+                ParsimIncompleteParseError,
+                TaxoParseError) as exc:
             if len(tax_str) == 0:
                 raise ValueError(
                     'Empty taxonomy string is not valid, use'
@@ -1216,11 +1970,78 @@ class GemTaxonomy:
                 ((("%s " % spec_info) if spec_info else ''),
                  tax_str, str(exc).rstrip('.')))
 
-        for attr_tree in taxo_attrs:
-            attr = attr_tree.text
+        return tax_is_empty, taxo_attrs
+
+    def _attributes_split(self, tax_str, build_tree=True):
+        '''
+        split tax_str into its attributes without parsing the full string,
+        attributes already in the attribute cache (with the Logic* tree if
+        build_tree is True) are not parsed at all
+
+        RETURN:
+        list of (attr, cache_key, cache_entry, attr_tree) or None if the
+        full taxonomy grammar is required (e.g. to report a parsing error)
+        '''
+        if tax_str.startswith('UNK'):
+            return None
+        ret = []
+        for attr in tax_str.split('/'):
+            key = self._attr_cache_key(attr, attr, '', None, [])
+            entry = self.attr_cache.get(key)
+            attr_tree = None
+            if not self._attribute_usable(entry, build_tree):
+                try:
+                    attr_tree = self.parse_attribute(attr)
+                except (ParsimParseError,
+                        ParsimIncompleteParseError,
+                        TaxoParseError):
+                    return None
+            ret.append((attr, key, entry, attr_tree))
+        return ret
+
+    def _canonical_sort(self, attr_name_in, attr_canon_in, l_attrs,
+                        build_tree=True):
+        '''
+        sort the attributes by their prog
+
+        RETURN:
+        canonical taxonomy string, sorted l_attrs ([] if build_tree is
+        False)
+        '''
+        attr_progs = [self.attr_progs[x] for x in attr_name_in]
+        attr_name_canon = [x for _, x in sorted(
+            zip(attr_progs, attr_name_in))]
+        tax_canon = '/'.join([attr_canon_in[x] for x in
+                              attr_name_canon])
+        l_attrs_canon = []
+        if build_tree:
+            l_attrs_canon = [x for _, x in sorted(
+                zip(attr_progs, l_attrs))]
+        return tax_canon, l_attrs_canon
+
+    def _validate(self, tax_str, build_tree=True):
+        l_attrs = []
+        attr_name_in = []
+        attr_in = {}
+        attr_canon_in = {}
+        l_attrs_canon = []
 
-            attr_name, attr_canon, l_attr = self.validate_attribute(
-                attr, attr_tree, '', None, [])
+        tax_is_empty = False
+        attrs_split = self._attributes_split(tax_str, build_tree)
+        if attrs_split is None:
+            tax_is_empty, taxo_attrs = self.parse_taxonomy(tax_str)
+            attrs_split = []
+            for attr_tree in taxo_attrs:
+                attr = attr_tree.text
+                key = self._attr_cache_key(attr, attr, '', None, [])
+                attrs_split.append(
+                    (attr, key, self.attr_cache.get(key), attr_tree))
+
+        for attr, key, entry, attr_tree in attrs_split:
+            if not self._attribute_usable(entry, build_tree):
+                entry = self._attribute_entry(
+                    key, attr, attr_tree, '', None, [], build_tree)
+            attr_name, attr_canon, l_attr = self._attribute_result(entry)
             l_attrs.append(l_attr)
             if attr_name in attr_in:
                 raise ValueError(
@@ -1234,14 +2055,10 @@ class GemTaxonomy:
         if tax_is_empty:
             tax_canon = 'UNK'
         else:
-            attr_progs = [int(self.tax['AttributeDict'][x]['prog']) for x
-                          in attr_name_in]
-            attr_name_canon = [x for _, x in sorted(
-                zip(attr_progs, attr_name_in))]
-            tax_canon = '/'.join([attr_canon_in[x] for x in
-                                  attr_name_canon])
-            l_attrs_canon = [x for _, x in sorted(
-                zip(attr_progs, l_attrs))]
+            tax_canon, l_attrs_canon = self._canonical_sort(
+                attr_name_in, attr_canon_in, l_attrs, build_tree)
+        if not build_tree:
+            l_attrs_canon = None
 
         # self.logic_print(l_attrs_canon)
         # print(self.logic_explain(l_attrs_canon, 'textsingleline'))
@@ -1256,6 +2073,26 @@ class GemTaxonomy:
                                                   'original': tax_str,
                                                   'canonical': tax_canon})
 
+    def validate_many(self, iterable, *, dedupe=True, on_error='collect'):
+        '''
+        validate each taxonomy string of iterable
+
+        dedupe:   if True each distinct string is validated once
+        on_error: 'collect' to return the ValueError as error item,
+                  'raise' to raise it
+
+        RETURN:
+        ValidateManyResults iterator of (canonical, report, error) tuples
+        (canonical and report are None in case of error), its 'summary'
+        attribute contains total, validated, valid, canonical and errors
+        counts
+        '''
+        if on_error not in ('collect', 'raise'):
+            raise ValueError(
+                'on_error must be \'collect\' or \'raise\', found [%s]' %
+                on_error)
+        return ValidateManyResults(self, iterable, dedupe, on_error)
+
     def split_by_attributes(self, *args):
         '''
         split_by_attributes(taxonomy_string)
@@ -1271,7 +2108,7 @@ class GemTaxonomy:
                                  n_args))
         if n_args == 1:
             tax = args[0]
-            attrs, _, _ = self.validate(tax)
+            attrs, _, _ = self.validate(tax, build_tree=False)
             return attrs
         else:
             fields = args[0]
@@ -1280,7 +2117,7 @@ class GemTaxonomy:
             key_name = args[3]
             subfields = fields.split(sep)
             tax = subfields[fie_idx]
-            attrs, _, _ = self.validate(tax)
+            attrs, _, _ = self.validate(tax, build_tree=False)
             n_subfields = len(subfields)
 
             if n_subfields == 1:
@@ -1292,11 +2129,94 @@ class GemTaxonomy:
                 attrs[key_name] = others
             return attrs
 
+    def split_by_attributes_columns(self, records, field_sep=None,
+                                    taxonomy_field_idx=0, key_name=None,
+                                    fill=None, on_error='raise'):
+        '''
+        column oriented version of split_by_attributes(), each distinct
+        taxonomy string is validated once
+
+        records:   sequence of taxonomy strings or, if field_sep is not
+                   None, of field_sep separated records with the taxonomy
+                   string at taxonomy_field_idx
+        key_name:  if not None (and field_sep is not None) name of the
+                   column with the other fields of each record, as
+                   split_by_attributes() does
+        fill:      value of missing attributes (and of missing other fields)
+        on_error:  'raise' to raise the ValueError of a not valid taxonomy
+                   string, 'fill' to fill all its attributes with fill
+
+        RETURN:
+        {attribute name: list of values in records order} for all the
+        attributes (ordered by prog) plus the key_name column if required
+        '''
+        if on_error not in ('raise', 'fill'):
+            raise ValueError(
+                'on_error must be \'raise\' or \'fill\', found [%s]' %
+                on_error)
+        names = [attr['name'] for attr in sorted(
+            self.tax['Attribute'], key=lambda attr: int(attr['prog']))]
+        with_key = field_sep is not None and key_name is not None
+
+        # index in rows of each distinct taxonomy string
+        tax_idx = {}
+        rows = []
+        idxs = []
+        keys = []
+        for record in records:
+            if field_sep is None:
+                tax = record
+            else:
+                subfields = record.split(field_sep)
+                tax = subfields[taxonomy_field_idx]
+                if with_key:
+                    n_subfields = len(subfields)
+                    if n_subfields == 1:
+                        keys.append(fill)
+                    elif n_subfields == 2:
+                        keys.append(subfields[1-taxonomy_field_idx])
+                    else:
+                        keys.append(subfields[0:taxonomy_field_idx] +
+                                    subfields[taxonomy_field_idx+1:])
+
+            idx = tax_idx.get(tax)
+            if idx is None:
+                try:
+                    attrs, _, _ = self.validate(tax, build_tree=False)
+                except ValueError:
+                    if on_error == 'raise':
+                        raise
+                    attrs = {}
+                idx = tax_idx[tax] = len(rows)
+                rows.append(tuple(attrs.get(name, fill) for name in names))
+            idxs.append(idx)
+
+        columns = {}
+        for col, name in enumerate(names):
+            values = [row[col] for row in rows]
+            columns[name] = [values[idx] for idx in idxs]
+        if with_key:
+            columns[key_name] = keys
+        return columns
+
     def explain(self, tax_str, fmt='textsingleline'):
         _, l_attrs, val_reply = self.validate(tax_str)
 
         return self.logic_explain(l_attrs, format=fmt) + (val_reply,)
 
+    def explain_to(self, fp, tax_str, fmt='textsingleline'):
+        '''
+        write the explanation of tax_str to the fp file-like object, the
+        same output of dump_explain(*explain(tax_str, fmt)[:2]) without
+        intermediate strings and trees (see logic_explain_to())
+
+        RETURN:
+        output type, validation report
+        '''
+        _, l_attrs, val_reply = self.validate(tax_str)
+
+        return self.logic_explain_to(fp, l_attrs, format=fmt), val_reply
+
     def dump_explain(self, fmt, expl):
         if fmt in [GemTaxonomy.EXPL_OUT_TYPE.SINGLELINE,
                    GemTaxonomy.EXPL_OUT_TYPE.MULTILINE]:
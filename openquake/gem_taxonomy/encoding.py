@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TaxonomyEncoder:
+    '''
+    columnar encoding of taxonomy strings: each valid string is mapped to
+    the integer id of its canonical form in a dictionary shared by all the
+    encode() calls, each id is mapped to a row of per-attribute codes
+
+    attributes:  attribute names (codes matrix columns), sorted by prog
+    attr_values: {attribute name: list of canonical attribute values},
+                 code 0 ('') means attribute not specified
+    '''
+    INVALID_ID = -1
+
+    def __init__(self, gt):
+        if numpy is None:
+            raise ImportError(
+                'TaxonomyEncoder requires numpy, install it with'
+                ' "pip install openquake.gem-taxonomy[numpy]"')
+        self.gt = gt
+        self.attributes = [attr['name'] for attr in sorted(
+            gt.tax['Attribute'], key=lambda attr: int(attr['prog']))]
+        self.attr_values = {name: [''] for name in self.attributes}
+        self._attr_codes = {name: {'': 0} for name in self.attributes}
+        self._ids = {}
+        self._canonicals = []
+        self._codes = []
+
+    def _intern(self, attr_canon_in, tax_canon):
+        tax_id = self._ids.get(tax_canon)
+        if tax_id is not None:
+            return tax_id
+        codes = []
+        for name in self.attributes:
+            value = attr_canon_in.get(name, '')
+            attr_codes = self._attr_codes[name]
+            code = attr_codes.get(value)
+            if code is None:
+                code = attr_codes[value] = len(self.attr_values[name])
+                self.attr_values[name].append(value)
+            codes.append(code)
+        tax_id = self._ids[tax_canon] = len(self._canonicals)
+        self._canonicals.append(tax_canon)
+        self._codes.append(codes)
+        return tax_id
+
+    def encode(self, taxs):
+        '''
+        taxs: iterable of taxonomy strings
+
+        RETURN:
+        ids (int64 array, INVALID_ID for not valid strings),
+        dictionary (object array of canonical strings indexed by id),
+        codes (int32 matrix, one row per id, one column per attribute)
+        '''
+        ids = []
+        seen = {}
+        for tax in taxs:
+            tax_id = seen.get(tax)
+            if tax_id is None:
+                try:
+                    attr_canon_in, _, report = self.gt.validate(
+                        tax, build_tree=False)
+                    tax_id = self._intern(
+                        attr_canon_in, (tax if report['is_canonical']
+                                        else report['canonical']))
+                except ValueError:
+                    tax_id = self.INVALID_ID
+                seen[tax] = tax_id
+            ids.append(tax_id)
+
+        return (numpy.array(ids, dtype=numpy.int64),
+                self.dictionary(), self.codes())
+
+    def dictionary(self):
+        return numpy.array(self._canonicals, dtype=object)
+
+    def codes(self):
+        return numpy.array(self._codes, dtype=numpy.int32).reshape(
+            (len(self._codes), len(self.attributes)))
+
+    def decode(self, ids):
+        '''
+        return the object array of canonical strings of ids, None for
+        INVALID_ID
+        '''
+        ids = numpy.asarray(ids, dtype=numpy.int64)
+        dictionary = numpy.array(self._canonicals + [None], dtype=object)
+        # INVALID_ID (-1) picks the trailing None
+        return dictionary[ids]
+
+    def decode_codes(self, codes):
+        '''
+        return the {attribute name: canonical value} dict of a row of codes
+        '''
+        return {name: self.attr_values[name][code]
+                for name, code in zip(self.attributes, codes) if code != 0}
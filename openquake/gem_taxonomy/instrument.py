@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import time
+import functools
+import threading
+
+
+class PhaseHook:
+    '''
+    base class of the tracing hooks of PhaseProfiler: start() is called
+    when a phase begins and end() when it ends, exc is the exception that
+    terminated the phase (None if it succeeded)
+    '''
+    def start(self, phase):
+        pass
+
+    def end(self, phase, elapsed_ns, exc=None):
+        pass
+
+
+class PhaseProfiler:
+    '''
+    cumulative counters of the validation phases of GemTaxonomy instances
+    (see GemTaxonomy.profile_enable()): for each phase the number of
+    calls, the ones ended by an error, the total time (nested calls of
+    the same phase counted once) and the self time (nested phases
+    excluded), in nanoseconds
+
+    hooks: PhaseHook instances notified at start and end of each phase
+    '''
+    PHASES = ('parse', 'extract_atoms', 'validate_attribute',
+              'validate_arguments', 'validate_parameters', 'canonical_sort')
+    COUNTERS = ('calls', 'errors', 'total_ns', 'self_ns')
+
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {phase: dict.fromkeys(self.COUNTERS, 0)
+                          for phase in self.PHASES}
+
+    def __getstate__(self):
+        # locks and thread local stacks can't be pickled, new ones are
+        # created by __setstate__()
+        with self._lock:
+            state = dict(self.__dict__)
+        del state['_lock'], state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def wrap(self, phase, func):
+        '''
+        return func measured as phase
+        '''
+        counters = self._counters[phase]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            for hook in self.hooks:
+                hook.start(phase)
+            # [phase, time spent in nested phases]
+            frame = [phase, 0]
+            stack.append(frame)
+            exc = None
+            t_start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            except BaseException as e:
+                exc = e
+                raise
+            finally:
+                elapsed_ns = time.perf_counter_ns() - t_start
+                stack.pop()
+                is_nested = any(x[0] == phase for x in stack)
+                with self._lock:
+                    counters['calls'] += 1
+                    if exc is not None:
+                        counters['errors'] += 1
+                    if not is_nested:
+                        counters['total_ns'] += elapsed_ns
+                    counters['self_ns'] += elapsed_ns - frame[1]
+                if stack:
+                    stack[-1][1] += elapsed_ns
+                for hook in self.hooks:
+                    hook.end(phase, elapsed_ns, exc)
+        return wrapper
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+            return stack
+
+    def info(self):
+        '''
+        return {phase: {counter: value}}
+        '''
+        with self._lock:
+            return {phase: dict(counters)
+                    for phase, counters in self._counters.items()}
+
+    def clear(self):
+        with self._lock:
+            for counters in self._counters.values():
+                counters.update(dict.fromkeys(self.COUNTERS, 0))
+
+    def pop(self):
+        '''
+        return the counters (as info()) and reset them, used to collect
+        the counters of other processes
+        '''
+        with self._lock:
+            ret = {phase: dict(counters)
+                   for phase, counters in self._counters.items()}
+            for counters in self._counters.values():
+                counters.update(dict.fromkeys(self.COUNTERS, 0))
+        return ret
+
+    def update(self, info):
+        '''
+        add the counters of info (as returned by info() or pop())
+        '''
+        with self._lock:
+            for phase, counters in info.items():
+                for name, value in counters.items():
+                    self._counters[phase][name] += value
+
+    def format(self):
+        '''
+        return the phases breakdown as list of text lines
+        '''
+        info = self.info()
+        lines = ['%-20s %10s %8s %12s %12s %12s' % (
+            'phase', 'calls', 'errors', 'total ms', 'self ms', 'self ns/call')]
+        for phase in self.PHASES:
+            counters = info[phase]
+            lines.append('%-20s %10d %8d %12.3f %12.3f %12.0f' % (
+                phase, counters['calls'], counters['errors'],
+                counters['total_ns'] / 1e6, counters['self_ns'] / 1e6,
+                (counters['self_ns'] / counters['calls'])
+                if counters['calls'] > 0 else 0.0))
+        return lines
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+'''
+Recursive descent parser of the taxonomy grammar:
+
+    taxo = "UNK" / ( attr ( "/" attr )* )
+    attr = atom ( "+" atom )*
+    atom = ~r"[A-Z][A-Z0-9]*" atom_args* atom_params*
+    atom_args = "(" attr ( ";" attr )* ")"
+    atom_params = ":" ~r"[A-Za-z0-9<>-][A-Za-z0-9.-]*"
+
+it follows the same PEG semantics (ordered choice, greedy repetitions with
+backtrack of the unmatched separator) and produces the same errors of the
+parsimonious Grammar, but returns compact TaxoAttr/TaxoAtom nodes instead
+of a generic node tree.
+'''
+import re
+import collections
+
+# parsed attribute: its text and the tuple of its TaxoAtom
+TaxoAttr = collections.namedtuple('TaxoAttr', ['text', 'atoms'])
+# parsed atom: its text (args and params included), its name, the TaxoAttr
+# tuple of its (first group of) arguments and the tuple of its parameters
+TaxoAtom = collections.namedtuple('TaxoAtom', [
+    'text', 'name', 'args', 'params'])
+
+ATOM_RE = re.compile(r'[A-Z][A-Z0-9]*')
+PARAM_RE = re.compile(r'[A-Za-z0-9<>-][A-Za-z0-9.-]*')
+
+
+class ParseError(Exception):
+    '''
+    the rule didn't match, same message of parsimonious ParseError
+    '''
+    def __init__(self, text, pos, rule):
+        self.text = text
+        self.pos = pos
+        self.rule = rule
+
+    def line(self):
+        return self.text.count('\n', 0, self.pos) + 1
+
+    def column(self):
+        try:
+            return self.pos - self.text.rindex('\n', 0, self.pos)
+        except ValueError:
+            return self.pos + 1
+
+    def __str__(self):
+        return "Rule '%s' didn't match at '%s' (line %s, column %s)." % (
+            self.rule, self.text[self.pos:self.pos + 20],
+            self.line(), self.column())
+
+
+class IncompleteParseError(ParseError):
+    '''
+    the rule matched but the text was not entirely consumed, same message
+    of parsimonious IncompleteParseError
+    '''
+    def __str__(self):
+        return ("Rule '%s' matched in its entirety, but it didn't consume"
+                " all the text. The non-matching portion of the text begins"
+                " with '%s' (line %s, column %s)." % (
+                    self.rule, self.text[self.pos:self.pos + 20],
+                    self.line(), self.column()))
+
+
+class TaxonomyParser:
+    def parse(self, text):
+        '''
+        parse a full taxonomy string
+
+        RETURN:
+        tax_is_empty, list of TaxoAttr
+        '''
+        if text.startswith('UNK'):
+            if len(text) > 3:
+                raise IncompleteParseError(text, 3, 'taxo')
+            return True, []
+
+        attr, pos = self.attr(text, 0)
+        if attr is None:
+            raise ParseError(text, 0, 'taxo')
+        attrs = [attr]
+        while text.startswith('/', pos):
+            attr, end = self.attr(text, pos + 1)
+            if attr is None:
+                break
+            attrs.append(attr)
+            pos = end
+        if pos != len(text):
+            raise IncompleteParseError(text, pos, 'taxo')
+        return False, attrs
+
+    def parse_attribute(self, text):
+        '''
+        parse a single attribute string, return its TaxoAttr
+        '''
+        attr, pos = self.attr(text, 0)
+        if attr is None:
+            raise ParseError(text, 0, 'attr')
+        if pos != len(text):
+            raise IncompleteParseError(text, pos, 'attr')
+        return attr
+
+    def attr(self, text, start):
+        '''
+        RETURN:
+        TaxoAttr, end position or None, start if not matching
+        '''
+        atom, pos = self.atom(text, start)
+        if atom is None:
+            return None, start
+        atoms = [atom]
+        while text.startswith('+', pos):
+            atom, end = self.atom(text, pos + 1)
+            if atom is None:
+                break
+            atoms.append(atom)
+            pos = end
+        return TaxoAttr(text[start:pos], tuple(atoms)), pos
+
+    def atom(self, text, start):
+        match = ATOM_RE.match(text, start)
+        if match is None:
+            return None, start
+        pos = match.end()
+
+        args = None
+        while text.startswith('(', pos):
+            group, end = self.atom_args(text, pos + 1)
+            if group is None:
+                break
+            # only the first group of arguments is meaningful
+            if args is None:
+                args = group
+            pos = end
+
+        params = []
+        while text.startswith(':', pos):
+            param = PARAM_RE.match(text, pos + 1)
+            if param is None:
+                break
+            params.append(param.group())
+            pos = param.end()
+
+        return TaxoAtom(text[start:pos], match.group(), args or (),
+                        tuple(params)), pos
+
+    def atom_args(self, text, start):
+        '''
+        start is the position after the opening bracket
+
+        RETURN:
+        tuple of TaxoAttr, end position or None, start if not matching
+        '''
+        attr, pos = self.attr(text, start)
+        if attr is None:
+            return None, start
+        attrs = [attr]
+        while text.startswith(';', pos):
+            attr, end = self.attr(text, pos + 1)
+            if attr is None:
+                break
+            attrs.append(attr)
+            pos = end
+        if not text.startswith(')', pos):
+            return None, start
+        return tuple(attrs), pos + 1
@@ -18,21 +18,160 @@
 import os
 import sys
 import csv
+import codecs
 import json
 import glob
+import time
+import heapq
 import argparse
+import itertools
+import contextlib
+import threading
 import subprocess
+import collections
 from argparse import RawTextHelpFormatter
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+try:
+    import select
+except ImportError:
+    select = None
 from openquake.gem_taxonomy import GemTaxonomy, __version__
+from openquake.gem_taxonomy.cache import (LRUCache, DiskCache, user_cache_dir,
+                                          user_cache_path)
 from parsimonious.exceptions import ParseError as ParsimParseError
 from parsimonious.exceptions import (IncompleteParseError as
                                      ParsimIncompleteParseError)
 
+# validate/explain --stdin results written at once (at most, results are
+# flushed too when no more input is ready)
+STDIN_BATCH_SIZE = 1024
+# bytes read from the standard input at once
+STDIN_READ_SIZE = 65536
+
+
 def _tax_help():
     return ("use different taxonomy version than default (%s),"
             " acceptable values are %s" % (
-                GemTaxonomy.default_tax_version, ", ".join(
-                    [x for x in GemTaxonomy.available_tax_versions])))
+                GemTaxonomy.default_tax_version(), ", ".join(
+                    [x for x in GemTaxonomy.available_tax_versions()])))
+
+
+def _stdin_add_arguments(parser, result):
+    parser.add_argument(
+        '--stdin', action='store_true',
+        help=('read taxonomy strings from standard input, one per line, and'
+              ' write one json result per line: {"taxonomy": <str>, "ok":'
+              ' true, "%s": ...} or {"taxonomy": <str>, "ok": false,'
+              ' "error": <message>}' % result))
+    parser.add_argument(
+        '--batch-size', type=int, default=STDIN_BATCH_SIZE, metavar='N',
+        help=('with --stdin write and flush results every N lines, or'
+              ' before waiting for more input (default %d)' %
+              STDIN_BATCH_SIZE))
+
+
+def _stdin_check_arguments(parser, args):
+    if args.stdin == (args.taxonomy_str is not None):
+        parser.error('one of taxonomy_str and --stdin is required')
+    if args.batch_size < 1:
+        parser.error('argument --batch-size: must be greater than 0')
+
+
+def _stdin_ready(fd):
+    '''
+    return True if more input can be read from fd without waiting
+    '''
+    if select is None:
+        return False
+    try:
+        return bool(select.select([fd], [], [], 0)[0])
+    except (OSError, ValueError):
+        # select() doesn't support pipes on Windows
+        return False
+
+
+def _stdin_lines():
+    '''
+    iterate on the lines of the standard input (without line terminator),
+    None is yielded when the input read so far is consumed and no more
+    input is ready, to flush the results before waiting for it
+    '''
+    try:
+        fd = sys.stdin.fileno()
+    except (AttributeError, OSError, ValueError):
+        # not a real file (e.g. io.StringIO), all the input is ready
+        for line in sys.stdin:
+            yield line.rstrip('\n')
+        return
+
+    decoder = codecs.getincrementaldecoder(
+        sys.stdin.encoding or 'utf-8')(errors=sys.stdin.errors or 'strict')
+    pending = ''
+    while True:
+        data = os.read(fd, STDIN_READ_SIZE)
+        lines = (pending + decoder.decode(data, final=not data)).split('\n')
+        pending = lines.pop()
+        yield from lines
+        if not data:
+            if pending:
+                yield pending
+            return
+        if not _stdin_ready(fd):
+            yield None
+
+
+def _stdin_stream(process, batch_size, canonical=False):
+    '''
+    apply process(tax) to each line of the standard input and write the
+    results as json lines, batch_size lines at once or less if no more
+    input is ready; process returns the result fields and if tax is
+    canonical or raises ValueError
+
+    any other exception raised by process is reported as error of its
+    line too, prefixed by the exception type
+
+    RETURN:
+    exit status, 1 if some line is not valid (or, if canonical is True,
+    not canonical)
+    '''
+    ret_code = 0
+    batch = []
+    for line in _stdin_lines():
+        if line is None:
+            if batch:
+                sys.stdout.write(''.join(batch))
+                sys.stdout.flush()
+                batch = []
+            continue
+        tax = line.rstrip('\r')
+        result = {'taxonomy': tax, 'ok': True}
+        try:
+            fields, is_canonical = process(tax)
+            result.update(fields)
+            if canonical and not is_canonical:
+                ret_code = 1
+        except (ValueError, ParsimParseError,
+                ParsimIncompleteParseError) as exc:
+            result = {'taxonomy': tax, 'ok': False, 'error': str(exc)}
+            ret_code = 1
+        except Exception as exc:
+            result = {'taxonomy': tax, 'ok': False, 'error': '%s: %s' % (
+                type(exc).__name__, exc)}
+            ret_code = 1
+        batch.append(json.dumps(result) + '\n')
+        if len(batch) >= batch_size:
+            sys.stdout.write(''.join(batch))
+            sys.stdout.flush()
+            batch = []
+    if batch:
+        sys.stdout.write(''.join(batch))
+        sys.stdout.flush()
+    return ret_code
+
 
 def info():
     format_default = GemTaxonomy.INFO_OUT_TYPE.TEXT
@@ -66,11 +205,12 @@ def validate():
         description='Validate taxonomy string.')
     parser.add_argument(
         '-t', '--taxonomy-vers', nargs=1,
-        default=[GemTaxonomy.default_tax_version],
-        choices=GemTaxonomy.available_tax_versions,
+        default=[GemTaxonomy.default_tax_version()],
+        choices=GemTaxonomy.available_tax_versions(),
         metavar='<taxonomy_vers>', help=_tax_help())
     parser.add_argument(
-        'taxonomy_str', type=str, help='The taxonomy string to validate')
+        'taxonomy_str', type=str, nargs='?',
+        help='The taxonomy string to validate')
     parser.add_argument(
         '-c', '--canonical', action='store_true',
         help='return 0 if taxonomy_str is a canonical taxonomy string only')
@@ -79,16 +219,26 @@ def validate():
         help=('dump a json with information about canonicity of taxonomy_str:'
               ' {"is_canonical": true} if canonical, else {"is_canonical":'
               ' false, "canonical": "<canonical_taxonomy_str>"}'))
+    _stdin_add_arguments(parser, 'report')
     parser.add_argument('-V', '--version', action='version',
                         version='%s' % __version__,
                         help='show application version and exit')
 
     args = parser.parse_args()
+    _stdin_check_arguments(parser, args)
 
     gt = GemTaxonomy(vers=args.taxonomy_vers[0])
 
+    if args.stdin:
+        def validate_line(tax):
+            _, _, report = gt.validate(tax, build_tree=False)
+            return {'report': report}, report['is_canonical']
+
+        sys.exit(_stdin_stream(validate_line, args.batch_size,
+                               args.canonical))
+
     try:
-        _, _, report = gt.validate(args.taxonomy_str)
+        _, _, report = gt.validate(args.taxonomy_str, build_tree=False)
         if args.report:
             print(json.dumps(report))
     except (ValueError, ParsimParseError,
@@ -110,14 +260,15 @@ def explain():
 
     parser = argparse.ArgumentParser(
         description='Validate taxonomy string (version %s).' %
-        GemTaxonomy.default_tax_version)
+        GemTaxonomy.default_tax_version())
     parser.add_argument(
         '-t', '--taxonomy-vers', nargs=1,
-        default=[GemTaxonomy.default_tax_version],
-        choices=GemTaxonomy.available_tax_versions,
+        default=[GemTaxonomy.default_tax_version()],
+        choices=GemTaxonomy.available_tax_versions(),
         metavar='<taxonomy_vers>', help=_tax_help())
     parser.add_argument(
-        'taxonomy_str', type=str, help='The taxonomy string to validate')
+        'taxonomy_str', type=str, nargs='?',
+        help='The taxonomy string to validate')
     parser.add_argument(
         '-f', '--format',
         help=formats_str,
@@ -126,23 +277,34 @@ def explain():
                 list(GemTaxonomy.EXPL_OUT_TYPE.DICT.values()).index(
                     format_default)]
     )
+    _stdin_add_arguments(parser, 'explanation')
     parser.add_argument('-V', '--version', action='version',
                         version='%s' % __version__,
                         help='show application version and exit')
 
     args = parser.parse_args()
+    _stdin_check_arguments(parser, args)
 
     gt = GemTaxonomy(vers=args.taxonomy_vers[0])
 
+    if args.stdin:
+        if args.format not in GemTaxonomy.EXPL_OUT_TYPE.DICT:
+            parser.error('argument -f/--format: invalid choice [%s]' %
+                         args.format)
+
+        def explain_line(tax):
+            _, expl, report = gt.explain(tax, fmt=args.format)
+            return {'explanation': expl}, report['is_canonical']
+
+        sys.exit(_stdin_stream(explain_line, args.batch_size))
+
     try:
-        fmt, expl, val_reply = gt.explain(args.taxonomy_str, fmt=args.format)
+        gt.explain_to(sys.stdout, args.taxonomy_str, fmt=args.format)
     except (ValueError, ParsimParseError,
             ParsimIncompleteParseError) as exc:
         print(str(exc), file=sys.stderr)
         sys.exit(1)
 
-    gt.dump_explain(fmt, expl)
-
     sys.exit(0)
 
 
@@ -219,6 +381,202 @@ def _sniff_lineterm(fin):
     return ret
 
 
+# number of rows read, validated and written at once by csv_validate
+CSV_CHUNK_SIZE = 1024
+# default maximum number of sanitized values kept by csv_validate
+CSV_SANITIZE_CACHE_SIZE = 65536
+# number of taxonomy strings validated by a csv_validate job
+CSV_JOBS_CHUNK_SIZE = 2048
+
+# GemTaxonomy instance of a csv_validate worker process
+_csv_jobs_gt = None
+
+
+def _peak_memory():
+    '''
+    peak resident memory of the process (and of its terminated children)
+    as human readable string
+    '''
+    if resource is None:
+        return 'n/a'
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return '%.1f MiB' % (peak * scale / (1024 * 1024))
+
+
+def _csv_jobs_init(vers, disk_cache=None, snapshot=None, profile=False):
+    global _csv_jobs_gt
+    _csv_jobs_gt = GemTaxonomy(vers=vers, disk_cache=disk_cache,
+                               snapshot=snapshot,
+                               profile=(True if profile else None))
+
+
+def _csv_jobs_validate(filename, chunk):
+    '''
+    validate a chunk of (row_idx, column, taxonomy) of filename
+
+    RETURN:
+    output lines, number of not valid, number of not canonical, new disk
+    cache entries (saved by the main process), validation phases counters
+    (if profiling)
+    '''
+    lines = []
+    n_invalid = 0
+    n_not_canon = 0
+    for row_idx, col, tax in chunk:
+        try:
+            _, _, report = _csv_jobs_gt.validate(tax, build_tree=False)
+            if report['is_canonical'] is False:
+                n_not_canon += 1
+                lines.append('%s|%d|%s|%s|%d|%s' % (
+                    filename, row_idx, col, tax, 0, report['canonical']))
+        except (ValueError, ParsimParseError,
+                ParsimIncompleteParseError) as exc:
+            n_invalid += 1
+            lines.append('%s|%d|%s|%s|%d|%s' % (
+                filename, row_idx, col, tax, 1, str(exc)))
+    disk_cache = _csv_jobs_gt.disk_cache
+    profiler = _csv_jobs_gt.profiler
+    return (lines, n_invalid, n_not_canon,
+            (disk_cache.pop_new() if disk_cache is not None else None),
+            (profiler.pop() if profiler is not None else None))
+
+
+class LineFilter:
+    '''
+    external command used as a line filter: each line written to its
+    standard input produces one line on its standard output; values are
+    sent in batches of batch_size lines, a batch is read back only after
+    it has been written (by a separate thread, to avoid pipes deadlock)
+    '''
+    def __init__(self, command, batch_size=1):
+        self.proc = subprocess.Popen([command],
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     universal_newlines=True)
+        self.batch_size = batch_size
+
+    def _write(self, batch):
+        self.proc.stdin.write(''.join([value + '\n' for value in batch]))
+        self.proc.stdin.flush()
+
+    def filter(self, values):
+        '''
+        return the list of filtered values
+        '''
+        ret = []
+        for start in range(0, len(values), self.batch_size):
+            batch = values[start:start + self.batch_size]
+            if len(batch) == 1:
+                self._write(batch)
+            else:
+                writer = threading.Thread(target=self._write, args=(batch,))
+                writer.start()
+            for _ in batch:
+                ret.append(self.proc.stdout.readline().strip())
+            if len(batch) > 1:
+                writer.join()
+        return ret
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def _csv_dedupe_dump(gt, filename, cols, values, canonical):
+    '''
+    validate once each distinct taxonomy string of a file and print the
+    report lines in the same (row, column) order of the row by row check
+
+    cols:   column labels by check position
+    values: {check position: {taxonomy: [row_idx, ...]}}
+
+    RETURN:
+    exit status of the file
+    '''
+    ret_code = 0
+    taxs = list({tax for col_values in values.values()
+                 for tax in col_values})
+    results = dict(zip(taxs, gt.validate_many(taxs)))
+
+    lines = []
+    for col_pos, col_values in values.items():
+        for tax, rows_idx in col_values.items():
+            tax_canon, report, error = results[tax]
+            if error is not None:
+                ret_code = 1
+                line = (col_pos, cols[col_pos], tax, 1, str(error))
+            elif report['is_canonical'] is False:
+                if canonical is True:
+                    ret_code = 1
+                line = (col_pos, cols[col_pos], tax, 0, tax_canon)
+            else:
+                continue
+            # rows_idx are sorted, merge them preserving the order
+            lines.append(zip(rows_idx, itertools.repeat(line)))
+
+    for row_idx, (_, col, tax, code, msg) in heapq.merge(*lines):
+        print('%s|%d|%s|%s|%d|%s' % (filename, row_idx, col, tax, code, msg))
+
+    return ret_code
+
+
+class CsvJobs:
+    '''
+    validate chunks of taxonomy strings in a pool of processes, each with
+    its own GemTaxonomy instance, and print the resulting lines in
+    submission order
+    '''
+    def __init__(self, vers, jobs, canonical, disk_cache=None,
+                 snapshot=None, profiler=None):
+        '''
+        disk_cache: DiskCache of the main process, updated with the new
+                    entries of the workers
+        snapshot:   path of the snapshot loaded by the workers
+        profiler:   PhaseProfiler of the main process, updated with the
+                    counters of the workers
+        '''
+        # imported here, it is slow to import and required by -j only
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=jobs, initializer=_csv_jobs_init,
+            initargs=(vers, (None if disk_cache is None
+                             else disk_cache.path), snapshot,
+                      profiler is not None))
+        self.disk_cache = disk_cache
+        self.profiler = profiler
+        self.canonical = canonical
+        self.max_pending = jobs * 4
+        self.pending = collections.deque()
+        self.ret_code = 0
+
+    def submit(self, filename, chunk):
+        self.pending.append(
+            self.pool.submit(_csv_jobs_validate, filename, chunk))
+        while len(self.pending) > self.max_pending:
+            self.dump_first()
+
+    def dump_first(self):
+        lines, n_invalid, n_not_canon, new_entries, profile_info = (
+            self.pending.popleft().result())
+        if new_entries:
+            self.disk_cache.update(new_entries)
+        if profile_info is not None:
+            self.profiler.update(profile_info)
+        for line in lines:
+            print(line)
+        if n_invalid > 0 or (self.canonical is True and n_not_canon > 0):
+            self.ret_code = 1
+
+    def close(self):
+        while self.pending:
+            self.dump_first()
+        self.pool.shutdown()
+
+
 def csv_validate():
     PREPROC_SAFETY_FILE = 'PREPROCESS_SAFETY_FILE.run-once'
     parser = argparse.ArgumentParser(
@@ -241,8 +599,8 @@ note:
     )
     parser.add_argument(
         '-t', '--taxonomy-vers', nargs=1,
-        default=[GemTaxonomy.default_tax_version],
-        choices=GemTaxonomy.available_tax_versions,
+        default=[GemTaxonomy.default_tax_version()],
+        choices=GemTaxonomy.available_tax_versions(),
         metavar='<taxonomy_vers>', help=_tax_help())
     parser.add_argument(
         '-C', '--canonical', action='store_true',
@@ -273,6 +631,50 @@ note:
               'to avoid to run two times cousing destructive changes local'
               ' existence of a safety file (%s) is required (and removed by'
               ' the script itself' % PREPROC_SAFETY_FILE))
+    parser.add_argument(
+        '--chunk-size', type=int, default=CSV_CHUNK_SIZE, metavar='ROWS',
+        help=('number of rows read, validated and written at once'
+              ' (default %d)' % CSV_CHUNK_SIZE))
+    parser.add_argument(
+        '--batch-size', type=int, default=1, metavar='N',
+        help=('number of values sent to the preprocess and sanitize'
+              ' commands before reading back the results (default 1,'
+              ' line by line)'))
+    parser.add_argument(
+        '--sanitize-cache-size', type=int, default=CSV_SANITIZE_CACHE_SIZE,
+        metavar='N', help=('maximum number of sanitized values kept in'
+                           ' memory (default %d)' % CSV_SANITIZE_CACHE_SIZE))
+    parser.add_argument(
+        '--stats', action='store_true',
+        help='print processed rows, throughput and peak memory to stderr')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help=('print calls and time of each validation phase to stderr'
+              ' at exit'))
+    parser.add_argument(
+        '-D', '--dedupe', action='store_true',
+        help=('collect the distinct taxonomy strings of each file and'
+              ' validate each of them once, not allowed with preprocess,'
+              ' sanitize and jobs options'))
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1, metavar='N',
+        help=('validate files using N processes (0 for the number of'
+              ' CPUs), not allowed with preprocess and sanitize options'))
+    parser.add_argument(
+        '--disk-cache', nargs='?', const=True, default=None, metavar='FILE',
+        help=('keep validation results in a persistent cache, reused by'
+              ' the next runs with the same package, data and taxonomy'
+              ' versions (default FILE: %s)' % os.path.join(
+                  user_cache_dir(), DiskCache.FILENAME)))
+    parser.add_argument(
+        '--snapshot', nargs='?', const=True, default=None, metavar='FILE',
+        help=('load taxonomy data and specifications from the FILE'
+              ' snapshot (used by -j processes too), it is written if'
+              ' missing or out of date; FILE must be in the user cache'
+              ' directory %s (default: taxonomy<version>.snapshot there).'
+              ' WARNING: a snapshot is a pickle, loading it can run any'
+              ' code: keep the directory private and never use snapshots'
+              ' of others' % user_cache_dir()))
     parser.add_argument(
         'files_and_cols', type=str, nargs='*', default=None,
         help=(
@@ -295,6 +697,26 @@ note:
 
     args = parser.parse_args()
 
+    if args.chunk_size < 1:
+        parser.error('argument --chunk-size: must be greater than 0')
+    if isinstance(args.snapshot, str):
+        try:
+            args.snapshot = user_cache_path(args.snapshot)
+        except ValueError as exc:
+            parser.error('argument --snapshot: %s' % exc)
+    if args.batch_size < 1:
+        parser.error('argument --batch-size: must be greater than 0')
+    if args.jobs == 0:
+        args.jobs = os.cpu_count()
+    if args.jobs < 0:
+        parser.error('argument -j/--jobs: must be greater or equal to 0')
+    if args.dedupe and (args.preprocess or args.sanitize or args.jobs > 1):
+        parser.error('argument -D/--dedupe: not allowed with'
+                     ' -p/--preprocess, -s/--sanitize or -j/--jobs')
+    if args.jobs > 1 and (args.preprocess or args.sanitize):
+        parser.error('argument -j/--jobs: not allowed with'
+                     ' -p/--preprocess or -s/--sanitize')
+
     if args.preprocess:
         if os.path.isfile(PREPROC_SAFETY_FILE):
             os.remove(PREPROC_SAFETY_FILE)
@@ -357,22 +779,25 @@ note:
         print("cols4files", file=sys.stderr)
         pprint(cols4files, stream=sys.stderr)
 
-    gt = GemTaxonomy(vers=args.taxonomy_vers[0])
+    gt = GemTaxonomy(vers=args.taxonomy_vers[0], disk_cache=args.disk_cache,
+                     snapshot=args.snapshot,
+                     profile=(True if args.profile else None))
+
+    jobs = None
+    if args.jobs > 1:
+        jobs = CsvJobs(args.taxonomy_vers[0], args.jobs, args.canonical,
+                       gt.disk_cache, args.snapshot, gt.profiler)
 
     if args.preprocess:
-        prep_proc = subprocess.Popen([args.preprocess[0]],
-                                     stdin=subprocess.PIPE,
-                                     stdout=subprocess.PIPE,
-                                     universal_newlines=True)
+        prep_filter = LineFilter(args.preprocess[0], args.batch_size)
 
     if args.sanitize:
-        sani_proc = subprocess.Popen([args.sanitize[0]],
-                                     stdin=subprocess.PIPE,
-                                     stdout=subprocess.PIPE,
-                                     universal_newlines=True)
-        sani_cache = {}
+        sani_filter = LineFilter(args.sanitize[0], args.batch_size)
+        sani_cache = LRUCache(args.sanitize_cache_size)
 
     ret_code = 0
+    n_rows = 0
+    t_start = time.perf_counter()
     for filename in files2check:
         if args.verbose:
             print('csv_validate: %s' % filename, file=sys.stderr)
@@ -407,83 +832,142 @@ note:
                 print("\nBEFORE CSV LOOP", file=sys.stderr)
                 pprint(cols4files, stream=sys.stderr)
 
+            col_names = {col: cols4file['n_map'].get(col, col)
+                         for col in cols4file['check_n']}
             if args.verbose:
                 print('  check cols: %s' % ', '.join([
-                    (cols4file['n_map'][col] if col in
-                     cols4file['n_map'] else col)
-                    for col in cols4file['check_n']]), file=sys.stderr)
-            for row_idx, row in enumerate(csvreader,
-                                          start=cols4file['header_rows']):
-                if args.preprocess or args.sanitize:
-                    row_out = row[:]
-                for col in cols4file['check_n']:
-                    if args.preprocess:
-                        prep_proc.stdin.write(row[col] + '\n')
-                        prep_proc.stdin.flush()
-                        tax = prep_proc.stdout.readline().strip()
-                        row_out[col] = tax
-                    else:
-                        tax = row[col]
-
-                    tax_list = None
-                    if args.subfield:
-                        if tax.find(args.subfield[0]):
-                            tax_list = tax.split(args.subfield[0])
-                            tax = tax_list[int(args.subfield[1])]
-                    try:
-                        _, _, report = gt.validate(tax)
-                        if report['is_canonical'] is False:
+                    str(col_names[col]) for col in cols4file['check_n']]),
+                    file=sys.stderr)
+            chunk = []
+            values = collections.defaultdict(dict)
+            row_idx = cols4file['header_rows']
+            while True:
+                rows = list(itertools.islice(csvreader, args.chunk_size))
+                if not rows:
+                    break
+                rows_out = []
+                if args.preprocess:
+                    prep_taxs = iter(prep_filter.filter([
+                        row[col] for row in rows
+                        for col in cols4file['check_n']]))
+                # cells to sanitize: (row_out, col, tax, tax_list)
+                sani_cells = []
+                for row in rows:
+                    if args.preprocess or args.sanitize:
+                        row_out = row[:]
+                    for col_pos, col in enumerate(cols4file['check_n']):
+                        if args.preprocess:
+                            tax = next(prep_taxs)
+                            row_out[col] = tax
+                        else:
+                            tax = row[col]
+
+                        tax_list = None
+                        if args.subfield:
+                            if tax.find(args.subfield[0]):
+                                tax_list = tax.split(args.subfield[0])
+                                tax = tax_list[int(args.subfield[1])]
+                        if args.dedupe:
+                            values[col_pos].setdefault(tax, []).append(
+                                row_idx)
+                            continue
+                        if jobs:
+                            chunk.append((row_idx, col_names[col], tax))
+                            if len(chunk) >= CSV_JOBS_CHUNK_SIZE:
+                                jobs.submit(filename, chunk)
+                                chunk = []
+                            continue
+                        try:
+                            _, _, report = gt.validate(tax, build_tree=False)
+                            if report['is_canonical'] is False:
+                                print('%s|%d|%s|%s|%d|%s' % (
+                                    filename, row_idx, col_names[col], tax,
+                                    0, report['canonical']))
+                                if args.canonical is True:
+                                    ret_code = 1
+                                if args.sanitize:
+                                    if tax_list:
+                                        tax_list[int(args.subfield[1])] = (
+                                            report['canonical'])
+                                        row_out[col] = args.subfield[0].join(
+                                            tax_list)
+                                    else:
+                                        row_out[col] = report['canonical']
+                        except (ValueError, ParsimParseError,
+                                ParsimIncompleteParseError) as exc:
+                            ret_code = 1
                             print('%s|%d|%s|%s|%d|%s' % (
-                                filename, row_idx,
-                                (col if col not in cols4file['n_map']
-                                 else cols4file['n_map'][col]), tax, 0,
-                                report['canonical']))
-                            if args.canonical is True:
-                                ret_code = 1
+                                filename, row_idx, col_names[col],
+                                tax, 1, str(exc)))
                             if args.sanitize:
-                                if tax_list:
-                                    tax_list[int(args.subfield[1])] = report[
-                                        'canonical']
-                                    row_out[col] = args.subfield[0].join(
-                                        tax_list)
-                                else:
-                                    row_out[col] = report['canonical']
-                    except (ValueError, ParsimParseError,
-                            ParsimIncompleteParseError) as exc:
-                        ret_code = 1
-                        print('%s|%d|%s|%s|%d|%s' % (
-                            filename, row_idx,
-                            (col if col not in cols4file['n_map']
-                             else cols4file['n_map'][col]),
-                            tax, 1, str(exc)))
-                        if args.sanitize:
-                            if tax not in sani_cache:
-                                sani_proc.stdin.write(tax + '\n')
-                                sani_proc.stdin.flush()
-                                tax_new = sani_proc.stdout.readline().strip()
-                                sani_cache[tax] = tax_new
-
-                            if tax_list:
-                                tax_list[int(args.subfield[1])] = sani_cache[
-                                    tax]
-                                row_out[col] = args.subfield[0].join(
-                                    tax_list)
-                            else:
-                                row_out[col] = sani_cache[tax]
-                if args.sanitize:
-                    csvwriter.writerow(row_out)
+                                sani_cells.append(
+                                    (row_out, col, tax, tax_list))
+                    if args.sanitize:
+                        rows_out.append(row_out)
+                    row_idx += 1
+
+                if sani_cells:
+                    sani_taxs = {}
+                    sani_missing = []
+                    for _, _, tax, _ in sani_cells:
+                        if tax in sani_taxs:
+                            continue
+                        sani_taxs[tax] = sani_cache.get(tax)
+                        if sani_taxs[tax] is LRUCache.MISSING:
+                            sani_missing.append(tax)
+                    for tax, tax_new in zip(
+                            sani_missing, sani_filter.filter(sani_missing)):
+                        sani_cache.put(tax, tax_new)
+                        sani_taxs[tax] = tax_new
+                    for row_out, col, tax, tax_list in sani_cells:
+                        if tax_list:
+                            tax_list[int(args.subfield[1])] = sani_taxs[tax]
+                            row_out[col] = args.subfield[0].join(tax_list)
+                        else:
+                            row_out[col] = sani_taxs[tax]
+                if rows_out:
+                    csvwriter.writerows(rows_out)
+                n_rows += len(rows)
+            if chunk:
+                jobs.submit(filename, chunk)
+            if values:
+                ret_code |= _csv_dedupe_dump(
+                    gt, filename,
+                    [col_names[col] for col in cols4file['check_n']],
+                    values, args.canonical)
 
         if args.preprocess or args.sanitize:
             fout.close()
             os.rename('%s.taxs' % filename, filename)
 
+    if jobs:
+        jobs.close()
+        ret_code = jobs.ret_code
+
+    if args.stats:
+        t_elapsed = time.perf_counter() - t_start
+        print('csv_validate: %d rows in %.3f s (%.1f rows/s), peak memory'
+              ' %s' % (n_rows, t_elapsed,
+                       (n_rows / t_elapsed) if t_elapsed > 0 else 0.0,
+                       _peak_memory()), file=sys.stderr)
+        if gt.disk_cache is not None:
+            disk_info = gt.disk_cache.info()
+            print('csv_validate: disk cache %s, %d entries loaded, %d hits'
+                  % (disk_info['path'], disk_info['loaded'],
+                     disk_info['hits']), file=sys.stderr)
+
+    if args.profile:
+        for line in gt.profiler.format():
+            print('csv_validate: %s' % line, file=sys.stderr)
+
     if args.preprocess:
-        prep_proc.terminate()
-        prep_proc.wait()
+        prep_filter.close()
 
     if args.sanitize:
-        sani_proc.terminate()
-        sani_proc.wait()
+        sani_filter.close()
+
+    if gt.disk_cache is not None:
+        gt.disk_cache.save()
 
     sys.exit(ret_code)
 
@@ -673,11 +1157,11 @@ class OutLeaf:
 def specs2graph():
     parser = argparse.ArgumentParser(
         description='Create graph of taxonomy specifications (version %s).' %
-        GemTaxonomy.default_tax_version)
+        GemTaxonomy.default_tax_version())
     parser.add_argument(
         '-t', '--taxonomy-vers', nargs=1,
-        default=[GemTaxonomy.default_tax_version],
-        choices=GemTaxonomy.available_tax_versions,
+        default=[GemTaxonomy.default_tax_version()],
+        choices=GemTaxonomy.available_tax_versions(),
         metavar='<taxonomy_vers>', help=_tax_help())
     parser.add_argument(
         '-d', '--dot', action='store_true',
@@ -714,3 +1198,170 @@ def specs2graph():
         _graph_dot(out_leaf)
     else:
         _graph_print(out_leaf)
+
+
+def serve():
+    parser = argparse.ArgumentParser(
+        description='''Validate, explain and split taxonomy strings as a service.
+Requests and responses are JSON lines, see service.TaxonomyService class.''')
+    parser.add_argument(
+        '-t', '--taxonomy-vers', nargs=1,
+        default=[GemTaxonomy.default_tax_version()],
+        choices=GemTaxonomy.available_tax_versions(),
+        metavar='<taxonomy_vers>', help=(
+            'default taxonomy version of the requests (%s), acceptable'
+            ' values are %s' % (GemTaxonomy.default_tax_version(), ', '.join(
+                GemTaxonomy.available_tax_versions()))))
+    listen = parser.add_mutually_exclusive_group(required=True)
+    listen.add_argument(
+        '-u', '--unix', metavar='PATH',
+        help='listen on the PATH unix socket')
+    listen.add_argument(
+        '--http', metavar='[HOST:]PORT',
+        help='listen for HTTP POST requests (HOST default: 127.0.0.1)')
+    parser.add_argument(
+        '--snapshot-dir', default=None, metavar='DIR',
+        help=('load taxonomy specifications from snapshots in DIR'
+              ' (written if missing or out of date), in the user cache'
+              ' directory %s. WARNING: a snapshot is a pickle, loading it'
+              ' can run any code: keep the directory private and never'
+              ' use snapshots of others' % user_cache_dir()))
+    parser.add_argument(
+        '-v', '--verbose', action='store_true',
+        help='increase verbosity')
+    parser.add_argument('-V', '--version', action='version',
+                        version='%s' % __version__,
+                        help='show application version and exit')
+
+    args = parser.parse_args()
+
+    http_address = None
+    if args.http is not None:
+        host, _, port = args.http.rpartition(':')
+        try:
+            http_address = (host or '127.0.0.1', int(port))
+        except ValueError:
+            parser.error('argument --http: invalid port [%s]' % port)
+
+    # imported here, http.server is slow to import for the other commands
+    from openquake.gem_taxonomy.service import TaxonomyService, make_server
+
+    try:
+        service = TaxonomyService(args.taxonomy_vers[0], args.snapshot_dir)
+    except ValueError as exc:
+        # snapshot_dir not in the user cache directory
+        parser.error('argument --snapshot-dir: %s' % exc)
+    try:
+        server = make_server(service, args.unix, http_address, args.verbose)
+    except FileExistsError as exc:
+        parser.error('argument -u/--unix: %s' % exc)
+    if args.verbose:
+        print('serve: listening on %s' % (
+            args.unix if args.unix else 'http://%s:%d' % http_address),
+            file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(args.unix)
+
+
+def bench():
+    # imported here, it is required by this command only
+    from openquake.gem_taxonomy import bench as gt_bench
+
+    parser = argparse.ArgumentParser(
+        description='''Benchmark validate, explain, split_by_attributes and csv_validate.
+Results (strings/s, p50/p99 latency and peak memory) are printed as JSON.''',
+        formatter_class=RawTextHelpFormatter)
+    parser.add_argument(
+        '-t', '--taxonomy-vers', action='append',
+        choices=GemTaxonomy.available_tax_versions(),
+        metavar='<taxonomy_vers>', help=(
+            'taxonomy version to benchmark (all by default), acceptable'
+            ' values are %s' % ', '.join(
+                GemTaxonomy.available_tax_versions())))
+    parser.add_argument(
+        '-c', '--corpus', action='append', choices=gt_bench.CORPORA,
+        help='corpus to use (all by default): %s' % ', '.join(
+            gt_bench.CORPORA))
+    parser.add_argument(
+        '-b', '--benchmark', action='append', choices=gt_bench.BENCHMARKS,
+        help='benchmark to run (all by default): %s' % ', '.join(
+            gt_bench.BENCHMARKS))
+    parser.add_argument(
+        '-n', '--strings', type=int, default=2000, metavar='N',
+        help='number of strings of each corpus (default 2000)')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='seed of the synthetic corpora (default 0)')
+    parser.add_argument(
+        '--repeat', type=int, default=1, metavar='N',
+        help=('process each string N times, the following ones hit the'
+              ' caches (default 1)'))
+    parser.add_argument(
+        '--parser', choices=GemTaxonomy.PARSERS, default='fast',
+        help='taxonomy string parser engine (default fast)')
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='disable the validation and explanation caches')
+    parser.add_argument(
+        '--no-memory', action='store_true',
+        help='do not trace the peak memory (it requires a second run)')
+    parser.add_argument(
+        '--csv-runs', type=int, default=3, metavar='N',
+        help='number of csv_validate runs (default 3)')
+    parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help='write the JSON report to FILE instead of the standard output')
+    parser.add_argument('-V', '--version', action='version',
+                        version='%s' % __version__,
+                        help='show application version and exit')
+
+    args = parser.parse_args()
+    if args.strings < 1:
+        parser.error('argument -n/--strings: must be positive')
+
+    gt_kwargs = {'parser': args.parser}
+    if args.no_cache:
+        gt_kwargs.update(cache_size=0, attr_cache_size=0,
+                         explain_cache_size=0, fragment_cache_size=0)
+    # '3' and '4' are aliases of '3.3' and '4.0'
+    versions = list(dict.fromkeys(
+        GemTaxonomy(vers=vers).tax_vers for vers in (
+            args.taxonomy_vers or GemTaxonomy.available_tax_versions())))
+    report = gt_bench.run(
+        versions,
+        corpora=args.corpus or gt_bench.CORPORA,
+        benchmarks=args.benchmark or gt_bench.BENCHMARKS,
+        n=args.strings, seed=args.seed, gt_kwargs=gt_kwargs,
+        repeat=args.repeat, memory=not args.no_memory,
+        csv_runs=args.csv_runs)
+    for info in report['corpora']:
+        if info['unexpected_errors'] > 0:
+            sys.stderr.write(
+                'Warning: %d strings left out of the %s %s corpus, their'
+                ' validation raised an unexpected exception\n' % (
+                    info['unexpected_errors'], info['version'],
+                    info['corpus']))
+    for info in report['results']:
+        if info.get('unexpected_errors', 0) > 0:
+            sys.stderr.write(
+                'Warning: %d of the %s runs on the %s %s corpus failed'
+                ' unexpectedly, the last one with %s\n' % (
+                    info['unexpected_errors'], info['benchmark'],
+                    info['version'], info['corpus'],
+                    info['unexpected_output'].rstrip('\n')))
+
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(report, fout, indent=2)
+            fout.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    sys.exit(0)
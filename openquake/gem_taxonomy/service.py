@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2024-2025 GEM Foundation
+#
+# Openquake Gem Taxonomy is free software: you can redistribute it and/or
+# modify it # under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+'''
+Long running service used by gem-taxonomy-serve: warm GemTaxonomy
+instances answering JSON-lines requests over a unix socket or HTTP.
+'''
+import os
+import json
+import stat
+import socketserver
+import http.server
+from openquake.gem_taxonomy import GemTaxonomy
+
+
+class TaxonomyService:
+    '''
+    warm GemTaxonomy instances, one for each available taxonomy version,
+    answering JSON-lines requests in the form:
+
+    {"id": <any>, "op": "validate"|"explain"|"split", "tax": <string>,
+     "vers": <taxonomy version>, "format": <explain format>}
+
+    with a {"id": <id>, "ok": true, "result": <result>} or {"id": <id>,
+    "ok": false, "error": <message>} line; "op" defaults to "validate",
+    "vers" to the service default version.
+    '''
+    OPS = ('validate', 'explain', 'split')
+
+    def __init__(self, vers=None, snapshot_dir=None):
+        self.vers = (GemTaxonomy.default_tax_version() if vers is None
+                     else vers)
+        self.gts = {}
+        for tax_vers in GemTaxonomy.available_tax_versions():
+            # '3' and '4' are aliases of '3.3' and '4.0'
+            full_vers = GemTaxonomy(vers=tax_vers).tax_vers
+            if full_vers not in self.gts:
+                snapshot = (None if snapshot_dir is None else os.path.join(
+                    snapshot_dir, 'taxonomy%s.snapshot' % full_vers))
+                gt = GemTaxonomy(vers=full_vers, snapshot=snapshot)
+                for name in gt.LAZY_ATTRS:
+                    getattr(gt, name)
+                self.gts[full_vers] = gt
+            self.gts[tax_vers] = self.gts[full_vers]
+
+    def call(self, request):
+        if not isinstance(request, dict):
+            raise ValueError('request must be a JSON object')
+        op = request.get('op', 'validate')
+        if op not in self.OPS:
+            raise ValueError('unknown op [%s], allowed ops are %s' % (
+                op, ', '.join(self.OPS)))
+        vers = str(request.get('vers', self.vers))
+        gt = self.gts.get(vers)
+        if gt is None:
+            raise ValueError('unknown taxonomy version [%s]' % vers)
+        tax = request.get('tax')
+        if not isinstance(tax, str):
+            raise ValueError('"tax" must be a string')
+
+        if op == 'validate':
+            _, _, report = gt.validate(tax, build_tree=False)
+            return report
+        elif op == 'split':
+            return gt.split_by_attributes(tax)
+        else:
+            _, expl, report = gt.explain(
+                tax, fmt=request.get('format', 'textsingleline'))
+            return {'explanation': expl, 'report': report}
+
+    def handle(self, line):
+        '''
+        RETURN:
+        the response line (without line terminator) of a request line
+        '''
+        req_id = None
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict):
+                req_id = request.get('id')
+            response = {'id': req_id, 'ok': True,
+                        'result': self.call(request)}
+        except Exception as exc:
+            # any failure is reported to the client, the service goes on
+            response = {'id': req_id, 'ok': False, 'error': str(exc)}
+        return json.dumps(response)
+
+
+class _ServeStreamHandler(socketserver.StreamRequestHandler):
+    '''
+    JSON-lines over a stream socket: requests can be pipelined, responses
+    are written in the same order
+    '''
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            self.wfile.write(
+                (self.server.service.handle(line) + '\n').encode('utf-8'))
+
+
+class _ServeHTTPHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    JSON-lines over HTTP: the body of a POST request holds one or more
+    request lines, the response body the related response lines
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        lines = self.rfile.read(length).splitlines()
+        body = ''.join(self.server.service.handle(line) + '\n'
+                       for line in lines if line.strip()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(service, unix=None, http_address=None, verbose=False):
+    '''
+    create the threaded server of service listening on the unix socket
+    path or on the (host, port) http_address; an existing unix socket is
+    replaced, FileExistsError is raised if the path is another file
+    '''
+    if unix is not None:
+        try:
+            is_socket = stat.S_ISSOCK(os.lstat(unix).st_mode)
+        except FileNotFoundError:
+            pass
+        else:
+            if not is_socket:
+                raise FileExistsError(
+                    'path [%s] exists and is not a unix socket' % unix)
+            os.remove(unix)
+        server = socketserver.ThreadingUnixStreamServer(
+            unix, _ServeStreamHandler)
+    else:
+        server = http.server.ThreadingHTTPServer(
+            http_address, _ServeHTTPHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
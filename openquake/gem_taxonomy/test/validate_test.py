@@ -15,11 +15,37 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import io
 import os
+import gc
 import re
+import sys
+import csv
 import copy
+import json
+import pickle
+import time
+import select
+import asyncio
+import socket
+import socketserver
 import unittest
-from openquake.gem_taxonomy import GemTaxonomy
+import weakref
+import threading
+import subprocess
+import http.client
+import concurrent.futures
+import tempfile
+import contextlib
+from unittest import mock
+import pytest
+from parsimonious.exceptions import ParseError as ParsimParseError
+from parsimonious.exceptions import (IncompleteParseError as
+                                     ParsimIncompleteParseError)
+from openquake.gem_taxonomy import GemTaxonomy, scripts
+from openquake.gem_taxonomy.parser import TaxonomyParser, ParseError
+from openquake.gem_taxonomy import (aio, bench, cache, classes, encoding,
+                                    instrument, service)
 from _pytest.assertion import truncate
 truncate.DEFAULT_MAX_LINES = 9999
 truncate.DEFAULT_MAX_CHARS = 9999
@@ -210,6 +236,7 @@ taxonomy_strings = {'3.3': [
 
     ('MIX(RES;MIX(COM;GOV))', 'Attribute [MIX(RES;MIX(COM;GOV))],'
      ' forbidden atom found [MIX].'),
+    ('MIX(RES;COM;GV)', 'Attribute [MIX(RES;COM;GV)]: unknown atom [GV].'),
     ('MIX(RES;COM;GOV)', None, None, '<ATTR id="0xADDR" name="occupancy">\n'
      '    <ATOM id="0xADDR" name="MIX" title="Mixed">\n        <args>\n'
      '            <ATOM id="0xADDR" name="RES" title="Residential"/>\n'
@@ -562,11 +589,13 @@ class InfoTestCase(unittest.TestCase):
 
 
 class ValidateTestCase(unittest.TestCase):
+    parser = 'fast'
+
     def test(self):
         self.maxDiff = None
         only_success = (os.getenv('ONLY_SUCCESS', 'False') == 'True')
         for vers in test_vers_range:
-            gt = GemTaxonomy(vers=vers)
+            gt = GemTaxonomy(vers=vers, parser=self.parser)
             for tax_in in taxonomy_strings[vers]:
                 tax = [None] * 6
                 for idx, tax_val in enumerate(tax_in):
@@ -614,6 +643,37 @@ class ValidateSuccessOnlyTestCase(ValidateTestCase):
         super().test()
 
 
+class ValidateParsimoniousTestCase(ValidateTestCase):
+    parser = 'parsimonious'
+
+    def test(self):
+        super().test()
+
+
+class ParserTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0', parser='parsimonious')
+        tp = TaxonomyParser()
+        for vers in test_vers_range:
+            for tax in taxonomy_strings[vers]:
+                try:
+                    expected = gt.parse_taxonomy_parsimonious(tax[0])
+                except (ParsimParseError, ParsimIncompleteParseError) as exc:
+                    with self.assertRaises(ParseError) as ctx:
+                        tp.parse(tax[0])
+                    self.assertEqual(str(ctx.exception), str(exc))
+                    continue
+                self.assertEqual(tp.parse(tax[0]), expected)
+
+        _, attrs = tp.parse('HYB(C;S)(W;MR):X/H:3')
+        atom = attrs[0].atoms[0]
+        self.assertEqual((atom.name, atom.params), ('HYB', ('X',)))
+        self.assertEqual([x.text for x in atom.args], ['C', 'S'])
+
+        with self.assertRaises(ValueError):
+            GemTaxonomy(vers='4.0', parser='unknown')
+
+
 class ReprTestCase(unittest.TestCase):
     # Use code like this to generate comparison strings
     # cat > temp.log ;  cut -c 19- < temp.log | sed 's/$/\\n/g' | \
@@ -652,3 +712,1221 @@ class ExplainTestCase(unittest.TestCase):
                 gt.explain(tax[0], fmt='textsingleline')
                 gt.explain(tax[0], fmt='textmultiline')
                 gt.explain(tax[0], fmt='json')
+
+
+class ValidateCacheTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0', cache_size=2)
+
+        attrs, l_attrs, report = gt.validate('DCW:0.4+LFM')
+        self.assertEqual(gt.cache_info()['validate']['misses'], 1)
+        attrs['llrs'] = 'XXX'
+        report['is_canonical'] = True
+        with self.assertRaises(AttributeError):
+            l_attrs[0].atoms = []
+        with self.assertRaises(AttributeError):
+            l_attrs[0].atoms[1].params[0].value = 0.5
+
+        attrs, _, report = gt.validate('DCW:0.4+LFM')
+        self.assertEqual(attrs, {'llrs': 'LFM+DCW:0.4'})
+        self.assertEqual(report['is_canonical'], False)
+        self.assertEqual(gt.cache_info()['validate']['hits'], 1)
+
+        # failures are cached too and raise the same message
+        for _ in range(2):
+            with self.assertRaises(ValueError) as ctx:
+                gt.validate('S+S')
+            self.assertEqual(
+                str(ctx.exception),
+                'Attribute [S+S]: multiple occurrencies of [S] atom.')
+        info = gt.cache_info()['validate']
+        self.assertEqual((info['hits'], info['misses'], info['size']),
+                         (2, 2, 2))
+
+        # least recently used entry ('DCW:0.4+LFM') is evicted
+        gt.validate('W')
+        gt.validate('DCW:0.4+LFM')
+        self.assertEqual(gt.cache_info()['validate']['misses'], 4)
+
+        gt.cache_clear()
+        self.assertEqual(gt.cache_info()['validate'],
+                         {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2})
+
+
+class AttributeCacheTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+
+        _, l_attrs_a, _ = gt.validate('CR+CIP/LFM+DCW:0.4/H:3')
+        info = gt.cache_info()['attribute']
+        self.assertEqual((info['hits'], info['misses']), (0, 3))
+
+        # known segments are reused, only 'H:4' is validated
+        _, l_attrs_b, report = gt.validate('LFM+DCW:0.4/H:4/CR+CIP')
+        info = gt.cache_info()['attribute']
+        self.assertEqual((info['hits'], info['misses']), (2, 4))
+        self.assertEqual(report['canonical'], 'CR+CIP/LFM+DCW:0.4/H:4')
+        self.assertIs(l_attrs_a[0], l_attrs_b[0])
+
+        # cached failing attribute in a new string
+        for tax in ['S+CIP/H:3', 'H:3/S+CIP']:
+            with self.assertRaises(ValueError) as ctx:
+                gt.validate(tax)
+            self.assertEqual(
+                str(ctx.exception),
+                'Attribute [S+CIP]: missing dependency for atom [CIP]')
+
+        # parsing errors are still reported for the whole string
+        with self.assertRaises(ValueError) as ctx:
+            gt.validate('H:3/')
+        self.assertTrue(str(ctx.exception).startswith(
+            'Taxonomy string [H:3/]: a taxonomy string must end with'))
+
+
+class AtomSpecTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+
+        spec = gt.atom_specs['HYB']
+        self.assertEqual(spec.args_type_name, 'filtered_attribute')
+        self.assertEqual(spec.args_info['attribute_name'], 'material')
+        self.assertEqual(spec.args_info['filtered_atoms'],
+                         frozenset(['MDD', 'MDV', 'HYB']))
+        self.assertEqual((spec.args_min, spec.must_be_diff), (2, True))
+        self.assertIsNone(spec.params)
+
+        spec = gt.atom_specs['DCW']
+        self.assertEqual(spec.param_type_name, 'float')
+        self.assertEqual((spec.min_v, spec.max_v), (0.0, 1.0))
+        self.assertIsInstance(spec.min_v, float)
+
+        spec = gt.atom_specs['CIP']
+        self.assertEqual(spec.deps, ('CU', 'CR', 'SRC'))
+        self.assertEqual(spec.group_prog, int(gt.tax['AtomsGroupDict'][
+            spec.group]['prog']))
+
+
+class ValidateManyTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0', cache_size=0)
+        taxs = ['W', 'DCW:0.4+LFM', 'S+S', 'W', 'UNK', 'S+S']
+
+        results = gt.validate_many(taxs)
+        out = list(results)
+        self.assertEqual([x[0] for x in out],
+                         ['W', 'LFM+DCW:0.4', None, 'W', 'UNK', None])
+        self.assertEqual(out[1][1]['original'], 'DCW:0.4+LFM')
+        self.assertIsNone(out[0][2])
+        self.assertEqual(str(out[2][2]),
+                         'Attribute [S+S]: multiple occurrencies of [S] atom.')
+        self.assertEqual(results.summary,
+                         {'total': 6, 'validated': 4, 'valid': 4,
+                          'canonical': 3, 'errors': 2})
+
+        results = gt.validate_many(iter(taxs), dedupe=False)
+        list(results)
+        self.assertEqual(results.summary['validated'], 6)
+
+        results = gt.validate_many(taxs, on_error='raise')
+        with self.assertRaises(ValueError):
+            list(results)
+        self.assertEqual(results.summary['valid'], 2)
+
+        with self.assertRaises(ValueError):
+            gt.validate_many(taxs, on_error='ignore')
+
+
+def run_csv_validate(argv):
+    stdout = io.StringIO()
+    with mock.patch.object(sys, 'argv', ['gem-taxonomy-csv-validate'] + argv):
+        with contextlib.redirect_stdout(stdout):
+            with pytest.raises(SystemExit) as exc:
+                scripts.csv_validate()
+    return exc.value.code, stdout.getvalue()
+
+
+class CsvValidateModesTestCase(unittest.TestCase):
+    def test(self):
+        taxs = [tax[0] for tax in taxonomy_strings['4.0']]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'exposure.csv')
+            with open(filename, 'w', newline='') as csvfile:
+                csvwriter = csv.writer(csvfile)
+                csvwriter.writerow(['id', 'taxonomy', 'other'])
+                for idx in range(3000):
+                    csvwriter.writerow([idx, taxs[idx % len(taxs)],
+                                        taxs[idx % 7]])
+
+            for opts in ([], ['-C']):
+                opts += [filename, '1', 'taxonomy', 'N:2']
+                serial = run_csv_validate(opts + ['-t', '4.0'])
+                self.assertEqual(serial[0], 1)
+                for mode in (['-j', '2'], ['-j', '3'], ['-D']):
+                    self.assertEqual(run_csv_validate(
+                        opts + mode + ['-t', '4.0']), serial)
+
+
+class CsvValidateSanitizeTestCase(unittest.TestCase):
+    def test(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sanitizer = os.path.join(tmpdir, 'sanitize.sh')
+            with open(sanitizer, 'w') as fout:
+                fout.write('#!/bin/sh\nsed -u \'s/^SS$/S/;s/^WW$/W/\'\n')
+            os.chmod(sanitizer, 0o755)
+
+            files_out = []
+            for opts in ([], ['--chunk-size', '3',
+                              '--sanitize-cache-size', '1', '--stats'],
+                         ['--chunk-size', '5', '--batch-size', '2']):
+                filename = os.path.join(tmpdir, 'exposure.csv')
+                with open(filename, 'w', newline='') as csvfile:
+                    csvwriter = csv.writer(csvfile)
+                    csvwriter.writerow(['id', 'taxonomy'])
+                    for idx, tax in enumerate(
+                            ['SS', 'WW', 'DCW:0.4+LFM', 'SS', 'W', 'WW',
+                             'QQ', 'SS']):
+                        csvwriter.writerow([idx, tax])
+                ret, output = run_csv_validate(
+                    opts + ['-t', '4.0', '-s', sanitizer, filename])
+                self.assertEqual(ret, 1)
+                self.assertEqual(len(output.splitlines()), 7)
+                with open(filename, newline='') as csvfile:
+                    files_out.append([row[1] for row in csv.reader(csvfile)])
+
+            self.assertEqual(files_out[0], files_out[1])
+            self.assertEqual(files_out[0], files_out[2])
+            self.assertEqual(files_out[0], [
+                'taxonomy', 'S', 'W', 'LFM+DCW:0.4', 'S', 'W', 'W', 'QQ',
+                'S'])
+
+
+class BuildTreeTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+        gt_ref = GemTaxonomy(vers='4.0', cache_size=0, attr_cache_size=0)
+        tax = 'LFM+DCW:0.4/HYB(CR;S)/H:3'
+
+        attrs, l_attrs, report = gt.validate(tax, build_tree=False)
+        self.assertIsNone(l_attrs)
+        self.assertEqual(report['canonical'], 'HYB(CR;S)/LFM+DCW:0.4/H:3')
+        self.assertEqual(attrs, gt_ref.validate(tax)[0])
+
+        # the tree is built when required and then cached
+        for fmt in ('textsingleline', 'textmultiline', 'json'):
+            self.assertEqual(gt.explain(tax, fmt=fmt),
+                             gt_ref.explain(tax, fmt=fmt))
+        _, l_attrs, _ = gt.validate(tax, build_tree=False)
+        self.assertIsNone(l_attrs)
+        _, l_attrs_a, _ = gt.validate(tax)
+        _, l_attrs_b, _ = gt.validate(tax)
+        self.assertIs(l_attrs_a[0], l_attrs_b[0])
+
+        with self.assertRaises(ValueError):
+            gt.validate('S+S', build_tree=False)
+
+
+class LogicRecordTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+        _, l_attrs, _ = gt.validate('HYB(CR;S)/LFM+DCW:0.4/H:1-3')
+
+        hyb = l_attrs[0].atoms[0]
+        dcw = l_attrs[1].atoms[1]
+        height = l_attrs[2].atoms[0]
+        for node in (l_attrs[0], hyb, hyb.args[0], dcw.params[0]):
+            self.assertFalse(hasattr(node, '__dict__'))
+            with self.assertRaises(AttributeError):
+                node.canonical = None
+            with self.assertRaises(AttributeError):
+                del node.canonical
+        # specifications entries are shared, not copied
+        self.assertIs(hyb.spec, gt.atom_specs['HYB'])
+        self.assertIs(hyb.atom, gt.atom_specs['HYB'].atom)
+        self.assertIs(l_attrs[0].attribute, gt.tax['AttributeDict']['material'])
+        self.assertEqual(height.params[0].value, (1, 3))
+
+        # copy and pickle round trips
+        json_type = GemTaxonomy.EXPL_OUT_TYPE.JSON
+        expl = [attr.explain(output_type=json_type) for attr in l_attrs]
+        for dup in (copy.copy, copy.deepcopy,
+                    lambda x: pickle.loads(pickle.dumps(x))):
+            nodes = [dup(attr) for attr in l_attrs]
+            self.assertEqual([attr.explain(output_type=json_type)
+                              for attr in nodes], expl)
+            self.assertEqual(gt.logic_explain(nodes), gt.logic_explain(l_attrs))
+            self.assertEqual(dup(dcw.params[0]).value, dcw.params[0].value)
+            with self.assertRaises(AttributeError):
+                nodes[0].canonical = None
+
+        # per-instance plural/singular rule of the unit of measure
+        param = height.params[0]
+        self.assertEqual(param.unit_meas_out('1'), param.unit_meas[0])
+        single_param = GemTaxonomy.LogicParam(
+            param.atom, param.type, param.subtype, param.title, param.value,
+            param.unit_meas, unit_meas_is_single=lambda value_out: True)
+        self.assertEqual(single_param.unit_meas_out('3'), param.unit_meas[0])
+        self.assertEqual(param.unit_meas_out('3'), param.unit_meas[1])
+
+        # nodes don't refer to the GemTaxonomy instance
+        expected = gt.explain('HYB(CR;S)/LFM+DCW:0.4/H:1-3', fmt='json')[1]
+        gt_ref = weakref.ref(gt)
+        del gt
+        gc.collect()
+        self.assertIsNone(gt_ref())
+        self.assertEqual([attr.explain(output_type=GemTaxonomy.EXPL_OUT_TYPE.JSON)
+                          for attr in l_attrs], expected)
+
+
+@unittest.skipIf(encoding.numpy is None, 'numpy not installed')
+class EncoderTestCase(unittest.TestCase):
+    def test(self):
+        numpy = encoding.numpy
+        enc = encoding.TaxonomyEncoder(GemTaxonomy(vers='4.0'))
+        taxs = ['CR/LFM+DCW:0.4', 'S+S', 'LFM+DCW:0.4/CR', 'UNK', 'W/H:3']
+
+        ids, dictionary, codes = enc.encode(taxs)
+        self.assertEqual(ids.tolist(), [0, -1, 0, 1, 2])
+        self.assertEqual(dictionary.tolist(),
+                         ['CR/LFM+DCW:0.4', 'UNK', 'W/H:3'])
+        self.assertEqual(codes.shape, (3, len(enc.attributes)))
+        self.assertEqual(enc.decode(ids).tolist(), [
+            'CR/LFM+DCW:0.4', None, 'CR/LFM+DCW:0.4', 'UNK', 'W/H:3'])
+        self.assertEqual(enc.decode_codes(codes[0]),
+                         {'material': 'CR', 'llrs': 'LFM+DCW:0.4'})
+        self.assertEqual(enc.decode_codes(codes[1]), {})
+
+        # the dictionary is shared by following calls
+        ids, dictionary, codes = enc.encode(['W/H:3', 'S/H:3'])
+        self.assertEqual(ids.tolist(), [2, 3])
+        self.assertEqual(len(dictionary), 4)
+        material = enc.attributes.index('material')
+        height = enc.attributes.index('height')
+        self.assertEqual(codes[3, height], codes[2, height])
+        self.assertNotEqual(codes[3, material], codes[2, material])
+
+        ids, dictionary, codes = encoding.TaxonomyEncoder(
+            GemTaxonomy(vers='4.0')).encode([])
+        self.assertEqual(ids.dtype, numpy.int64)
+        self.assertEqual(codes.shape[0], 0)
+
+
+class SplitByAttributesColumnsTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+        taxs = ['CR/LFM+DCW:0.4', 'W/H:3', 'LFM+DCW:0.4/CR', 'UNK']
+
+        with mock.patch.object(gt, 'validate', wraps=gt.validate) as val:
+            columns = gt.split_by_attributes_columns(taxs + taxs)
+        self.assertEqual(val.call_count, 4)
+        for i, tax in enumerate(taxs + taxs):
+            attrs = gt.split_by_attributes(tax)
+            for name, values in columns.items():
+                self.assertEqual(values[i], attrs.get(name))
+        self.assertEqual(columns['material'][:4], ['CR', 'W', 'CR', None])
+        self.assertEqual(len(columns), len(gt.tax['Attribute']))
+
+        records = ['CR/H:3|a', 'W|b|c', 'S']
+        columns = gt.split_by_attributes_columns(
+            records, '|', 0, 'others', fill='')
+        self.assertEqual(columns['material'], ['CR', 'W', 'S'])
+        self.assertEqual(columns['height'], ['H:3', '', ''])
+        self.assertEqual(columns['others'], ['a', ['b', 'c'], ''])
+
+        with self.assertRaises(ValueError):
+            gt.split_by_attributes_columns(['W', 'S+S'])
+        columns = gt.split_by_attributes_columns(['W', 'S+S'],
+                                                 on_error='fill')
+        self.assertEqual(columns['material'], ['W', None])
+
+
+class PickleTestCase(unittest.TestCase):
+    def test(self):
+        taxs = ['HYB(CR;S)/LFM+DCW:0.4/H:1-3', 'S+S', 'UNK']
+
+        def results(gt):
+            ret = []
+            for tax in taxs:
+                try:
+                    ret.append(gt.explain(tax, fmt='json'))
+                except ValueError as exc:
+                    ret.append(str(exc))
+            return ret
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            gts = [GemTaxonomy(vers='4.0'),
+                   GemTaxonomy(vers='3.3', profile=True),
+                   GemTaxonomy(vers='4.0', disk_cache=os.path.join(
+                       tmpdir, 'validate.sqlite'))]
+            for gt in gts:
+                expected = results(gt)
+                gt_copy = pickle.loads(pickle.dumps(gt))
+                self.assertEqual(gt_copy.tax_vers, gt.tax_vers)
+                self.assertEqual(gt_copy.cache_info(), gt.cache_info())
+                self.assertEqual(results(gt_copy), expected)
+                # shared data is not copied
+                self.assertIs(gt_copy.tax, gt.tax)
+
+            gt_copy = pickle.loads(pickle.dumps(gts[1]))
+            calls = gt_copy.profiler.info()['parse']['calls']
+            gt_copy.validate('CR/H:4')
+            self.assertGreater(gt_copy.profiler.info()['parse']['calls'],
+                               calls)
+            self.assertEqual(gts[2].disk_cache.info(), pickle.loads(
+                pickle.dumps(gts[2].disk_cache)).info())
+
+        lru = cache.LRUCache(2)
+        lru.put('a', 1)
+        lru_copy = pickle.loads(pickle.dumps(lru))
+        self.assertEqual(lru_copy.get('a'), 1)
+        lru_copy.put('b', 2)
+        self.assertEqual(lru_copy.info()['size'], 2)
+
+
+class DiskCacheTestCase(unittest.TestCase):
+    def test(self):
+        taxs = ['LFM+DCW:0.4/CR', 'S+S', 'UNK', 'W/H:3']
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'sub', 'validate.sqlite')
+            gt_ref = GemTaxonomy(vers='4.0', cache_size=0)
+            gt = GemTaxonomy(vers='4.0', disk_cache=path)
+            for tax in taxs:
+                with contextlib.suppress(ValueError):
+                    gt.validate(tax)
+            gt.disk_cache.save()
+
+            gt = GemTaxonomy(vers='4.0', disk_cache=path)
+            self.assertEqual(gt.cache_info()['disk']['loaded'], len(taxs))
+            with mock.patch.object(gt, '_validate') as _validate:
+                for tax in taxs:
+                    try:
+                        ref = gt_ref.validate(tax, build_tree=False)
+                    except ValueError as exc:
+                        with self.assertRaisesRegex(
+                                ValueError, re.escape(str(exc))):
+                            gt.validate(tax, build_tree=False)
+                    else:
+                        self.assertEqual(
+                            gt.validate(tax, build_tree=False), ref)
+                _validate.assert_not_called()
+            # the tree is not persisted, it is built when required
+            self.assertEqual(gt.explain('W/H:3'), gt_ref.explain('W/H:3'))
+
+            # other taxonomy versions are kept apart
+            gt = GemTaxonomy(vers='3.3', disk_cache=path)
+            self.assertEqual(gt.cache_info()['disk']['loaded'], 0)
+
+            # other package or data versions invalidate the cache
+            disk_cache = cache.DiskCache(path, ('0', '0', '4.0'),
+                                         autosave=False)
+            self.assertEqual(len(disk_cache), 0)
+            gt = GemTaxonomy(vers='4.0', disk_cache=path)
+            self.assertEqual(gt.cache_info()['disk']['loaded'], 0)
+
+            filename = os.path.join(tmpdir, 'exposure.csv')
+            with open(filename, 'w', newline='') as csvfile:
+                csvwriter = csv.writer(csvfile)
+                csvwriter.writerow(['taxonomy'])
+                for tax in taxs:
+                    csvwriter.writerow([tax])
+            argv = ['-t', '4.0', filename, '--disk-cache', path]
+            ref = run_csv_validate(argv[:-2])
+            for _ in range(2):
+                self.assertEqual(run_csv_validate(argv), ref)
+            self.assertEqual(len(cache.DiskCache(
+                path, gt.disk_cache.versions, autosave=False)), len(taxs))
+
+    def test_autosave(self):
+        entry = (None, {'material': 'CR'}, None, {'is_canonical': True})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'validate.sqlite')
+            versions = ('1', '2', '4.0')
+
+            # instances are not kept alive until exit, new entries are
+            # saved when they are collected
+            disk_cache = cache.DiskCache(path, versions)
+            disk_cache.put('CR', entry)
+            disk_cache_ref = weakref.ref(disk_cache)
+            del disk_cache
+            gc.collect()
+            self.assertIsNone(disk_cache_ref())
+            disk_cache = cache.DiskCache(path, versions, autosave=False)
+            self.assertEqual(disk_cache.get('CR'), entry)
+
+            # close() saves, following entries are not saved at exit
+            disk_cache = cache.DiskCache(path, versions)
+            disk_cache.put('W', entry)
+            disk_cache.close()
+            disk_cache.put('S', entry)
+            del disk_cache
+            gc.collect()
+            disk_cache = cache.DiskCache(path, versions, autosave=False)
+            self.assertEqual(len(disk_cache), 2)
+            self.assertIs(disk_cache.get('S'), cache.LRUCache.MISSING)
+
+
+class LazyLoadTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='3.3')
+        for name in GemTaxonomy.LAZY_ATTRS:
+            self.assertNotIn(name, gt.__dict__)
+        gt.validate('W/H:1-3')
+        self.assertIn('atom_specs', gt.__dict__)
+        self.assertIn('rangeint_grammar', gt.__dict__)
+        self.assertNotIn('taxo_grammar', gt.__dict__)
+
+        # loaded once and shared by the instances of the same version
+        gt2 = GemTaxonomy(vers='3', parser='parsimonious')
+        for name in GemTaxonomy.LAZY_ATTRS:
+            self.assertIs(getattr(gt2, name), getattr(gt, name))
+        self.assertIsNot(GemTaxonomy(vers='4.0').tax, gt.tax)
+        with self.assertRaises(AttributeError):
+            gt.not_an_attribute
+        with self.assertRaises(ValueError):
+            GemTaxonomy(vers='5.0')
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def test(self):
+        taxs = ['HYB(CR;S)/LFM+DCW:0.4/H:1-3/PGAR:0.1-0.3', 'S+S', 'UNK']
+        gt_ref = GemTaxonomy(vers='4.0')
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.dict(os.environ, {'XDG_CACHE_HOME': tmpdir}):
+            path = os.path.join(cache.user_cache_dir(), 'tax4.snapshot')
+            self.assertFalse(gt_ref.load_snapshot(path))
+            gt_ref.save_snapshot('tax4.snapshot')
+            self.assertTrue(os.path.exists(path))
+
+            with mock.patch.dict(classes._registry, clear=True):
+                with mock.patch.object(GemTaxonomy, '_load_data') as load:
+                    gt = GemTaxonomy(vers='4.0', snapshot=path)
+                    for tax in taxs:
+                        try:
+                            ref = gt_ref.explain(tax)
+                        except ValueError as exc:
+                            with self.assertRaisesRegex(
+                                    ValueError, re.escape(str(exc))):
+                                gt.explain(tax)
+                        else:
+                            self.assertEqual(gt.explain(tax), ref)
+                    load.assert_not_called()
+                # shared references are kept
+                self.assertIs(gt.atom_specs['HYB'].atom, [
+                    atom for atom in gt.tax['Atom']
+                    if atom['name'] == 'HYB'][0])
+
+            # stale snapshots are refused, without unpickling them, and
+            # rewritten
+            with mock.patch.object(GemTaxonomy, 'gtd_version',
+                                   return_value='0.0.0'), \
+                    mock.patch.object(classes.pickle, 'loads') as loads:
+                self.assertFalse(gt_ref.load_snapshot(path))
+                loads.assert_not_called()
+            with mock.patch.object(GemTaxonomy, 'gtd_version',
+                                   return_value='0.0.0'):
+                GemTaxonomy(vers='4.0', snapshot=path)
+                self.assertTrue(gt_ref.load_snapshot(path))
+            self.assertFalse(gt_ref.load_snapshot(path))
+
+            # default snapshot
+            GemTaxonomy(vers='4.0', snapshot=True)
+            self.assertTrue(gt_ref.load_snapshot('taxonomy4.0.snapshot'))
+
+            # tampered pickles are not read
+            with open(path, 'rb') as snapshot_file:
+                data = snapshot_file.read()
+            with open(path, 'wb') as snapshot_file:
+                snapshot_file.write(data[:-1] + bytes([data[-1] ^ 1]))
+            with mock.patch.object(classes.pickle, 'loads') as loads:
+                self.assertFalse(gt_ref.load_snapshot(path))
+                loads.assert_not_called()
+            with open(path, 'wb') as snapshot_file:
+                snapshot_file.write(b'garbage')
+            self.assertFalse(gt_ref.load_snapshot(path))
+
+            if hasattr(os, 'getuid'):
+                gt_ref.save_snapshot(path)
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+                os.chmod(path, 0o666)
+                self.assertFalse(gt_ref.load_snapshot(path))
+
+            # only snapshots in the user cache directory
+            for outside in (os.path.join(tmpdir, 'tax4.snapshot'),
+                            '../tax4.snapshot', cache.user_cache_dir()):
+                with self.assertRaises(ValueError):
+                    gt_ref.save_snapshot(outside)
+                with self.assertRaises(ValueError):
+                    gt_ref.load_snapshot(outside)
+                with self.assertRaises(ValueError):
+                    GemTaxonomy(vers='4.0', snapshot=outside)
+            self.assertFalse(os.path.exists(
+                os.path.join(tmpdir, 'tax4.snapshot')))
+
+            with mock.patch.object(sys, 'argv', [
+                    'gem-taxonomy-csv-validate', '--snapshot',
+                    os.path.join(tmpdir, 'tax4.snapshot'), 'exposure.csv']), \
+                    contextlib.redirect_stderr(io.StringIO()) as stderr:
+                with pytest.raises(SystemExit) as exc:
+                    scripts.csv_validate()
+            self.assertEqual(exc.value.code, 2)
+            self.assertIn('not in the user cache directory',
+                          stderr.getvalue())
+
+
+class ServiceTestCase(unittest.TestCase):
+    def test(self):
+        srv = service.TaxonomyService('4')
+        requests = [
+            {'id': 1, 'tax': 'LFM+DCW:0.4/CR'},
+            {'id': 2, 'op': 'explain', 'tax': 'CR/H:1', 'vers': '3.3',
+             'format': 'json'},
+            {'id': 3, 'op': 'split', 'tax': 'CR/H:1'},
+            {'id': 4, 'tax': 'S+S'},
+            {'id': 5, 'op': 'delete', 'tax': 'W'},
+            {'id': 6, 'tax': 'W', 'vers': '5'}]
+        gt = GemTaxonomy(vers='4.0')
+        expected = [
+            {'id': 1, 'ok': True,
+             'result': gt.validate('LFM+DCW:0.4/CR')[2]},
+            {'id': 2, 'ok': True, 'result': {
+                'explanation': GemTaxonomy(vers='3.3').explain(
+                    'CR/H:1', fmt='json')[1],
+                'report': {'is_canonical': True}}},
+            {'id': 3, 'ok': True,
+             'result': gt.split_by_attributes('CR/H:1')}]
+        lines = [json.dumps(request) for request in requests]
+        lines.append('not json')
+
+        def check(responses):
+            responses = [json.loads(line) for line in responses]
+            self.assertEqual(responses[:3], expected)
+            self.assertEqual([resp['ok'] for resp in responses[3:]],
+                             [False] * 4)
+            self.assertEqual([resp['id'] for resp in responses],
+                             [1, 2, 3, 4, 5, 6, None])
+
+        check([srv.handle(line) for line in lines])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'serve.sock')
+            for address in ({'unix': path},
+                            {'http_address': ('127.0.0.1', 0)}):
+                server = service.make_server(srv, **address)
+                thread = threading.Thread(target=server.serve_forever)
+                thread.start()
+                try:
+                    payload = ''.join(line + '\n' for line in lines)
+                    if 'unix' in address:
+                        # pipelined requests on concurrent connections
+                        socks = [socket.socket(socket.AF_UNIX)
+                                 for _ in range(3)]
+                        for sock in socks:
+                            sock.connect(path)
+                            sock.sendall(payload.encode('utf-8'))
+                            sock.shutdown(socket.SHUT_WR)
+                        for sock in socks:
+                            with sock, sock.makefile() as sock_file:
+                                check(sock_file.read().splitlines())
+                    else:
+                        conn = http.client.HTTPConnection(
+                            *server.server_address)
+                        conn.request('POST', '/', payload)
+                        check(conn.getresponse().read().decode(
+                            'utf-8').splitlines())
+                        conn.close()
+                finally:
+                    server.shutdown()
+                    server.server_close()
+                    thread.join()
+
+            # a stale socket is replaced, other files are never removed
+            self.assertTrue(os.path.exists(path))
+            service.make_server(srv, unix=path).server_close()
+            filename = os.path.join(tmpdir, 'exposure.csv')
+            with open(filename, 'w') as fout:
+                fout.write('id,taxonomy\n')
+            with self.assertRaises(FileExistsError):
+                service.make_server(srv, unix=filename)
+            with mock.patch.object(sys, 'argv', [
+                    'gem-taxonomy-serve', '-u', filename]), \
+                    contextlib.redirect_stderr(io.StringIO()) as stderr:
+                with pytest.raises(SystemExit) as exc:
+                    scripts.serve()
+            self.assertEqual(exc.value.code, 2)
+            self.assertIn('is not a unix socket', stderr.getvalue())
+            with open(filename) as fin:
+                self.assertEqual(fin.read(), 'id,taxonomy\n')
+
+            # the socket removed while serving
+            def serve_forever(server):
+                os.remove(path)
+                raise KeyboardInterrupt
+
+            with mock.patch.object(sys, 'argv', [
+                    'gem-taxonomy-serve', '-u', path]), \
+                    mock.patch.object(socketserver.BaseServer,
+                                      'serve_forever', serve_forever):
+                scripts.serve()
+            self.assertFalse(os.path.exists(path))
+
+
+def run_stdin_script(script, argv, lines):
+    stdout = io.StringIO()
+    with mock.patch.object(sys, 'argv', ['gem-taxonomy'] + argv), \
+            mock.patch.object(sys, 'stdin', io.StringIO(''.join(
+                line + '\n' for line in lines))):
+        with contextlib.redirect_stdout(stdout):
+            with pytest.raises(SystemExit) as exc:
+                script()
+    return exc.value.code, [json.loads(line)
+                            for line in stdout.getvalue().splitlines()]
+
+
+class StdinStreamTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+        taxs = ['LFM/CR', 'S+S', 'UNK', '', 'W/H:2', 'CR']
+
+        for batch_size in ('1', '4', '1024'):
+            ret_code, results = run_stdin_script(
+                scripts.validate, ['--stdin', '--batch-size', batch_size,
+                                   '-t', '4.0'], taxs)
+            self.assertEqual(ret_code, 1)
+            self.assertEqual([res['taxonomy'] for res in results], taxs)
+            for tax, res in zip(taxs, results):
+                try:
+                    report = gt.validate(tax)[2]
+                except ValueError as exc:
+                    self.assertEqual(res, {'taxonomy': tax, 'ok': False,
+                                           'error': str(exc)})
+                else:
+                    self.assertEqual(res, {'taxonomy': tax, 'ok': True,
+                                           'report': report})
+
+        self.assertEqual(run_stdin_script(
+            scripts.validate, ['--stdin'], ['CR', 'LFM/CR'])[0], 0)
+        self.assertEqual(run_stdin_script(
+            scripts.validate, ['--stdin', '-c'], ['CR', 'LFM/CR'])[0], 1)
+
+        for fmt in ('textsingleline', 'textmultiline', 'json'):
+            ret_code, results = run_stdin_script(
+                scripts.explain, ['--stdin', '-f', fmt], taxs)
+            self.assertEqual(ret_code, 1)
+            self.assertEqual(results[0]['explanation'],
+                             gt.explain('LFM/CR', fmt=fmt)[1])
+            self.assertEqual([res['ok'] for res in results],
+                             [True, False, True, False, True, True])
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            for argv in ([], ['--stdin', 'CR'], ['--stdin', '-f', 'xml']):
+                self.assertEqual(run_stdin_script(
+                    scripts.explain, argv, [])[0], 2)
+
+    def test_unexpected_error(self):
+        validate = GemTaxonomy.validate
+
+        def validate_broken(gt, tax, *args, **kwargs):
+            if tax == 'S':
+                raise KeyError('S')
+            return validate(gt, tax, *args, **kwargs)
+
+        with mock.patch.object(GemTaxonomy, 'validate', validate_broken):
+            ret_code, results = run_stdin_script(
+                scripts.validate, ['--stdin', '-t', '4.0'],
+                ['CR', 'S', 'W'])
+        self.assertEqual(ret_code, 1)
+        self.assertEqual([res['ok'] for res in results], [True, False, True])
+        self.assertEqual(results[1], {'taxonomy': 'S', 'ok': False,
+                                      'error': "KeyError: 'S'"})
+
+    @unittest.skipIf(os.name == 'nt', 'select() supports only sockets')
+    def test_idle_flush(self):
+        # a line-by-line producer gets each result before sending the
+        # next line, even if the batch is not full
+        proc = subprocess.Popen(
+            [sys.executable, '-c', 'from openquake.gem_taxonomy import'
+             ' scripts; scripts.validate()', '--stdin', '-t', '4.0'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        try:
+            for tax in ('CR', 'S+S', 'W'):
+                proc.stdin.write(tax.encode() + b'\n')
+                proc.stdin.flush()
+                ready = select.select([proc.stdout], [], [], 60)[0]
+                self.assertTrue(ready)
+                res = json.loads(proc.stdout.readline())
+                self.assertEqual(res['taxonomy'], tax)
+            proc.stdin.close()
+            self.assertEqual(proc.stdout.read(), b'')
+            self.assertEqual(proc.wait(60), 1)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+
+class AsyncGemTaxonomyTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+        taxs = ['LFM/CR', 'S+S', 'UNK', 'W/H:2', 'LFM/CR']
+
+        async def check(agt):
+            self.assertEqual(await agt.validate('LFM/CR'),
+                             (gt.validate('LFM/CR')[0], None,
+                              gt.validate('LFM/CR')[2]))
+            with self.assertRaises(ValueError):
+                await agt.validate('S+S')
+            self.assertEqual(await agt.explain('W/H:2', fmt='json'),
+                             gt.explain('W/H:2', fmt='json'))
+            results = agt.validate_many(taxs)
+            expected = gt.validate_many(taxs)
+            results_list = await results
+            expected_list = list(expected)
+            self.assertEqual([res[:2] for res in results_list],
+                             [res[:2] for res in expected_list])
+            self.assertEqual([str(res[2]) for res in results_list],
+                             [str(res[2]) for res in expected_list])
+            self.assertEqual(results.summary, expected.summary)
+            with self.assertRaises(ValueError):
+                await agt.validate_many(taxs, on_error='raise')
+
+        for executor in ('thread', 'process'):
+            async def run():
+                await check(agt)
+
+            agt = aio.AsyncGemTaxonomy(
+                vers='4.0', executor=executor, max_workers=2, chunk_size=2)
+            try:
+                # the same instance used by different event loops
+                asyncio.run(run())
+                asyncio.run(run())
+            finally:
+                agt.close()
+
+        # single-flight and backpressure
+        running = []
+        max_running = []
+        validate = GemTaxonomy.validate
+
+        def slow_validate(gt, tax_str, build_tree=True):
+            running.append(tax_str)
+            max_running.append(len(running))
+            time.sleep(0.05)
+            running.remove(tax_str)
+            return validate(gt, tax_str, build_tree)
+
+        async def run():
+            async with aio.AsyncGemTaxonomy(
+                    vers='4.0', max_workers=4, max_pending=2) as agt:
+                with mock.patch.object(agt.gt, 'validate', side_effect=(
+                        lambda *args, **kwargs: slow_validate(
+                            agt.gt, *args, **kwargs))) as gt_validate:
+                    results = await asyncio.gather(*[
+                        agt.validate(tax) for tax in (
+                            ['CR'] * 10 + ['W', 'S', 'MUR', 'CU'])])
+                    self.assertEqual(gt_validate.call_count, 5)
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(results[0], results[9])
+        self.assertIsNot(results[0][2], results[9][2])
+        self.assertEqual(max(max_running), 2)
+
+        # explain() callers sharing a job get a copy each
+        async def run():
+            async with aio.AsyncGemTaxonomy(vers='4.0') as agt:
+                return await asyncio.gather(*[
+                    agt.explain('W/H:2', fmt='json') for _ in range(2)])
+
+        results = asyncio.run(run())
+        self.assertEqual(results[0], results[1])
+        self.assertIsNot(results[0][1], results[1][1])
+        results[0][1][0]['name'] = None
+        self.assertNotEqual(results[0], results[1])
+
+        # max_pending waits in more event loops
+        async def run(agt):
+            return await asyncio.gather(*[
+                agt.validate(tax) for tax in ('CR', 'W', 'S')])
+
+        agt = aio.AsyncGemTaxonomy(vers='4.0', max_pending=1)
+        try:
+            self.assertEqual(asyncio.run(run(agt)), asyncio.run(run(agt)))
+        finally:
+            agt.close()
+
+        # the pool is shut down without blocking the event loop
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            agt = aio.AsyncGemTaxonomy(vers='4.0')
+            shutdown = agt.pool.shutdown
+
+            def slow_shutdown(*args, **kwargs):
+                time.sleep(0.3)
+                shutdown(*args, **kwargs)
+
+            ticker_task = asyncio.ensure_future(ticker())
+            await asyncio.sleep(0)
+            with mock.patch.object(agt.pool, 'shutdown', slow_shutdown):
+                async with agt:
+                    await agt.validate('CR')
+                    del ticks[:]
+            ticker_task.cancel()
+            return agt
+
+        agt = asyncio.run(run())
+        self.assertGreater(len(ticks), 5)
+        with self.assertRaises(RuntimeError):
+            agt.pool.submit(print)
+
+        # validate_many() reads the input only as needed
+        read = []
+
+        def taxs_gen(n):
+            for i in range(n):
+                read.append(i)
+                yield 'CR/H:%d' % (i + 1)
+
+        async def run():
+            async with aio.AsyncGemTaxonomy(
+                    vers='4.0', max_pending=2, chunk_size=10) as agt:
+                results = agt.validate_many(taxs_gen(1000))
+                first = await results.__anext__()
+                n_read = len(read)
+                n_results = 1 + len([res async for res in results])
+                return first, n_read, n_results, results.summary
+
+        first, n_read, n_results, summary = asyncio.run(run())
+        self.assertEqual(first, ('CR/H:1', gt.validate('CR/H:1')[2], None))
+        self.assertLessEqual(n_read, 20)
+        self.assertEqual(n_results, 1000)
+        self.assertEqual(summary, {'total': 1000, 'validated': 1000,
+                                   'valid': 1000, 'canonical': 1000,
+                                   'errors': 0})
+
+
+class ExplainThreadsTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+        taxs = ['HYB(CR;S)/LFM+DCW:0.4/H:1-3', 'MDD(SL+S;HYB(ADO+M;WHE+W))',
+                'LDD(DCW:0.4+LFM;DCW:0.8+LFM)/IRI(TOR;SET;CHV)',
+                'MIX(RES;COM;GOV)/CR+CIP/H:2', 'W/H:1-3/PGAR:0.1-0.3/RES:2A',
+                'UNK']
+        fmts = ('textsingleline', 'textmultiline', 'json')
+
+        def render(tax):
+            _, l_attrs, _ = gt.validate(tax)
+            return ([gt.explain(tax, fmt=fmt) for fmt in fmts] +
+                    [re.sub('0x[0-9a-f]+', '0x0', gt.logic_print(l_attrs))])
+
+        expected = [render(tax) for tax in taxs]
+
+        def render_all(_):
+            return [[render(tax) for tax in taxs] for _ in range(25)]
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(16) as pool:
+                results = list(pool.map(render_all, range(64)))
+        finally:
+            sys.setswitchinterval(switch_interval)
+        for result in results:
+            self.assertEqual(result, [expected] * 25)
+
+
+class ExplainToTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+        gt_nc = GemTaxonomy(vers='4.0', explain_cache_size=0,
+                            fragment_cache_size=0)
+        for tax in ['HYB(CR;S)/LFM+DCW:0.4/H:1-3', 'UNK',
+                    'MDD(SL+S;HYB(ADO+M;WHE+W))/IRI(TOR;SET;CHV)',
+                    'W/H:1-3/PGAR:0.1-0.3/RES:2A', 'MIX(RES;COM;GOV)',
+                    'LDD(DCW:0.4+LFM;DCW:0.8+LFM)/HYB(C;S;W)']:
+            for fmt in GemTaxonomy.EXPL_OUT_TYPE.DICT:
+                output_type, expl, val_reply = gt.explain(tax, fmt=fmt)
+                expected = io.StringIO()
+                with contextlib.redirect_stdout(expected):
+                    gt.dump_explain(output_type, expl)
+
+                for gt_to in (gt, gt_nc, gt):
+                    fp = io.StringIO()
+                    self.assertEqual(gt_to.explain_to(fp, tax, fmt=fmt),
+                                     (output_type, val_reply))
+                    self.assertEqual(fp.getvalue(), expected.getvalue())
+
+    def test_streaming(self):
+        # without cache the explanation is written as it is rendered
+        gt_nc = GemTaxonomy(vers='4.0', explain_cache_size=0)
+        for fmt in GemTaxonomy.EXPL_OUT_TYPE.DICT:
+            fp = mock.Mock()
+            gt_nc.explain_to(fp, 'MDD(SL+S;HYB(ADO+M;WHE+W))/H:2', fmt=fmt)
+            self.assertGreater(fp.write.call_count, 2)
+
+    def test_errors(self):
+        gt = GemTaxonomy(vers='4.0')
+        fp = io.StringIO()
+        with self.assertRaises(ValueError):
+            gt.explain_to(fp, 'CR/CR')
+        with self.assertRaises(ValueError):
+            gt.explain_to(fp, 'CR', fmt='xml')
+        self.assertEqual(fp.getvalue(), '')
+
+
+class ExplainCacheTestCase(unittest.TestCase):
+    def test(self):
+        gt = GemTaxonomy(vers='4.0')
+        gt_nc = GemTaxonomy(vers='4.0', explain_cache_size=0,
+                            fragment_cache_size=0)
+        fmts = list(GemTaxonomy.EXPL_OUT_TYPE.DICT)
+        taxs = ['CR/LFM+DCW:0.4/H:3-5', 'W/H:3-5/LFM+DCW:0.4',
+                'HYB(CR;S)/H:2', 'H:3-5/CR/DCW:0.4+LFM', 'UNK']
+        for _ in range(2):
+            for tax in taxs:
+                for fmt in fmts:
+                    self.assertEqual(gt.explain(tax, fmt=fmt),
+                                     gt_nc.explain(tax, fmt=fmt))
+                    fp, fp_nc = io.StringIO(), io.StringIO()
+                    gt.explain_to(fp, tax, fmt=fmt)
+                    gt_nc.explain_to(fp_nc, tax, fmt=fmt)
+                    self.assertEqual(fp.getvalue(), fp_nc.getvalue())
+
+        info = gt.cache_info()
+        # 'H:3-5/CR/DCW:0.4+LFM' is canonicalized as the first one, json
+        # explanations are cached by explain_to() only
+        self.assertEqual(info['explain']['size'], 4 * 3)
+        self.assertEqual(info['explain']['misses'], 4 * 3)
+        # H:3-5 and DCW:0.4 fragments are rendered once per format
+        # and indentation
+        self.assertGreater(info['fragment']['hits'], 0)
+        self.assertEqual(gt_nc.cache_info()['explain']['size'], 0)
+        self.assertEqual(gt_nc.cache_info()['fragment']['size'], 0)
+
+        # cached json explanations are not shared
+        _, expl, _ = gt.explain(taxs[0], fmt='json')
+        expl[0]['title'] = 'changed'
+        self.assertEqual(gt.explain(taxs[0], fmt='json'),
+                         gt_nc.explain(taxs[0], fmt='json'))
+
+        gt.cache_clear()
+        self.assertEqual(gt.cache_info()['explain']['size'], 0)
+        self.assertEqual(gt.cache_info()['fragment']['size'], 0)
+
+
+class ProfileTestCase(unittest.TestCase):
+    class Hook(instrument.PhaseHook):
+        def __init__(self):
+            self.events = []
+
+        def start(self, phase):
+            self.events.append(('start', phase))
+
+        def end(self, phase, elapsed_ns, exc=None):
+            self.events.append(('end', phase, exc is not None))
+
+    def test(self):
+        taxs = ['CR/LFM+DCW:0.4/H:1-3', 'H:2/MDD(SL+S;HYB(ADO+M;WHE+W))',
+                'CR/CR', 'UNK']
+        gt = GemTaxonomy(vers='4.0')
+        hook = self.Hook()
+        gt_prof = GemTaxonomy(vers='4.0', profile=instrument.PhaseProfiler(
+            hooks=[hook]))
+        for tax in taxs:
+            for cur_gt in (gt, gt_prof):
+                try:
+                    result = cur_gt.explain(tax)
+                except ValueError as exc:
+                    result = str(exc)
+                if cur_gt is gt:
+                    expected = result
+            self.assertEqual(result, expected)
+
+        info = gt_prof.profiler.info()
+        for phase in ('parse', 'validate_attribute', 'validate_arguments',
+                      'validate_parameters', 'canonical_sort'):
+            self.assertGreater(info[phase]['calls'], 0)
+            self.assertGreater(info[phase]['total_ns'], 0)
+            self.assertLessEqual(info[phase]['self_ns'],
+                                 info[phase]['total_ns'])
+        # 'CR/CR' fails outside of the measured phases, 'UNK' is not sorted
+        self.assertEqual(info['validate_attribute']['errors'], 0)
+        self.assertEqual(info['canonical_sort']['calls'], 2)
+        self.assertEqual(len(hook.events), 2 * sum(
+            counters['calls'] for counters in info.values()))
+        # phases are nested
+        depth = 0
+        for event in hook.events:
+            depth += 1 if event[0] == 'start' else -1
+            self.assertGreaterEqual(depth, 0)
+        self.assertEqual(depth, 0)
+        self.assertIn('canonical_sort', '\n'.join(gt_prof.profiler.format()))
+
+        profiler = gt_prof.profile_disable()
+        self.assertIsNone(gt_prof.profiler)
+        for names in GemTaxonomy.PROFILE_METHODS.values():
+            for name in names:
+                self.assertNotIn(name, gt_prof.__dict__)
+        gt_prof.cache_clear()
+        gt_prof.validate('W/H:3')
+        self.assertEqual(profiler.info(), info)
+
+        self.assertEqual(profiler.pop(), info)
+        self.assertEqual(profiler.info()['parse']['calls'], 0)
+        profiler.update(info)
+        self.assertEqual(profiler.info(), info)
+
+    def test_parsimonious(self):
+        gt = GemTaxonomy(vers='4.0', parser='parsimonious', profile=True)
+        with self.assertRaises(ValueError):
+            gt.validate('CR/LFM+DCW:0.4/H:1-3/')
+        gt.validate('CR/LFM+DCW:0.4/H:1-3')
+        info = gt.profiler.info()
+        self.assertGreater(info['parse']['errors'], 0)
+        self.assertGreater(info['extract_atoms']['calls'], 0)
+
+    def test_csv_validate(self):
+        taxs = [tax[0] for tax in taxonomy_strings['4.0']]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'exposure.csv')
+            with open(filename, 'w', newline='') as csvfile:
+                csvwriter = csv.writer(csvfile)
+                csvwriter.writerow(['id', 'taxonomy'])
+                for idx, tax in enumerate(taxs):
+                    csvwriter.writerow([idx, tax])
+
+            ref = run_csv_validate([filename, '-t', '4.0'])
+            for opts in ([], ['-j', '2']):
+                stderr = io.StringIO()
+                with contextlib.redirect_stderr(stderr):
+                    self.assertEqual(run_csv_validate(
+                        [filename, '-t', '4.0', '--profile'] + opts), ref)
+                lines = stderr.getvalue().splitlines()
+                self.assertEqual(len(lines), 1 + len(
+                    instrument.PhaseProfiler.PHASES))
+                calls = int(lines[1].split()[2])
+                self.assertGreaterEqual(calls, len(taxs))
+
+
+class BenchTestCase(unittest.TestCase):
+    def test_corpora(self):
+        for vers in ('3.3', '4.0'):
+            gt = GemTaxonomy(vers=vers)
+            valid = bench.corpus(vers, 'valid', 100)
+            self.assertEqual(valid, bench.corpus(vers, 'valid', 100))
+            self.assertNotEqual(valid, bench.corpus(vers, 'valid', 100,
+                                                    seed=1))
+            self.assertEqual(len(set(valid)), 100)
+            for tax in valid:
+                self.assertTrue(gt.validate(tax)[2]['is_canonical'])
+
+            reordered = bench.corpus(vers, 'reordered', 100)
+            self.assertEqual(len(reordered), 100)
+            for tax in reordered:
+                self.assertFalse(gt.validate(tax)[2]['is_canonical'])
+
+            errors = bench.corpus(vers, 'errors', 100)
+            self.assertEqual(len(errors), 100)
+            n_invalid = 0
+            for tax in errors:
+                try:
+                    gt.validate(tax)
+                except ValueError:
+                    n_invalid += 1
+            self.assertGreater(n_invalid, 50)
+            self.assertLess(n_invalid, 100)
+
+        with self.assertRaises(ValueError):
+            bench.corpus('4.0', 'unknown', 10)
+
+    def test_unexpected_errors(self):
+        validate = GemTaxonomy.validate
+
+        def validate_broken(gt, tax, *args, **kwargs):
+            if tax.endswith('#'):
+                raise KeyError(tax)
+            return validate(gt, tax, *args, **kwargs)
+
+        stats = {}
+        with mock.patch.object(bench, 'MUTATIONS', (
+                lambda tax, rnd: tax + '#', lambda tax, rnd: tax + '/')), \
+                mock.patch.object(GemTaxonomy, 'validate', validate_broken):
+            errors = bench.corpus('4.0', 'errors', 50, stats=stats)
+        self.assertEqual(len(errors), 50)
+        self.assertFalse([tax for tax in errors if tax.endswith('#')])
+        self.assertGreater(stats['unexpected_errors'], 0)
+
+        stats = {}
+        bench.corpus('4.0', 'errors', 50, stats=stats)
+        self.assertEqual(stats, {'unexpected_errors': 0})
+
+    def test_csv_validate_exit_status(self):
+        taxs = bench.corpus('4.0', 'errors', 20)
+        result = bench.bench_csv_validate('4.0', 'errors', taxs, runs=1)
+        self.assertGreater(result['errors'], 0)
+        self.assertEqual(result['unexpected_errors'], 0)
+        self.assertIsNone(result['unexpected_output'])
+
+        # a crash of csv_validate is not a run with not valid rows
+        with mock.patch.object(
+                bench, 'CSV_VALIDATE_RUNNER',
+                'import sys; sys.stderr.write("crashed"); sys.exit(2)'):
+            result = bench.bench_csv_validate('4.0', 'errors', taxs, runs=2)
+        self.assertEqual(result['unexpected_errors'], 2)
+        self.assertEqual(result['unexpected_output'], 'exit status 2\ncrashed')
+
+        # and gem-taxonomy-bench warns about it
+        argv = ['gem-taxonomy-bench', '-t', '4', '-c', 'errors',
+                '-b', 'csv_validate', '-n', '20', '--csv-runs', '1']
+        with mock.patch.object(sys, 'argv', argv), \
+                mock.patch.object(bench, 'CSV_VALIDATE_RUNNER',
+                                  'import sys; sys.exit(2)'), \
+                mock.patch.object(sys, 'stdout', io.StringIO()), \
+                mock.patch.object(sys, 'stderr', io.StringIO()) as stderr:
+            with pytest.raises(SystemExit):
+                scripts.bench()
+        self.assertIn('1 of the csv_validate runs on the 4.0 errors corpus'
+                      ' failed unexpectedly, the last one with exit status 2',
+                      stderr.getvalue())
+
+        # nor are not valid rows in a corpus without errors
+        with mock.patch.object(
+                bench, 'CSV_VALIDATE_RUNNER', 'import sys; sys.exit(1)'):
+            result = bench.bench_csv_validate(
+                '4.0', 'valid', bench.corpus('4.0', 'valid', 20), runs=1)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['unexpected_errors'], 1)
+
+    def test_script(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'bench.json')
+            argv = ['gem-taxonomy-bench', '-t', '4', '-c', 'errors',
+                    '-b', 'explain_json', '-b', 'csv_validate', '-n', '30',
+                    '--csv-runs', '1', '-o', filename]
+            with mock.patch.object(sys, 'argv', argv):
+                with pytest.raises(SystemExit) as exc:
+                    scripts.bench()
+            self.assertEqual(exc.value.code, 0)
+            with open(filename) as fin:
+                report = json.load(fin)
+
+        self.assertEqual(report['options']['strings'], 30)
+        self.assertEqual(report['corpora'], [
+            {'version': '4.0', 'corpus': 'errors', 'strings': 30,
+             'unexpected_errors': 0}])
+        results = report['results']
+        self.assertEqual([(res['version'], res['corpus'], res['benchmark'],
+                           res['strings'], res['latency_of'])
+                          for res in results],
+                         [('4.0', 'errors', 'explain_json', 30, 'string'),
+                          ('4.0', 'errors', 'csv_validate', 30, 'run')])
+        self.assertEqual(results[0]['errors'], results[1]['errors'])
+        self.assertEqual(results[1]['unexpected_errors'], 0)
+        for res in results:
+            self.assertGreater(res['strings_per_s'], 0)
+            self.assertLessEqual(res['p50_us'], res['p99_us'])
+        self.assertGreater(results[0]['peak_memory_bytes'], 0)